@@ -0,0 +1,108 @@
+"""
+Unit tests for the background account deletion (backend/account_deletion.py)
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import account_deletion
+
+
+@pytest.fixture
+def account_db(fake_db):
+    fake_db.users.docs.extend([{"user_id": "gone"}, {"user_id": "friend"}])
+    fake_db.user_sessions.docs.append({"user_id": "gone", "session_token": "s1"})
+    fake_db.friendships.docs.extend([
+        {"user_id": "gone", "friend_id": "friend", "status": "accepted"},
+        {"user_id": "other", "friend_id": "gone", "status": "pending"},
+    ])
+    fake_db.profile_stats.docs.append({"user_id": "friend", "friends_count": 1})
+    fake_db.social_posts.docs.extend([
+        {"post_id": "own", "user_id": "gone"},
+        {"post_id": "theirs", "user_id": "friend", "likes_count": 2, "comments_count": 1},
+    ])
+    fake_db.post_likes.docs.extend([
+        {"post_id": "theirs", "user_id": "gone"},
+        {"post_id": "theirs", "user_id": "other"},
+        {"post_id": "own", "user_id": "friend"},
+    ])
+    fake_db.post_comments.docs.append({"post_id": "theirs", "user_id": "gone"})
+    fake_db.notifications.docs.extend([
+        {"user_id": "friend", "from_user_id": "gone", "read": False},
+        {"user_id": "friend", "from_user_id": "gone", "read": True},
+    ])
+    fake_db.notification_counters.docs.append({"user_id": "friend", "unread": 1})
+    return fake_db
+
+
+def _create(db, user_id="gone"):
+    async def scenario():
+        job = await account_deletion.create_deletion_job(db, user_id)
+        await asyncio.gather(*account_deletion._RUNNING.values())
+        return job
+
+    return asyncio.run(scenario())
+
+
+def test_new_job_runs_to_completion(account_db):
+    job = _create(account_db)
+
+    stored = account_db.deletion_jobs.docs[0]
+    assert stored["job_id"] == job["job_id"]
+    assert stored["status"] == "completed"
+    assert stored["finalized"] is True
+    assert "refs" not in stored
+    assert len(stored["collections"]) == len(account_deletion.USER_DATA_REGISTRY)
+    assert [u["user_id"] for u in account_db.users.docs] == ["friend"]
+    assert account_db.friendships.docs == []
+    assert [like["user_id"] for like in account_db.post_likes.docs] == ["other"]
+
+
+def test_counters_of_other_users_are_decremented(account_db):
+    _create(account_db)
+
+    post = next(p for p in account_db.social_posts.docs if p["post_id"] == "theirs")
+    assert (post["likes_count"], post["comments_count"]) == (1, 0)
+    assert account_db.profile_stats.docs[0]["friends_count"] == 0
+    assert account_db.notification_counters.docs[0]["unread"] == 0
+
+
+def test_account_is_disabled_before_the_job_runs(account_db):
+    asyncio.run(account_deletion.disable_account(account_db, "gone"))
+
+    assert account_db.user_sessions.docs == []
+    assert account_db.users.docs[0]["disabled"] is True
+
+
+def test_failed_job_is_retried_and_finalized_once(account_db):
+    account_db.deletion_jobs.docs.append({
+        "job_id": "del_1", "user_id": "gone", "status": "failed", "error": "boom",
+        "collections": {}, "collections_total": len(account_deletion.USER_DATA_REGISTRY),
+        "finalized": True, "lease_until": None,
+    })
+
+    job = _create(account_db)
+
+    assert job["job_id"] == "del_1"
+    assert account_db.deletion_jobs.docs[0]["status"] == "completed"
+    assert "error" not in account_db.deletion_jobs.docs[0]
+    # Already finalized by the failed run: not decremented a second time
+    assert account_db.profile_stats.docs[0]["friends_count"] == 1
+
+
+def test_resume_waits_for_the_lease_of_a_dead_worker(account_db, monkeypatch):
+    monkeypatch.setattr(account_deletion, "DELETION_LEASE_SECONDS", 1)
+    account_db.deletion_jobs.docs.append({
+        "job_id": "del_1", "user_id": "gone", "status": "running", "owner": "dead",
+        "collections": {}, "collections_total": len(account_deletion.USER_DATA_REGISTRY),
+        "lease_until": (datetime.now(timezone.utc) + timedelta(seconds=0.2)).isoformat(),
+    })
+
+    async def scenario():
+        assert await account_deletion.resume_deletion_jobs(account_db) == 1
+        await asyncio.gather(*account_deletion._RUNNING.values())
+
+    asyncio.run(scenario())
+
+    assert account_db.deletion_jobs.docs[0]["status"] == "completed"
@@ -0,0 +1,64 @@
+"""
+Unit tests for adding coach programs to the agenda (POST /workouts/coach/add-to-agenda)
+"""
+import asyncio
+
+import pytest
+
+USER = {"user_id": "u1", "name": "Léa"}
+
+
+def _program(program_id="prog_1", weeks=2, days=3):
+    program = {
+        "name": "Remise en forme",
+        "weeks": [
+            {"week_number": w, "days": [{"day_number": d, "name": f"S{w}J{d}", "exercises": [{}, {}]} for d in range(1, days + 1)]}
+            for w in range(1, weeks + 1)
+        ],
+    }
+    if program_id:
+        program["program_id"] = program_id
+    return program
+
+
+@pytest.fixture
+def agenda(server, fake_db):
+    fake_db.appointments.create_unique("user_id", "program_id", "program_slot")
+
+    def add(program):
+        return asyncio.run(server.add_program_to_agenda({"program": program}, user=USER))
+    return add
+
+
+def test_re_adding_a_program_is_idempotent(agenda, fake_db):
+    first = agenda(_program())
+    again = agenda(_program())
+
+    assert (first["appointments_added"], first["already_in_agenda"]) == (6, 0)
+    assert (again["appointments_added"], again["already_in_agenda"]) == (0, 6)
+    assert sorted(a["program_slot"] for a in fake_db.appointments.docs) == ["w1d1", "w1d2", "w1d3", "w2d1", "w2d2", "w2d3"]
+
+
+def test_a_longer_version_only_adds_the_new_sessions(agenda, fake_db):
+    agenda(_program(weeks=1))
+    result = agenda(_program(weeks=2))
+
+    assert (result["appointments_added"], result["already_in_agenda"]) == (3, 3)
+    assert len(fake_db.appointments.docs) == 6
+
+
+def test_another_program_is_added_alongside(agenda, fake_db):
+    agenda(_program("prog_1"))
+    result = agenda(_program("prog_2", weeks=1))
+
+    assert result["appointments_added"] == 3
+    assert {a["program_id"] for a in fake_db.appointments.docs} == {"prog_1", "prog_2"}
+
+
+def test_programs_without_an_id_are_not_keyed(agenda, fake_db):
+    assert agenda(_program(None))["appointments_added"] == 6
+    # A second id-less program has the same slots but must not collide on the unique index
+    assert agenda(_program(None))["appointments_added"] == 6
+
+    assert len(fake_db.appointments.docs) == 12
+    assert all("program_slot" not in a for a in fake_db.appointments.docs)
@@ -0,0 +1,296 @@
+"""
+Background cascading account deletion
+USER_DATA_REGISTRY lists every collection holding data owned by (or naming) a
+user, with the fields that reference the user. A deletion job:
+
+1. prepare: records the ids of the user's posts and activities (whose likes
+   and comments by other users go too), the posts they liked/commented, their
+   friends and the unread notifications they sent, before anything is deleted;
+2. deletes every registry entry concurrently (DELETE_CONCURRENCY at a time),
+   recording per-collection progress in `deletion_jobs`;
+3. finalize: decrements likes_count/comments_count of other users' posts,
+   friends_count of their friends and the unread counters of the users they
+   notified. The step is marked done before it runs, so a crash can skip it
+   (counters are recomputed eventually) but never apply it twice.
+
+Sessions are revoked and the user is disabled before the job is queued, so the
+account stops working as soon as DELETE returns.
+
+Jobs hold a lease (job_lease) like seeding jobs; an interrupted or failed job
+resumes at startup and skips the collections already done. New user-owned
+collections must be added to the registry.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from job_lease import acquire_lease, renewing_lease, finish_job, fail_job, retry_job
+
+logger = logging.getLogger(__name__)
+
+DELETE_CONCURRENCY = 8
+DELETION_LEASE_SECONDS = 120
+
+# collection -> fields referencing the deleted user
+USER_DATA_REGISTRY = {
+    # Account
+    "users": ("user_id",),
+    "user_profiles": ("user_id",),
+    "profiles": ("user_id",),
+    "user_sessions": ("user_id",),
+    "oauth_states": ("user_id",),
+    "google_calendar_tokens": ("user_id",),
+    "premium_subscriptions": ("user_id",),
+    # Tracking
+    "food_logs": ("user_id",),
+    "nutrition_logs": ("user_id",),
+    "weight_entries": ("user_id",),
+    "weight_logs": ("user_id",),
+    "weight_history": ("user_id",),
+    "bmi_history": ("user_id",),
+    "step_logs": ("user_id",),
+    "workout_logs": ("user_id",),
+    "scan_history": ("user_id",),
+    "streaks": ("user_id",),
+    "bariatric_logs": ("user_id",),
+    "bariatric_daily_logs": ("user_id",),
+    "bariatric_reminder_dismissed": ("user_id",),
+    # Planning
+    "appointments": ("user_id",),
+    "agenda_events": ("user_id",),
+    "agenda_notes": ("user_id",),
+    "meal_plans": ("user_id",),
+    "workout_programs": ("user_id",),
+    "workout_favorites": ("user_id",),
+    "favorite_recipes": ("user_id",),
+    "shopping_list": ("user_id",),
+    "user_recommendations": ("user_id",),
+    "ai_usage_logs": ("user_id",),
+    # Gamification
+    "user_points": ("user_id",),
+    "user_badges": ("user_id",),
+    "badges": ("user_id",),
+    "challenge_participations": ("user_id",),
+    "challenge_completions": ("user_id",),
+    "friend_challenges": ("creator_id", "opponent_id"),
+    # Social
+    "social_posts": ("user_id",),
+    "post_likes": ("user_id",),
+    "post_comments": ("user_id",),
+    "social_activities": ("user_id",),
+    "activity_likes": ("user_id",),
+    "activity_comments": ("user_id",),
+    "timelines": ("user_id", "author_id"),
+    "timeline_state": ("user_id",),
+    "high_fanout_authors": ("user_id",),
+    "friendships": ("user_id", "friend_id"),
+    "group_members": ("user_id",),
+    "blocked_users": ("user_id", "blocked_user_id"),
+    "user_reports": ("reporter_id", "reported_user_id"),
+    "messages": ("sender_id", "recipient_id"),
+    "conversation_summaries": ("user_id", "partner_id"),
+    "notifications": ("user_id", "from_user_id"),
+    "notification_counters": ("user_id",),
+    # Derived / caches
+    "profile_stats": ("user_id",),
+    "report_cache": ("user_id",),
+    "report_jobs": ("user_id",),
+    "report_data_versions": ("user_id",),
+}
+
+# Children of the user's own content: collection -> (field, job ref list)
+CASCADES = {
+    "post_likes": ("post_id", "post_ids"),
+    "post_comments": ("post_id", "post_ids"),
+    "activity_likes": ("activity_id", "activity_ids"),
+    "activity_comments": ("activity_id", "activity_ids"),
+    "timelines": ("activity_id", "activity_ids"),
+}
+
+_RUNNING = {}
+
+
+def deletion_filter(name: str, user_id: str, refs: dict) -> dict:
+    clauses = [{field: user_id} for field in USER_DATA_REGISTRY[name]]
+    if name in CASCADES:
+        field, ref = CASCADES[name]
+        if refs.get(ref):
+            clauses.append({field: {"$in": refs[ref]}})
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def _count_by_post(collection, user_id: str) -> list:
+    return await collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$post_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+
+
+async def _friend_ids(db, user_id: str) -> list:
+    friendships = await db.friendships.find(
+        {"$or": [{"user_id": user_id}, {"friend_id": user_id}], "status": "accepted"},
+        {"_id": 0, "user_id": 1, "friend_id": 1}
+    ).to_list(None)
+    return list({f["friend_id"] if f["user_id"] == user_id else f["user_id"] for f in friendships})
+
+
+async def _count_unread_sent(db, user_id: str) -> list:
+    return await db.notifications.aggregate([
+        {"$match": {"from_user_id": user_id, "read": False, "user_id": {"$ne": user_id}}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+
+
+async def _prepare(db, job: dict) -> dict:
+    """Record references needed by the cascade while the user's documents still exist"""
+    user_id = job["user_id"]
+    posts, activities, likes, comments, friend_ids, unread = await asyncio.gather(
+        db.social_posts.find({"user_id": user_id}, {"_id": 0, "post_id": 1}).to_list(None),
+        db.social_activities.find({"user_id": user_id}, {"_id": 0, "activity_id": 1}).to_list(None),
+        _count_by_post(db.post_likes, user_id),
+        _count_by_post(db.post_comments, user_id),
+        _friend_ids(db, user_id),
+        _count_unread_sent(db, user_id)
+    )
+    post_ids = [p["post_id"] for p in posts]
+    own_posts = set(post_ids)
+    refs = {
+        "post_ids": post_ids,
+        "activity_ids": [a["activity_id"] for a in activities],
+        # Counters of other users to decrement once the rows are gone
+        "liked_posts": {c["_id"]: c["count"] for c in likes if c["_id"] not in own_posts},
+        "commented_posts": {c["_id"]: c["count"] for c in comments if c["_id"] not in own_posts},
+        "friend_ids": friend_ids,
+        "notified_users": {c["_id"]: c["count"] for c in unread}
+    }
+    await db.deletion_jobs.update_one({"job_id": job["job_id"], "owner": job["owner"]}, {"$set": {"refs": refs}})
+    return refs
+
+
+async def _delete_collection(db, job_id: str, owner: str, name: str, user_id: str, refs: dict, semaphore):
+    async with semaphore:
+        result = await db[name].delete_many(deletion_filter(name, user_id, refs))
+        await db.deletion_jobs.update_one({"job_id": job_id, "owner": owner}, {
+            "$set": {f"collections.{name}": {"status": "done", "deleted": result.deleted_count}},
+            "$inc": {"deleted_total": result.deleted_count}
+        })
+        return result.deleted_count
+
+
+async def _finalize(db, refs: dict):
+    post_operations = [
+        UpdateOne({"post_id": post_id}, {"$inc": {"likes_count": -count}})
+        for post_id, count in refs.get("liked_posts", {}).items()
+    ] + [
+        UpdateOne({"post_id": post_id}, {"$inc": {"comments_count": -count}})
+        for post_id, count in refs.get("commented_posts", {}).items()
+    ]
+    if post_operations:
+        await db.social_posts.bulk_write(post_operations, ordered=False)
+    if refs.get("friend_ids"):
+        await db.profile_stats.bulk_write([
+            UpdateOne({"user_id": friend_id}, {"$inc": {"friends_count": -1}})
+            for friend_id in refs["friend_ids"]
+        ], ordered=False)
+    if refs.get("notified_users"):
+        await db.notification_counters.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$inc": {"unread": -count}})
+            for user_id, count in refs["notified_users"].items()
+        ], ordered=False)
+
+
+async def run_deletion_job(db, job_id: str):
+    """Run (or resume) an account deletion job"""
+    owner = uuid.uuid4().hex
+    job = await acquire_lease(db.deletion_jobs, job_id, owner, DELETION_LEASE_SECONDS)
+    if not job:
+        return
+    try:
+        async with renewing_lease(db.deletion_jobs, job_id, owner, DELETION_LEASE_SECONDS):
+            refs = job.get("refs") or await _prepare(db, job)
+            done = {name for name, state in (job.get("collections") or {}).items() if state.get("status") == "done"}
+            semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+            await asyncio.gather(*(
+                _delete_collection(db, job_id, owner, name, job["user_id"], refs, semaphore)
+                for name in USER_DATA_REGISTRY if name not in done
+            ))
+
+            # Mark before applying: decrements must never run twice
+            marked = await db.deletion_jobs.update_one(
+                {"job_id": job_id, "owner": owner, "finalized": {"$ne": True}},
+                {"$set": {"finalized": True}}
+            )
+            if marked.modified_count:
+                await _finalize(db, refs)
+        if await finish_job(db.deletion_jobs, job_id, owner, {}, unset={"refs": ""}):
+            logger.info(f"[Deletion] Job {job_id} completed")
+    except Exception as e:
+        logger.error(f"[Deletion] Job {job_id} failed: {e}")
+        await fail_job(db.deletion_jobs, job_id, owner, str(e))
+
+
+def start_deletion_job(db, job_id: str):
+    """Schedule run_deletion_job in the running event loop"""
+    if job_id in _RUNNING and not _RUNNING[job_id].done():
+        return
+    task = asyncio.create_task(run_deletion_job(db, job_id))
+    _RUNNING[job_id] = task
+    task.add_done_callback(lambda _: _RUNNING.pop(job_id, None))
+
+
+async def disable_account(db, user_id: str):
+    """Revoke every session and lock the account out until the job has deleted it"""
+    await asyncio.gather(
+        db.user_sessions.delete_many({"user_id": user_id}),
+        db.users.update_one({"user_id": user_id}, {"$set": {
+            "disabled": True,
+            "deletion_requested_at": datetime.now(timezone.utc).isoformat()
+        }})
+    )
+
+
+async def create_deletion_job(db, user_id: str) -> dict:
+    """Disable the account and queue the deletion of its data (reuses the user's unfinished job)"""
+    await disable_account(db, user_id)
+    active = await db.deletion_jobs.find_one(
+        {"user_id": user_id, "status": {"$in": ["pending", "running", "failed"]}},
+        {"_id": 0, "refs": 0}
+    )
+    if active:
+        if active["status"] == "failed":
+            await retry_job(db.deletion_jobs, active["job_id"])
+            active["status"] = "pending"
+        start_deletion_job(db, active["job_id"])
+        return active
+
+    job = {
+        "job_id": f"del_{uuid.uuid4().hex[:16]}",
+        "user_id": user_id,
+        "status": "pending",
+        "collections_total": len(USER_DATA_REGISTRY),
+        "collections": {},
+        "deleted_total": 0,
+        "lease_until": None,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.deletion_jobs.insert_one(job)
+    job.pop("_id", None)
+    start_deletion_job(db, job["job_id"])
+    return job
+
+
+async def resume_deletion_jobs(db) -> int:
+    """Restart deletions interrupted by a crash or redeploy, or failed (called at startup)"""
+    jobs = await db.deletion_jobs.find(
+        {"status": {"$in": ["pending", "running", "failed"]}},
+        {"_id": 0, "job_id": 1, "status": 1}
+    ).to_list(None)
+    for job in jobs:
+        if job["status"] == "failed":
+            # The account is already disabled: the user cannot ask again
+            await retry_job(db.deletion_jobs, job["job_id"])
+        start_deletion_job(db, job["job_id"])
+    return len(jobs)
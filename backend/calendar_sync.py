@@ -0,0 +1,255 @@
+"""
+Google Calendar access off the event loop + incremental agenda sync
+googleapiclient and google-auth are blocking (HTTP in .execute() and
+creds.refresh()): every call goes through run_blocking(), a bounded thread pool.
+
+Agenda sync uses Calendar API sync tokens: a full sync lists the events of the
+next SYNC_WINDOW_DAYS (timeMin/timeMax) and stores nextSyncToken; later runs
+only fetch what changed since. Changes are applied with one bulk_write of
+upserts/deletes keyed on (user_id, google_event_id). An expired token (HTTP
+410) triggers a full sync, and so does a full sync older than
+FULL_SYNC_INTERVAL: incremental changes never bring back an unchanged event
+that was beyond the window, so the window is re-listed as it moves forward.
+Starts are compared as UTC datetimes: appointments keep the event's own
+start in `datetime` and the normalized UTC one in `starts_at`.
+
+The API is reached through a CalendarService; tests and local runs use
+FakeCalendarService (set_calendar_service_factory or CALENDAR_SERVICE=fake).
+"""
+import abc
+import asyncio
+import itertools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+from pymongo import UpdateOne, DeleteOne, DeleteMany
+
+from lazy_imports import lazy_import
+
+logger = logging.getLogger(__name__)
+
+google_discovery = lazy_import("googleapiclient.discovery", warm=False)
+google_errors = lazy_import("googleapiclient.errors", warm=False)
+
+CALENDAR_WORKERS = int(os.environ.get("CALENDAR_WORKERS", "8"))
+# Events further ahead than this are not copied into the agenda
+SYNC_WINDOW_DAYS = 30
+# The window is re-listed (full sync) at least this often
+FULL_SYNC_INTERVAL = timedelta(days=1)
+SYNC_PAGE_SIZE = 250
+
+_executor = ThreadPoolExecutor(max_workers=CALENDAR_WORKERS, thread_name_prefix="gcal")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking Google client call in the bounded calendar pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, lambda: func(*args, **kwargs))
+
+
+class SyncTokenExpired(Exception):
+    """The stored sync token is no longer valid (HTTP 410): do a full sync"""
+
+
+class CalendarService(abc.ABC):
+    """Blocking Calendar API surface used by the app"""
+
+    @abc.abstractmethod
+    def list_events(self, **params) -> dict:
+        """events.list on the primary calendar; raises SyncTokenExpired on HTTP 410"""
+
+
+class GoogleCalendarService(CalendarService):
+    def __init__(self, creds):
+        self._service = google_discovery.build('calendar', 'v3', credentials=creds, cache_discovery=False)
+
+    def list_events(self, **params) -> dict:
+        try:
+            return self._service.events().list(calendarId='primary', **params).execute()
+        except google_errors.HttpError as e:
+            if getattr(e, "status_code", None) == 410 or getattr(e.resp, "status", None) == 410:
+                raise SyncTokenExpired() from e
+            raise
+
+
+class FakeCalendarService(CalendarService):
+    """In-memory calendar with sync token semantics (tests, local runs)"""
+
+    def __init__(self, events=()):
+        self._clock = itertools.count(1)
+        self.events = {}
+        self.calls = []
+        self.expired_tokens = set()
+        for event in events:
+            self.put(event)
+
+    def put(self, event: dict):
+        """Create or update an event (bumps its change sequence)"""
+        self.events[event["id"]] = {"status": "confirmed", **event, "_seq": next(self._clock)}
+
+    def cancel(self, event_id: str):
+        self.put({**self.events[event_id], "status": "cancelled"})
+
+    def list_events(self, **params) -> dict:
+        self.calls.append(params)
+        sync_token = params.get("syncToken")
+        if sync_token in self.expired_tokens:
+            raise SyncTokenExpired()
+        since = int(sync_token) if sync_token else 0
+        items = sorted(
+            (e for e in self.events.values() if e["_seq"] > since),
+            key=lambda e: e["_seq"]
+        )
+        if not sync_token:
+            # Full sync: only live events in range
+            time_min, time_max = params.get("timeMin"), params.get("timeMax")
+            items = [e for e in items if e["status"] != "cancelled"
+                     and (not time_min or _event_start_utc(e) >= datetime.fromisoformat(time_min))
+                     and (not time_max or _event_start_utc(e) < datetime.fromisoformat(time_max))]
+        offset = int(params.get("pageToken") or 0)
+        page_size = params.get("maxResults", SYNC_PAGE_SIZE)
+        page = items[offset:offset + page_size]
+        result = {"items": [{k: v for k, v in e.items() if k != "_seq"} for e in page]}
+        if offset + page_size < len(items):
+            result["nextPageToken"] = str(offset + page_size)
+        else:
+            result["nextSyncToken"] = str(max((e["_seq"] for e in self.events.values()), default=0))
+        return result
+
+
+def _default_factory(creds) -> CalendarService:
+    if os.environ.get("CALENDAR_SERVICE") == "fake":
+        return FakeCalendarService()
+    return GoogleCalendarService(creds)
+
+
+_service_factory = _default_factory
+
+
+def set_calendar_service_factory(factory):
+    """Swap how services are built from credentials (tests: lambda creds: fake)"""
+    global _service_factory
+    _service_factory = factory or _default_factory
+
+
+async def get_calendar_service(creds) -> CalendarService:
+    """Build the service off the loop (discovery document load)"""
+    return await run_blocking(_service_factory, creds)
+
+
+def _event_start(event: dict) -> str:
+    start = event.get('start', {})
+    return start.get('dateTime') or start.get('date') or ""
+
+
+def _event_start_utc(event: dict):
+    """Start of an event as an aware UTC datetime (all-day events: midnight UTC), None if absent
+
+    RFC3339 strings with different offsets, and bare dates, do not compare
+    correctly as text.
+    """
+    start = _event_start(event)
+    if not start:
+        return None
+    parsed = datetime.fromisoformat(start.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+async def _list_all(service: CalendarService, **params):
+    """All pages of a list call -> (items, nextSyncToken)"""
+    items, page_token = [], None
+    while True:
+        page = await run_blocking(service.list_events, **params, **({"pageToken": page_token} if page_token else {}))
+        items.extend(page.get('items', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return items, page.get('nextSyncToken')
+
+
+def _agenda_operations(user_id: str, events: list, window_end: datetime) -> list:
+    now = datetime.now(timezone.utc).isoformat()
+    operations = []
+    for event in events:
+        key = {"user_id": user_id, "google_event_id": event.get('id')}
+        starts_at = _event_start_utc(event)
+        if event.get('status') == 'cancelled' or (starts_at and starts_at > window_end):
+            operations.append(DeleteOne(key))
+            continue
+        operations.append(UpdateOne(key, {
+            "$set": {
+                "title": event.get('summary', 'Sans titre'),
+                "description": event.get('description', ''),
+                "datetime": _event_start(event),
+                # Normalized UTC start: what range filters compare against
+                "starts_at": starts_at.isoformat() if starts_at else None,
+                "updated_at": now
+            },
+            "$setOnInsert": {
+                "appointment_id": f"gcal_{event.get('id')}",
+                "type": "event",
+                "source": "google_calendar",
+                "created_at": now
+            }
+        }, upsert=True))
+    return operations
+
+
+async def sync_calendar_events(db, user_id: str, service: CalendarService) -> dict:
+    """Incremental (sync token) or full sync of upcoming events into appointments"""
+    state = await db.google_calendar_tokens.find_one(
+        {"user_id": user_id}, {"_id": 0, "sync_token": 1, "full_sync_at": 1}
+    ) or {}
+    sync_token = state.get("sync_token")
+    now = datetime.now(timezone.utc)
+    window_end = now + timedelta(days=SYNC_WINDOW_DAYS)
+    window_moved = not state.get("full_sync_at") or (
+        now - datetime.fromisoformat(state["full_sync_at"]) >= FULL_SYNC_INTERVAL
+    )
+
+    mode = "incremental"
+    try:
+        if not sync_token or window_moved:
+            raise SyncTokenExpired()
+        events, next_token = await _list_all(
+            service, syncToken=sync_token, singleEvents=True, maxResults=SYNC_PAGE_SIZE
+        )
+    except SyncTokenExpired:
+        mode = "full"
+        events, next_token = await _list_all(
+            service, timeMin=now.isoformat(), timeMax=window_end.isoformat(), singleEvents=True,
+            maxResults=SYNC_PAGE_SIZE
+        )
+
+    operations = _agenda_operations(user_id, events, window_end)
+    if mode == "full":
+        # Upcoming events deleted while we had no valid token
+        operations.append(DeleteMany({
+            "user_id": user_id,
+            "source": "google_calendar",
+            "$or": [
+                {"starts_at": {"$gte": now.isoformat()}},
+                # Synced before starts_at was stored: best effort on the raw start
+                {"starts_at": {"$exists": False}, "datetime": {"$gte": now.isoformat()}}
+            ],
+            "google_event_id": {"$nin": [e.get('id') for e in events]}
+        }))
+    result = None
+    if operations:
+        result = await db.appointments.bulk_write(operations, ordered=False)
+    if next_token:
+        update = {"sync_token": next_token, "last_sync_at": now.isoformat()}
+        if mode == "full":
+            update["full_sync_at"] = now.isoformat()
+        await db.google_calendar_tokens.update_one({"user_id": user_id}, {"$set": update})
+
+    return {
+        "mode": mode,
+        "total_events": len(events),
+        "synced": result.upserted_count if result else 0,
+        "updated": result.modified_count if result else 0,
+        "removed": result.deleted_count if result else 0
+    }
@@ -4,17 +4,32 @@ Handles automatic interactions between fake users at different times
 """
 import asyncio
 import random
+import time
 from datetime import datetime, timezone, timedelta
 import uuid
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from profile_stats import bump_profile_stats_many
+
 logger = logging.getLogger(__name__)
 
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'fatslim')
+# Run windows (local time): (name, first hour, last hour, every N minutes)
+# Same slots as the former APScheduler cron jobs, e.g. hour='6-9', minute='*/30'
+AUTOMATION_WINDOWS = [
+    ("community_morning", 6, 9, 30),
+    ("community_noon", 11, 14, 45),
+    ("community_afternoon", 15, 18, 40),
+    ("community_evening", 19, 22, 35),
+]
+# Random delay added to each slot so workers/instances don't fire in lockstep
+AUTOMATION_JITTER_SECONDS = int(os.environ.get('COMMUNITY_AUTOMATION_JITTER', '300'))
+# Cross-worker lease: one worker runs each slot (the lease records the slot it
+# was taken for), and a crashed holder's lease expires for the next slot
+AUTOMATION_LEASE_SECONDS = 15 * 60
 
 # Post content templates
 POST_CONTENTS_FR = [
@@ -42,26 +57,17 @@ COMMENT_TEMPLATES_FR = [
 COMMUNITY_GROUPS = ["fitness", "cardio", "nutrition", "weight_loss", "muscle_gain", "yoga", "running", "wellness"]
 
 
-async def get_db():
-    """Get database connection"""
-    client = AsyncIOMotorClient(MONGO_URL)
-    return client[DB_NAME]
-
-
 async def get_fake_users(db, limit=500):
     """Get list of fake users"""
     return await db.users.find({"is_fake": True}, {"user_id": 1, "name": 1, "avatar": 1}).limit(limit).to_list(limit)
 
 
-async def create_automated_post(db, fake_users):
-    """Create a new post from a random fake user"""
-    if not fake_users:
-        return None
-    
+def build_automated_post(fake_users):
+    """Build a new post document from a random fake user"""
     poster = random.choice(fake_users)
     fake_user_ids = [u["user_id"] for u in fake_users]
     
-    post = {
+    return {
         "post_id": f"auto_{uuid.uuid4().hex[:12]}",
         "user_id": poster["user_id"],
         "content": random.choice(POST_CONTENTS_FR),
@@ -73,14 +79,22 @@ async def create_automated_post(db, fake_users):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "is_automated": True
     }
+
+
+async def create_automated_posts(db, fake_users, count):
+    """Create `count` posts from random fake users in one insert_many"""
+    if not fake_users or count <= 0:
+        return []
     
-    await db.social_posts.insert_one(post)
-    logger.info(f"[AutoScheduler] Created post by {poster['name']}")
-    return post
+    posts = [build_automated_post(fake_users) for _ in range(count)]
+    await db.social_posts.insert_many(posts, ordered=False)
+    await bump_profile_stats_many(db, "posts_count", [p["user_id"] for p in posts])
+    logger.info(f"[AutoScheduler] Created {len(posts)} posts")
+    return posts
 
 
 async def add_automated_comments(db, fake_users):
-    """Add comments to recent posts"""
+    """Add comments to recent posts (one read + one bulk_write)"""
     if len(fake_users) < 5:
         return 0
     
@@ -91,7 +105,7 @@ async def add_automated_comments(db, fake_users):
         {"post_id": 1, "comments": 1}
     ).limit(50).to_list(50)
     
-    comments_added = 0
+    operations = []
     for post in random.sample(recent_posts, min(10, len(recent_posts))):
         # Check if we should add a comment (not too many)
         existing_comments = len(post.get("comments", []) or [])
@@ -106,19 +120,17 @@ async def add_automated_comments(db, fake_users):
             "content": random.choice(COMMENT_TEMPLATES_FR),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        
-        await db.social_posts.update_one(
-            {"post_id": post["post_id"]},
-            {"$push": {"comments": comment}}
-        )
-        comments_added += 1
+        operations.append(UpdateOne({"post_id": post["post_id"]}, {"$push": {"comments": comment}}))
+    
+    if operations:
+        await db.social_posts.bulk_write(operations, ordered=False)
     
-    logger.info(f"[AutoScheduler] Added {comments_added} comments")
-    return comments_added
+    logger.info(f"[AutoScheduler] Added {len(operations)} comments")
+    return len(operations)
 
 
 async def add_automated_likes(db, fake_users):
-    """Add likes to recent posts"""
+    """Add likes to recent posts (one read + one bulk_write)"""
     if len(fake_users) < 5:
         return 0
     
@@ -130,9 +142,10 @@ async def add_automated_likes(db, fake_users):
         {"post_id": 1, "likes": 1}
     ).sort("created_at", -1).limit(100).to_list(100)
     
+    operations = []
     likes_added = 0
     for post in random.sample(recent_posts, min(30, len(recent_posts))):
-        existing_likes = post.get("likes", []) or []
+        existing_likes = set(post.get("likes", []) or [])
         
         # Add 1-10 new likes
         potential_likers = [uid for uid in fake_user_ids if uid not in existing_likes]
@@ -140,53 +153,87 @@ async def add_automated_likes(db, fake_users):
             continue
             
         new_likers = random.sample(potential_likers, min(random.randint(1, 10), len(potential_likers)))
-        
-        await db.social_posts.update_one(
+        operations.append(UpdateOne(
             {"post_id": post["post_id"]},
             {"$addToSet": {"likes": {"$each": new_likers}}}
-        )
+        ))
         likes_added += len(new_likers)
     
+    if operations:
+        await db.social_posts.bulk_write(operations, ordered=False)
+    
     logger.info(f"[AutoScheduler] Added {likes_added} likes")
     return likes_added
 
 
+def friendship_pair_key(user1: str, user2: str) -> str:
+    """Canonical, direction-independent key of a friendship (min:max)"""
+    return f"{min(user1, user2)}:{max(user1, user2)}"
+
+
 async def create_automated_friendships(db, fake_users):
-    """Create friendships between fake users"""
+    """Create friendships between fake users (one $in pre-check + one insert_many)"""
     if len(fake_users) < 10:
         return 0
     
     fake_user_ids = [u["user_id"] for u in fake_users]
-    friendships_created = 0
     
+    # Candidate pairs, deduplicated on the canonical key
+    candidates = {}
     for _ in range(random.randint(5, 20)):
         user1, user2 = random.sample(fake_user_ids, 2)
-        
-        existing = await db.friendships.find_one({
-            "$or": [
-                {"user_id": user1, "friend_id": user2},
-                {"user_id": user2, "friend_id": user1}
-            ]
-        })
-        
-        if not existing:
-            await db.friendships.insert_one({
-                "friendship_id": f"auto_friend_{uuid.uuid4().hex[:8]}",
-                "user_id": user1,
-                "friend_id": user2,
-                "status": "accepted",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
-            friendships_created += 1
-    
-    logger.info(f"[AutoScheduler] Created {friendships_created} friendships")
-    return friendships_created
-
-
-async def run_automated_interactions():
-    """Main function to run all automated interactions"""
+        candidates.setdefault(friendship_pair_key(user1, user2), (user1, user2))
+    
+    # Single pre-check. Older friendship documents have no pair_key, so they
+    # are matched on both user fields within the candidate ids.
+    candidate_ids = list({uid for pair in candidates.values() for uid in pair})
+    existing = await db.friendships.find(
+        {"$or": [
+            {"pair_key": {"$in": list(candidates)}},
+            {"user_id": {"$in": candidate_ids}, "friend_id": {"$in": candidate_ids}}
+        ]},
+        {"_id": 0, "user_id": 1, "friend_id": 1}
+    ).to_list(None)
+    existing_keys = {friendship_pair_key(f["user_id"], f["friend_id"]) for f in existing}
+    
+    now = datetime.now(timezone.utc).isoformat()
+    new_friendships = [
+        {
+            "friendship_id": f"auto_friend_{uuid.uuid4().hex[:8]}",
+            "pair_key": key,
+            "user_id": user1,
+            "friend_id": user2,
+            "status": "accepted",
+            "created_at": now
+        }
+        for key, (user1, user2) in candidates.items()
+        if key not in existing_keys
+    ]
+    if new_friendships:
+        try:
+            await db.friendships.insert_many(new_friendships, ordered=False)
+        except BulkWriteError as e:
+            # Unique pair_key: a pair created concurrently since the pre-check is skipped
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            skipped = {err["index"] for err in errors}
+            new_friendships = [f for i, f in enumerate(new_friendships) if i not in skipped]
+        await bump_profile_stats_many(
+            db, "friends_count", [uid for f in new_friendships for uid in (f["user_id"], f["friend_id"])]
+        )
+    
+    logger.info(f"[AutoScheduler] Created {len(new_friendships)} friendships")
+    return len(new_friendships)
+
+
+async def run_automated_interactions(db):
+    """Main function to run all automated interactions.
+
+    Bounded round trips per tick: fake users, posts insert, comments read +
+    bulk_write, likes read + bulk_write, friendships pre-check + insert, log.
+    """
     try:
-        db = await get_db()
         fake_users = await get_fake_users(db)
         
         if len(fake_users) < 10:
@@ -202,10 +249,8 @@ async def run_automated_interactions():
         }
         
         # Create 2-5 new posts
-        for _ in range(random.randint(2, 5)):
-            post = await create_automated_post(db, fake_users)
-            if post:
-                results["posts_created"] += 1
+        posts = await create_automated_posts(db, fake_users, random.randint(2, 5))
+        results["posts_created"] = len(posts)
         
         # Add comments
         results["comments_added"] = await add_automated_comments(db, fake_users)
@@ -231,12 +276,142 @@ async def run_automated_interactions():
         return {"status": "error", "error": str(e)}
 
 
-# Function to be called by APScheduler
-def run_community_automation():
-    """Synchronous wrapper for the async automation"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(run_automated_interactions())
-    finally:
-        loop.close()
+def next_run_time(now: datetime) -> datetime:
+    """Next slot of AUTOMATION_WINDOWS strictly after `now` (aware, local time)"""
+    candidates = []
+    for day_offset in (0, 1):
+        day = (now + timedelta(days=day_offset)).replace(hour=0, minute=0, second=0, microsecond=0)
+        for _, first_hour, last_hour, every in AUTOMATION_WINDOWS:
+            for hour in range(first_hour, last_hour + 1):
+                for minute in range(0, 60, every):
+                    slot = day.replace(hour=hour, minute=minute)
+                    if slot > now:
+                        candidates.append(slot)
+        if candidates:
+            break
+    return min(candidates)
+
+
+class CommunityScheduler:
+    """asyncio-native runner for the community automation.
+
+    Runs in the app's event loop with the app's Motor `db` handle (no extra
+    thread, loop or connection pool). A tick never overlaps another one: an
+    in-process lock guards this worker and a Mongo lease guards the others.
+    Each slot runs once across all workers, whatever their jitter.
+    """
+
+    def __init__(self, db, jitter_seconds: int = AUTOMATION_JITTER_SECONDS):
+        self.db = db
+        self.jitter_seconds = jitter_seconds
+        self.owner_id = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self._task = None
+        self._lock = asyncio.Lock()
+        self.metrics = {
+            "runs": 0,
+            "failures": 0,
+            "skipped_overlap": 0,
+            "skipped_lease": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "max_duration_ms": 0.0,
+            "total_duration_ms": 0.0,
+            "next_run_at": None,
+            "last_result": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._loop())
+            logger.info("[AutoScheduler] Community automation scheduler started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("[AutoScheduler] Community automation scheduler stopped")
+
+    async def _loop(self):
+        while True:
+            now = datetime.now().astimezone()
+            slot = next_run_time(now)
+            run_at = slot + timedelta(seconds=random.uniform(0, self.jitter_seconds))
+            self.metrics["next_run_at"] = run_at.isoformat()
+            await asyncio.sleep((run_at - now).total_seconds())
+            try:
+                await self.run_once(slot)
+            except Exception as e:
+                logger.error(f"[AutoScheduler] Tick failed: {e}")
+
+    async def _acquire_lease(self, slot: str) -> bool:
+        """Take the lease for `slot`; False if held, or if this slot already ran on any worker"""
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await self.db.scheduler_locks.find_one_and_update(
+                {"_id": "community_automation", "slot": {"$ne": slot}, "locked_until": {"$lt": now.isoformat()}},
+                {"$set": {
+                    "owner": self.owner_id,
+                    "slot": slot,
+                    "locked_until": (now + timedelta(seconds=AUTOMATION_LEASE_SECONDS)).isoformat()
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lease document exists: held by another worker, or already taken for this slot
+            return False
+        return bool(lease) and lease.get("owner") == self.owner_id
+
+    async def _release_lease(self):
+        # Keeps `slot`: workers whose jitter wakes them later skip this slot
+        await self.db.scheduler_locks.update_one(
+            {"_id": "community_automation", "owner": self.owner_id},
+            {"$set": {"locked_until": datetime.now(timezone.utc).isoformat()}}
+        )
+
+    async def run_once(self, slot: datetime) -> dict:
+        """Run the automation tick of `slot` unless it ran or is running (here or on another worker)"""
+        if self._lock.locked():
+            self.metrics["skipped_overlap"] += 1
+            logger.warning("[AutoScheduler] Previous run still in progress, skipping")
+            return {"status": "skipped", "reason": "already running"}
+
+        async with self._lock:
+            if not await self._acquire_lease(slot.isoformat()):
+                self.metrics["skipped_lease"] += 1
+                return {"status": "skipped", "reason": "running on another worker"}
+
+            start = time.perf_counter()
+            try:
+                result = await run_automated_interactions(self.db)
+            finally:
+                await self._release_lease()
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            self.metrics["runs"] += 1
+            if result.get("status") == "error":
+                self.metrics["failures"] += 1
+            self.metrics["last_run_at"] = datetime.now(timezone.utc).isoformat()
+            self.metrics["last_duration_ms"] = duration_ms
+            self.metrics["max_duration_ms"] = max(self.metrics["max_duration_ms"], duration_ms)
+            self.metrics["total_duration_ms"] = round(self.metrics["total_duration_ms"] + duration_ms, 1)
+            self.metrics["last_result"] = result
+            logger.info(f"[AutoScheduler] Tick done in {duration_ms} ms")
+            return result
+
+    def get_metrics(self) -> dict:
+        runs = self.metrics["runs"]
+        return {
+            **self.metrics,
+            "running": self.running,
+            "in_progress": self._lock.locked(),
+            "avg_duration_ms": round(self.metrics["total_duration_ms"] / runs, 1) if runs else None,
+        }
@@ -0,0 +1,79 @@
+"""
+Premium entitlement cache
+Premium checks sit on hot paths (auth context, gated features). The active
+subscription of a user is read once, its expiry parsed once, and kept in
+process memory; a check is then a datetime comparison with no Mongo read.
+
+- An entitlement stops being premium by itself at its stored expiry instant.
+- verify/cancel call invalidate() so the next check reloads. This only
+  clears the cache of the worker that handled the request.
+- Active entries are reloaded after ENTITLEMENT_TTL seconds. Non-premium
+  entries (no subscription, or expired) are reloaded after
+  ENTITLEMENT_NEGATIVE_TTL seconds, so a purchase handled by another worker
+  process is picked up quickly everywhere.
+"""
+import time
+from datetime import datetime, timezone
+
+ENTITLEMENT_TTL = 600
+ENTITLEMENT_NEGATIVE_TTL = 30
+ENTITLEMENT_CACHE_SIZE = 50000
+
+# user_id -> {"expires_at": datetime | None, "subscription": dict | None, "loaded_at": monotonic}
+_cache = {}
+
+
+def _parse_expiry(value):
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def _load(db, user_id: str) -> dict:
+    subscription = await db.premium_subscriptions.find_one(
+        {"user_id": user_id, "status": {"$in": ["active", "cancelled"]}},  # Cancelled but not expired
+        {"_id": 0, "product_id": 1, "status": 1, "start_date": 1, "expiry_date": 1, "next_billing_date": 1},
+        sort=[("expiry_date", -1)]
+    )
+    if len(_cache) >= ENTITLEMENT_CACHE_SIZE:
+        # Drop the oldest half (insertion order) rather than grow without bound
+        for key in list(_cache)[:ENTITLEMENT_CACHE_SIZE // 2]:
+            _cache.pop(key, None)
+    entry = {
+        "expires_at": _parse_expiry(subscription.get("expiry_date")) if subscription else None,
+        "subscription": subscription,
+        "loaded_at": time.monotonic()
+    }
+    _cache[user_id] = entry
+    return entry
+
+
+async def get_entitlement(db, user_id: str) -> dict:
+    """Cached entitlement of a user (reads Mongo only on a miss or once the entry's TTL has passed)"""
+    entry = _cache.get(user_id)
+    if entry is None or time.monotonic() - entry["loaded_at"] > _ttl(entry):
+        entry = await _load(db, user_id)
+    return entry
+
+
+def is_active(entry: dict) -> bool:
+    expires_at = entry.get("expires_at")
+    return bool(expires_at and expires_at > datetime.now(timezone.utc))
+
+
+def _ttl(entry: dict) -> float:
+    # A purchase on another worker must not wait ENTITLEMENT_TTL to unlock premium
+    return ENTITLEMENT_TTL if is_active(entry) else ENTITLEMENT_NEGATIVE_TTL
+
+
+async def is_premium(db, user_id: str) -> bool:
+    return is_active(await get_entitlement(db, user_id))
+
+
+def invalidate(user_id: str):
+    """Forget a user's entitlement (subscription changed)"""
+    _cache.pop(user_id, None)
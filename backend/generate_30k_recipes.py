@@ -460,6 +460,10 @@ if __name__ == "__main__":
     with open('recipes_30k.json', 'w', encoding='utf-8') as f:
         json.dump(all_recipes, f, ensure_ascii=False)
     
+    # Compact binary store served (memory-mapped) by recipes_database.py
+    from recipe_store import convert_json_to_store
+    convert_json_to_store('recipes_30k.json', 'recipes_30k.bin')
+    
     # Stats
     categories_count = {}
     nutriscores_count = {"A": 0, "B": 0, "C": 0, "D": 0}
@@ -0,0 +1,116 @@
+"""
+Leases for resumable background jobs
+Job documents (seed_jobs, deletion_jobs, migrations) carry `status`, `owner`
+and `lease_until`. A worker only works on a job while it holds the lease and
+renews it as it goes; when a worker dies its lease runs out and another
+worker (or the next startup) takes the job over.
+
+- A new job is created with `lease_until: None`, which counts as expired.
+- acquire_lease() waits for the current holder's lease to run out instead of
+  giving up, so a restart that lands inside the lease still resumes the job.
+- Every write a worker makes after claiming is filtered on its owner id, so a
+  worker that lost its lease cannot complete or fail someone else's run.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ["pending", "running"]
+
+
+def _parse(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+async def claim_lease(collection, job_id: str, owner: str, lease_seconds: int, key: str = "job_id"):
+    """Take (or renew) the job lease; None if another worker holds it or the job is finished"""
+    now = datetime.now(timezone.utc)
+    return await collection.find_one_and_update(
+        {
+            key: job_id,
+            "status": {"$in": ACTIVE_STATUSES},
+            "$or": [
+                {"owner": owner},
+                {"lease_until": None},
+                {"lease_until": {"$lt": now.isoformat()}}
+            ]
+        },
+        {"$set": {
+            "owner": owner,
+            "status": "running",
+            "lease_until": (now + timedelta(seconds=lease_seconds)).isoformat(),
+            "updated_at": now.isoformat()
+        }},
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0}
+    )
+
+
+async def acquire_lease(collection, job_id: str, owner: str, lease_seconds: int, key: str = "job_id"):
+    """Claim the job, waiting for another holder's lease to expire; None once the job is finished"""
+    while True:
+        job = await claim_lease(collection, job_id, owner, lease_seconds, key)
+        if job:
+            return job
+        current = await collection.find_one({key: job_id}, {"_id": 0, "status": 1, "lease_until": 1})
+        if not current or current.get("status") not in ACTIVE_STATUSES:
+            return None
+        # Held by a live worker (renewing) or a dead one (will expire): check back after the lease
+        wait = lease_seconds
+        if current.get("lease_until"):
+            wait = (_parse(current["lease_until"]) - datetime.now(timezone.utc)).total_seconds()
+        await asyncio.sleep(min(max(wait, 0) + 1, lease_seconds))
+
+
+@asynccontextmanager
+async def renewing_lease(collection, job_id: str, owner: str, lease_seconds: int, key: str = "job_id"):
+    """Renew the lease every lease_seconds / 3 while the block runs"""
+    async def renew():
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if not await claim_lease(collection, job_id, owner, lease_seconds, key):
+                logger.warning(f"[Lease] Lost lease on {collection.name} {job_id}")
+                return
+
+    renewer = asyncio.create_task(renew())
+    try:
+        yield
+    finally:
+        renewer.cancel()
+
+
+async def finish_job(collection, job_id: str, owner: str, fields: dict, key: str = "job_id", unset: dict = None) -> bool:
+    """Mark the job completed (only if this worker still owns it)"""
+    update = {"$set": {
+        "status": "completed",
+        "lease_until": None,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+        **fields
+    }}
+    if unset:
+        update["$unset"] = unset
+    result = await collection.update_one({key: job_id, "owner": owner}, update)
+    return result.modified_count > 0
+
+
+async def fail_job(collection, job_id: str, owner: str, error: str, key: str = "job_id") -> bool:
+    """Mark the job failed (only if this worker still owns it)"""
+    result = await collection.update_one(
+        {key: job_id, "owner": owner},
+        {"$set": {"status": "failed", "error": error, "lease_until": None}}
+    )
+    return result.modified_count > 0
+
+
+async def retry_job(collection, job_id: str, key: str = "job_id"):
+    """Put a failed job back in the queue"""
+    await collection.update_one(
+        {key: job_id, "status": "failed"},
+        {"$set": {"status": "pending", "lease_until": None}, "$unset": {"error": ""}}
+    )
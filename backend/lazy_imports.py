@@ -0,0 +1,75 @@
+"""
+Explicit lazy loading of heavy optional dependencies + warm-up hooks
+Heavy modules (LLM client, Google APIs, dateutil...) are declared once at the top
+of server.py with lazy_import() and only imported on first attribute access.
+Warm-up hooks run after the app has started so that neither worker boot nor the
+first user request pays the import cost.
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# name -> callable run by run_warmups() after startup
+_WARMUPS = {}
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the module now (idempotent, thread-safe)"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name: str, warm: bool = True) -> LazyModule:
+    """Declare a lazily imported module, preloaded by run_warmups() if warm=True"""
+    module = LazyModule(name)
+    if warm:
+        register_warmup(f"import:{name}", module.load)
+    return module
+
+
+def register_warmup(name: str, func):
+    """Register a warm-up hook (sync callable, run in a worker thread)"""
+    _WARMUPS[name] = func
+    return func
+
+
+async def run_warmups() -> dict:
+    """Run every warm-up hook off the event loop, returns {name: seconds or error}"""
+    results = {}
+    for name, func in list(_WARMUPS.items()):
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(func)
+            results[name] = round(time.perf_counter() - start, 4)
+        except Exception as e:
+            # Optional dependency missing or broken: the handler will report it on use
+            results[name] = f"error: {e}"
+            logger.warning(f"[Warmup] {name} failed: {e}")
+    logger.info(f"[Warmup] Completed: {results}")
+    return results
@@ -0,0 +1,316 @@
+"""
+One-time data migrations
+Backfills and data fixes that used to run inline in startup_event (and held
+every worker's startup on a full collection scan) are registered here and run
+once for the whole deployment, in the background, by run_migrations().
+
+Each migration has a document in `migrations` (migration_id, status, owner,
+lease_until) and runs under a job_lease lease: the first worker to claim it
+runs it while the others wait for the lease and then find it completed. A
+failed migration is retried at the next startup. Migrations run in
+registration order and must be idempotent, since a worker can die halfway.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from community_scheduler import friendship_pair_key
+from job_lease import acquire_lease, renewing_lease, finish_job, fail_job, retry_job
+from utils.search_tokens import user_search_tokens
+from utils.shopping_quantities import merge_quantities
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LEASE_SECONDS = 120
+
+# (migration_id, async function(db) -> result), in run order
+MIGRATIONS = []
+
+
+def migration(migration_id: str):
+    """Register a migration; it runs after the ones registered before it"""
+    def register(func):
+        MIGRATIONS.append((migration_id, func))
+        return func
+    return register
+
+
+async def run_migration(db, migration_id: str, func, owner: str) -> bool:
+    """Run one migration unless it already completed; False if it failed"""
+    await db.migrations.update_one(
+        {"migration_id": migration_id},
+        {"$setOnInsert": {
+            "migration_id": migration_id,
+            "status": "pending",
+            "lease_until": None,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+    await retry_job(db.migrations, migration_id, key="migration_id")
+    job = await acquire_lease(db.migrations, migration_id, owner, MIGRATION_LEASE_SECONDS, key="migration_id")
+    if not job:
+        return True
+    try:
+        async with renewing_lease(db.migrations, migration_id, owner, MIGRATION_LEASE_SECONDS, key="migration_id"):
+            result = await func(db)
+    except Exception as e:
+        logger.error(f"[Migrations] {migration_id} failed: {e!r}")
+        await fail_job(db.migrations, migration_id, owner, repr(e), key="migration_id")
+        return False
+    await finish_job(db.migrations, migration_id, owner, {"result": result}, key="migration_id")
+    logger.info(f"[Migrations] {migration_id} completed: {result}")
+    return True
+
+
+async def run_migrations(db, migrations=None) -> int:
+    """Run pending migrations in order, stopping at the first failure; number run"""
+    owner = uuid.uuid4().hex
+    done = 0
+    for migration_id, func in migrations if migrations is not None else MIGRATIONS:
+        if not await run_migration(db, migration_id, func, owner):
+            break
+        done += 1
+    return done
+
+
+@migration("message_conversation_keys")
+async def backfill_message_conversation_keys(db) -> int:
+    """Add conversation_key to messages stored before it existed (one server-side update)"""
+    result = await db.messages.update_many(
+        {"conversation_key": {"$exists": False}},
+        [{"$set": {"conversation_key": {"$cond": [
+            {"$lt": ["$sender_id", "$recipient_id"]},
+            {"$concat": ["$sender_id", ":", "$recipient_id"]},
+            {"$concat": ["$recipient_id", ":", "$sender_id"]}
+        ]}}}]
+    )
+    return result.modified_count
+
+
+@migration("user_search_tokens")
+async def backfill_user_search_tokens(db, batch_size: int = 1000) -> int:
+    """Compute search_tokens for users created before the search index existed"""
+    updated = 0
+    while True:
+        users = await db.users.find(
+            {"search_tokens": {"$exists": False}},
+            {"_id": 0, "user_id": 1, "name": 1, "email": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+        await db.users.bulk_write([
+            UpdateOne(
+                {"user_id": u["user_id"]},
+                {"$set": {"search_tokens": user_search_tokens(u.get("name"), u.get("email"))}}
+            )
+            for u in users
+        ], ordered=False)
+        updated += len(users)
+    return updated
+
+
+@migration("post_counters")
+async def backfill_post_counters(db, batch_size: int = 500) -> int:
+    """Set likes_count/comments_count on posts that predate the counters"""
+    updated = 0
+    while True:
+        posts = await db.social_posts.find(
+            {"likes_count": {"$exists": False}},
+            {"_id": 0, "post_id": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not posts:
+            break
+        post_ids = [p["post_id"] for p in posts]
+        count_pipeline = [
+            {"$match": {"post_id": {"$in": post_ids}}},
+            {"$group": {"_id": "$post_id", "count": {"$sum": 1}}}
+        ]
+        likes, comments = await asyncio.gather(
+            db.post_likes.aggregate(count_pipeline).to_list(None),
+            db.post_comments.aggregate(count_pipeline).to_list(None)
+        )
+        likes_by_post = {c["_id"]: c["count"] for c in likes}
+        comments_by_post = {c["_id"]: c["count"] for c in comments}
+        await db.social_posts.bulk_write([
+            UpdateOne(
+                {"post_id": post_id, "likes_count": {"$exists": False}},
+                {"$set": {
+                    "likes_count": likes_by_post.get(post_id, 0),
+                    "comments_count": comments_by_post.get(post_id, 0)
+                }}
+            )
+            for post_id in post_ids
+        ], ordered=False)
+        updated += len(post_ids)
+    return updated
+
+
+@migration("friendship_pair_keys")
+async def unique_friendship_pair_keys(db, batch_size: int = 1000) -> dict:
+    """Set pair_key on older friendships, drop duplicate pairs, then make pair_key unique
+
+    Of duplicates, an accepted friendship is kept over a pending one, then the oldest.
+    """
+    keyed = 0
+    while True:
+        friendships = await db.friendships.find(
+            {"pair_key": {"$exists": False}},
+            {"_id": 1, "user_id": 1, "friend_id": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not friendships:
+            break
+        await db.friendships.bulk_write([
+            UpdateOne({"_id": f["_id"]}, {"$set": {"pair_key": friendship_pair_key(f["user_id"], f["friend_id"])}})
+            for f in friendships
+        ], ordered=False)
+        keyed += len(friendships)
+
+    duplicates = await db.friendships.aggregate([
+        {"$group": {
+            "_id": "$pair_key",
+            "count": {"$sum": 1},
+            "friendships": {"$push": {"_id": "$_id", "status": "$status", "created_at": "$created_at"}}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    removed = []
+    for group in duplicates:
+        keep = min(group["friendships"], key=lambda f: (f.get("status") != "accepted", f.get("created_at") or ""))
+        removed.extend(f["_id"] for f in group["friendships"] if f is not keep)
+    if removed:
+        await db.friendships.delete_many({"_id": {"$in": removed}})
+
+    try:
+        await db.friendships.drop_index("pair_key_1")  # Former non-unique index
+    except OperationFailure:
+        pass
+    await db.friendships.create_index(
+        "pair_key",
+        unique=True,
+        partialFilterExpression={"pair_key": {"$type": "string"}}
+    )
+    return {"keyed": keyed, "duplicates_removed": len(removed)}
+
+
+@migration("unique_post_likes")
+async def unique_post_likes(db) -> dict:
+    """Remove duplicate likes, fix the affected counters, then make (user_id, post_id) unique"""
+    duplicates = await db.post_likes.aggregate([
+        {"$group": {
+            "_id": {"user_id": "$user_id", "post_id": "$post_id"},
+            "count": {"$sum": 1},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    removed = [like_id for group in duplicates for like_id in group["ids"][1:]]
+    if removed:
+        await db.post_likes.delete_many({"_id": {"$in": removed}})
+        post_ids = list({group["_id"]["post_id"] for group in duplicates})
+        counts = await db.post_likes.aggregate([
+            {"$match": {"post_id": {"$in": post_ids}}},
+            {"$group": {"_id": "$post_id", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        likes_by_post = {c["_id"]: c["count"] for c in counts}
+        await db.social_posts.bulk_write([
+            UpdateOne({"post_id": post_id}, {"$set": {"likes_count": likes_by_post.get(post_id, 0)}})
+            for post_id in post_ids
+        ], ordered=False)
+
+    try:
+        await db.post_likes.drop_index("user_id_1_post_id_1")  # Former non-unique index
+    except OperationFailure:
+        pass
+    await db.post_likes.create_index([("user_id", 1), ("post_id", 1)], unique=True)
+    return {"duplicates_removed": len(removed)}
+
+
+@migration("unique_report_jobs")
+async def unique_report_jobs(db) -> dict:
+    """Keep the newest report job per (user_id, version), then make that pair unique"""
+    duplicates = await db.report_jobs.aggregate([
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "version": "$version"},
+            "count": {"$sum": 1},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    removed = [job_id for group in duplicates for job_id in group["ids"][1:]]
+    if removed:
+        await db.report_jobs.delete_many({"_id": {"$in": removed}})
+
+    try:
+        await db.report_jobs.drop_index("user_id_1_version_1")  # Former non-unique index
+    except OperationFailure:
+        pass
+    await db.report_jobs.create_index([("user_id", 1), ("version", 1)], unique=True)
+    return {"duplicates_removed": len(removed)}
+
+
+@migration("unique_google_appointments")
+async def unique_google_appointments(db) -> dict:
+    """Drop duplicate copies of a Google event in the agenda, then make (user_id, google_event_id) unique"""
+    duplicates = await db.appointments.aggregate([
+        {"$match": {"google_event_id": {"$type": "string"}}},
+        {"$sort": {"updated_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "google_event_id": "$google_event_id"},
+            "count": {"$sum": 1},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    removed = [appointment_id for group in duplicates for appointment_id in group["ids"][1:]]
+    if removed:
+        await db.appointments.delete_many({"_id": {"$in": removed}})
+
+    await db.appointments.create_index(
+        [("user_id", 1), ("google_event_id", 1)],
+        unique=True,
+        partialFilterExpression={"google_event_id": {"$type": "string"}}
+    )
+    return {"duplicates_removed": len(removed)}
+
+
+@migration("unique_shopping_items")
+async def unique_shopping_items(db) -> dict:
+    """Merge an item listed twice into its oldest entry, then make (user_id, item) unique"""
+    duplicates = await db.shopping_list.aggregate([
+        {"$match": {"item": {"$type": "string"}}},
+        {"$sort": {"added_at": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "item": "$item"},
+            "count": {"$sum": 1},
+            "entries": {"$push": {"_id": "$_id", "quantity": "$quantity"}}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    merged, removed = [], []
+    for group in duplicates:
+        kept, *extras = group["entries"]
+        quantity = kept.get("quantity")
+        for extra in extras:
+            quantity = merge_quantities(quantity, extra.get("quantity"))
+        merged.append(UpdateOne({"_id": kept["_id"]}, {"$set": {"quantity": quantity}}))
+        removed.extend(extra["_id"] for extra in extras)
+    if removed:
+        await db.shopping_list.bulk_write(merged, ordered=False)
+        await db.shopping_list.delete_many({"_id": {"$in": removed}})
+
+    try:
+        await db.shopping_list.drop_index("user_id_1_item_1")  # Former non-unique index
+    except OperationFailure:
+        pass
+    await db.shopping_list.create_index(
+        [("user_id", 1), ("item", 1)],
+        unique=True,
+        partialFilterExpression={"item": {"$type": "string"}}
+    )
+    return {"duplicates_removed": len(removed)}
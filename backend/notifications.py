@@ -1,18 +1,25 @@
 # Firebase Cloud Messaging - Notifications Push
 import os
+import abc
+import asyncio
+import importlib.util
 import logging
-from typing import Optional, List
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict
 from datetime import datetime, timezone
 
+from lazy_imports import lazy_import
+
 logger = logging.getLogger(__name__)
 
-# Firebase Admin SDK
-try:
-    import firebase_admin
-    from firebase_admin import credentials, messaging
-    FIREBASE_AVAILABLE = True
-except ImportError:
-    FIREBASE_AVAILABLE = False
+# Firebase Admin SDK (heavy: imported on first use / by the startup warm-up)
+FIREBASE_AVAILABLE = importlib.util.find_spec("firebase_admin") is not None
+if FIREBASE_AVAILABLE:
+    firebase_admin = lazy_import("firebase_admin", warm=False)
+    credentials = lazy_import("firebase_admin.credentials", warm=False)
+    messaging = lazy_import("firebase_admin.messaging", warm=False)
+else:
     logger.warning("Firebase Admin SDK not installed")
 
 # Initialize Firebase
@@ -45,28 +52,45 @@ def init_firebase():
         logger.warning(f"Firebase service account not found at {service_account_path}")
         return False
 
-async def send_push_notification(
-    token: str,
-    title: str,
-    body: str,
-    data: Optional[dict] = None,
-    image: Optional[str] = None
-) -> bool:
-    """Send push notification to a single device"""
-    if not firebase_app:
-        if not init_firebase():
-            logger.error("Cannot send notification - Firebase not initialized")
-            return False
-    
-    try:
-        message = messaging.Message(
+# ==================== PUSH DISPATCH QUEUE ====================
+# FCM calls are blocking HTTP round trips: they run in a small thread pool fed by
+# an asyncio queue, never on the event loop. Tokens are sent in multicast
+# batches of FCM_MULTICAST_LIMIT; transient failures are retried with backoff
+# and unregistered tokens are handed to the pruner (see set_token_pruner).
+
+FCM_MULTICAST_LIMIT = 500
+PUSH_WORKERS = int(os.environ.get("PUSH_WORKERS", "4"))
+PUSH_MAX_ATTEMPTS = 4
+PUSH_BACKOFF_BASE = 0.5  # seconds, doubled on each retry
+
+# Per-token outcomes returned by senders
+SENT, RETRY, UNREGISTERED, FAILED = "sent", "retry", "unregistered", "failed"
+
+
+class PushSender(abc.ABC):
+    """Synchronous FCM transport: send one multicast batch, return {token: outcome}"""
+
+    @abc.abstractmethod
+    def send_batch(self, tokens: List[str], payload: dict) -> Dict[str, str]:
+        """Called from the dispatcher's thread pool"""
+
+
+class FirebaseSender(PushSender):
+    """Firebase Admin SDK transport"""
+
+    def ready(self) -> bool:
+        return bool(firebase_app) or init_firebase()
+
+    def _build_message(self, tokens: List[str], payload: dict):
+        title, body = payload["title"], payload["body"]
+        return messaging.MulticastMessage(
             notification=messaging.Notification(
                 title=title,
                 body=body,
-                image=image
+                image=payload.get("image")
             ),
-            data=data or {},
-            token=token,
+            data=payload.get("data") or {},
+            tokens=tokens,
             webpush=messaging.WebpushConfig(
                 notification=messaging.WebpushNotification(
                     title=title,
@@ -81,27 +105,217 @@ async def send_push_notification(
                             title='Ouvrir'
                         ),
                         messaging.WebpushNotificationAction(
-                            action='close', 
+                            action='close',
                             title='Fermer'
                         )
                     ]
                 ),
                 fcm_options=messaging.WebpushFCMOptions(
-                    link='/dashboard'
+                    link=payload.get("link") or '/dashboard'
                 )
             )
         )
-        
-        response = messaging.send(message)
-        logger.info(f"Notification sent successfully: {response}")
-        return True
-        
-    except messaging.UnregisteredError:
-        logger.warning(f"Token unregistered: {token[:20]}...")
-        return False
-    except Exception as e:
-        logger.error(f"Error sending notification: {e}")
-        return False
+
+    def _outcome(self, error) -> str:
+        if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+            return UNREGISTERED
+        if isinstance(error, messaging.QuotaExceededError):
+            return RETRY
+        # ThirdPartyAuthError (bad APNs/web push credentials) fails every attempt: not retried
+        # Server side errors (UNAVAILABLE, INTERNAL) are worth another attempt
+        code = getattr(error, "code", "")
+        return RETRY if code in ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED") else FAILED
+
+    def send_batch(self, tokens: List[str], payload: dict) -> Dict[str, str]:
+        if not self.ready():
+            return {token: FAILED for token in tokens}
+        message = self._build_message(tokens, payload)
+        send = getattr(messaging, "send_each_for_multicast", None) or messaging.send_multicast
+        try:
+            response = send(message)
+        except Exception as e:
+            logger.warning(f"[Push] Multicast request failed: {e}")
+            return {token: RETRY for token in tokens}
+        return {
+            token: SENT if r.success else self._outcome(r.exception)
+            for token, r in zip(tokens, response.responses)
+        }
+
+
+class FakePushSender(PushSender):
+    """In-memory FCM stand-in for tests and local runs (PUSH_SENDER=fake)"""
+
+    def __init__(self, unregistered=(), transient_failures: int = 0):
+        self.unregistered = set(unregistered)
+        # Number of upcoming batches that fail as a whole with a retryable error
+        self.transient_failures = transient_failures
+        self.batches = []
+        self.delivered = []
+
+    def send_batch(self, tokens: List[str], payload: dict) -> Dict[str, str]:
+        self.batches.append(list(tokens))
+        if self.transient_failures > 0:
+            self.transient_failures -= 1
+            return {token: RETRY for token in tokens}
+        outcomes = {}
+        for token in tokens:
+            if token in self.unregistered:
+                outcomes[token] = UNREGISTERED
+            else:
+                outcomes[token] = SENT
+                self.delivered.append((token, payload))
+        return outcomes
+
+
+PUSH_SENDERS = {
+    "firebase": FirebaseSender,
+    "fake": FakePushSender,
+}
+
+
+class PushDispatcher:
+    """Queue of push jobs drained by worker tasks that call the sender in a thread pool"""
+
+    def __init__(self, sender: PushSender, workers: int = PUSH_WORKERS):
+        self.sender = sender
+        self.workers = workers
+        self.queue = None
+        self._tasks = []
+        self._executor = None
+        self._pruner = None
+        self.metrics = {"batches": 0, "sent": 0, "failed": 0, "retried": 0, "pruned": 0}
+
+    def set_pruner(self, pruner):
+        self._pruner = pruner
+
+    def _ensure_started(self):
+        if self._tasks:
+            return
+        self.queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="push")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def enqueue(self, tokens: List[str], payload: dict) -> asyncio.Future:
+        """Queue a payload for tokens; the future resolves to {"success", "failure", "pruned"}"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        unique_tokens = list(dict.fromkeys(t for t in tokens if t))
+        batches = [unique_tokens[i:i + FCM_MULTICAST_LIMIT] for i in range(0, len(unique_tokens), FCM_MULTICAST_LIMIT)]
+        if not batches:
+            future.set_result({"success": 0, "failure": 0, "pruned": 0})
+            return future
+        job = {"future": future, "pending": len(batches), "success": 0, "failure": 0, "pruned": 0}
+        for batch in batches:
+            self.queue.put_nowait((job, batch, payload))
+        return future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, batch, payload = await self.queue.get()
+            try:
+                await self._send_with_retry(loop, job, batch, payload)
+            except Exception as e:
+                logger.error(f"[Push] Batch of {len(batch)} failed: {e}")
+                job["failure"] += len(batch)
+            finally:
+                job["pending"] -= 1
+                if job["pending"] == 0 and not job["future"].done():
+                    job["future"].set_result({k: job[k] for k in ("success", "failure", "pruned")})
+                self.queue.task_done()
+
+    async def _send_with_retry(self, loop, job: dict, tokens: List[str], payload: dict):
+        sent, failed, unregistered = 0, 0, []
+        for attempt in range(PUSH_MAX_ATTEMPTS):
+            outcomes = await loop.run_in_executor(self._executor, self.sender.send_batch, tokens, payload)
+            self.metrics["batches"] += 1
+            sent += sum(1 for t in tokens if outcomes.get(t) == SENT)
+            failed += sum(1 for t in tokens if outcomes.get(t) == FAILED)
+            unregistered += [t for t in tokens if outcomes.get(t) == UNREGISTERED]
+            tokens = [t for t in tokens if outcomes.get(t) == RETRY]
+            if not tokens:
+                break
+            if attempt + 1 < PUSH_MAX_ATTEMPTS:
+                self.metrics["retried"] += len(tokens)
+                await asyncio.sleep(PUSH_BACKOFF_BASE * 2 ** attempt + random.uniform(0, PUSH_BACKOFF_BASE))
+        # Tokens still failing after the last attempt
+        failed += len(tokens) + len(unregistered)
+
+        job["success"] += sent
+        job["failure"] += failed
+        self.metrics["sent"] += sent
+        self.metrics["failed"] += failed
+        if unregistered:
+            job["pruned"] += len(unregistered)
+            self.metrics["pruned"] += len(unregistered)
+            logger.info(f"[Push] Pruning {len(unregistered)} unregistered tokens")
+            if self._pruner:
+                await self._pruner(unregistered)
+
+
+_dispatcher = None
+
+
+def get_push_dispatcher() -> PushDispatcher:
+    """Process-wide dispatcher, sender chosen by PUSH_SENDER (default: firebase)"""
+    global _dispatcher
+    if _dispatcher is None:
+        sender_name = os.environ.get("PUSH_SENDER", "firebase")
+        if sender_name not in PUSH_SENDERS:
+            logger.warning(f"[Push] Unknown sender '{sender_name}', using firebase")
+            sender_name = "firebase"
+        _dispatcher = PushDispatcher(PUSH_SENDERS[sender_name]())
+    return _dispatcher
+
+
+def set_push_sender(sender: PushSender) -> PushDispatcher:
+    """Swap the transport (tests use FakePushSender)
+
+    The running dispatcher is kept, with its queue, workers and token pruner;
+    batches sent from now on go through the new sender.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = PushDispatcher(sender)
+    else:
+        _dispatcher.sender = sender
+    return _dispatcher
+
+
+def set_token_pruner(pruner):
+    """Register `async pruner(tokens)` called with tokens FCM reports as unregistered"""
+    get_push_dispatcher().set_pruner(pruner)
+
+
+def build_payload(title: str, body: str, data: Optional[dict] = None, image: Optional[str] = None) -> dict:
+    # FCM data values must be strings
+    return {
+        "title": title,
+        "body": body,
+        "data": {k: str(v) for k, v in (data or {}).items()},
+        "image": image
+    }
+
+
+async def send_push_notification(
+    token: str,
+    title: str,
+    body: str,
+    data: Optional[dict] = None,
+    image: Optional[str] = None
+) -> bool:
+    """Send push notification to a single device"""
+    result = await get_push_dispatcher().enqueue([token], build_payload(title, body, data, image))
+    return result["success"] == 1
 
 async def send_push_to_multiple(
     tokens: List[str],
@@ -109,43 +323,8 @@ async def send_push_to_multiple(
     body: str,
     data: Optional[dict] = None
 ) -> dict:
-    """Send push notification to multiple devices"""
-    if not firebase_app:
-        if not init_firebase():
-            return {"success": 0, "failure": len(tokens)}
-    
-    if not tokens:
-        return {"success": 0, "failure": 0}
-    
-    try:
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=body
-            ),
-            data=data or {},
-            tokens=tokens,
-            webpush=messaging.WebpushConfig(
-                notification=messaging.WebpushNotification(
-                    title=title,
-                    body=body,
-                    icon='/icon-192x192.png',
-                    badge='/icon-96x96.png'
-                )
-            )
-        )
-        
-        response = messaging.send_multicast(message)
-        logger.info(f"Multicast sent: {response.success_count} success, {response.failure_count} failures")
-        
-        return {
-            "success": response.success_count,
-            "failure": response.failure_count
-        }
-        
-    except Exception as e:
-        logger.error(f"Error sending multicast: {e}")
-        return {"success": 0, "failure": len(tokens)}
+    """Send push notification to multiple devices (batched per FCM_MULTICAST_LIMIT tokens)"""
+    return await get_push_dispatcher().enqueue(tokens, build_payload(title, body, data))
 
 # Notification types for the app
 NOTIFICATION_TYPES = {
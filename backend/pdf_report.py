@@ -0,0 +1,382 @@
+"""
+Progress report PDF: renderer + background jobs + cache
+The renderer only takes the pre-aggregated report built by server.py (totals,
+averages and short series computed in Mongo), never raw logs. It is pure CPU
+work and runs in a process pool so the event loop is never blocked.
+
+Rendered files are cached in `report_cache`, one per user, keyed by the report
+data version (a hash of the aggregated input, minus values that only move with
+the calendar): downloading the same report again is a single read, and any new
+log changes the version.
+
+The writers of the report's inputs (weigh-ins, food, steps, bariatric logs,
+profile) call bump_report_data_version(), a per-user counter in
+`report_data_versions`. A render request whose counter matches the one stored
+with the cached PDF is served without running the aggregation at all.
+
+Jobs are unique per (user_id, version) in `report_jobs` and rendered under a
+job_lease lease, so concurrent requests on any worker share one rendering.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from job_lease import claim_lease, renewing_lease, finish_job, fail_job
+
+logger = logging.getLogger(__name__)
+
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "2"))
+REPORT_LEASE_SECONDS = 120
+
+# Values derived from today's date: left out of the version so an unchanged
+# history keeps its cached PDF (which shows them as of its generation date)
+VOLATILE_FIELDS = (
+    ("generated_at",),
+    ("user", "days_active"),
+    ("nutrition_stats", "avg_daily_calories"),
+    ("bariatric_dossier", "days_since_surgery"),
+    ("bariatric_dossier", "tracking_stats", "compliance_rate"),
+)
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+PRIMARY = (0.957, 0.447, 0.714)
+TEXT = (0.235, 0.235, 0.235)
+
+_pool = None
+_RUNNING = {}
+
+
+# ==================== RENDERER ====================
+
+def _pdf_text(text) -> str:
+    # Standard fonts use WinAnsi (cp1252): accents are kept, emoji are dropped
+    raw = str(text).encode("cp1252", errors="ignore").decode("latin-1")
+    return raw.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _fmt(value, unit: str = "") -> str:
+    if value is None or value == "":
+        return "N/A"
+    if isinstance(value, float):
+        value = f"{value:.1f}".rstrip("0").rstrip(".")
+    return f"{value} {unit}".strip()
+
+
+class _Canvas:
+    """Minimal page writer: text lines, colored bars and polylines"""
+
+    def __init__(self):
+        self.pages = []
+        self.ops = []
+        self.y = 0
+        self.new_page()
+
+    def new_page(self):
+        if self.ops:
+            self.pages.append("\n".join(self.ops))
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure_space(self, height: float):
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def text(self, x, y, text, size=10, bold=False, color=TEXT):
+        font = "F2" if bold else "F1"
+        self.ops.append(
+            f"BT {color[0]:.3f} {color[1]:.3f} {color[2]:.3f} rg /{font} {size} Tf "
+            f"{x:.1f} {y:.1f} Td ({_pdf_text(text)}) Tj ET"
+        )
+
+    def rect(self, x, y, width, height, color):
+        self.ops.append(f"{color[0]:.3f} {color[1]:.3f} {color[2]:.3f} rg {x:.1f} {y:.1f} {width:.1f} {height:.1f} re f")
+
+    def line(self, points, color=PRIMARY, width=1.5):
+        if len(points) < 2:
+            return
+        path = " ".join(f"{x:.1f} {y:.1f} {'m' if i == 0 else 'l'}" for i, (x, y) in enumerate(points))
+        self.ops.append(f"{color[0]:.3f} {color[1]:.3f} {color[2]:.3f} RG {width} w {path} S")
+
+    def heading(self, title):
+        self.ensure_space(40)
+        self.y -= 24
+        self.text(MARGIN, self.y, title, size=14, bold=True, color=PRIMARY)
+        self.y -= 8
+
+    def row(self, label, value):
+        self.ensure_space(16)
+        self.y -= 16
+        self.text(MARGIN + 10, self.y, label, bold=True)
+        self.text(MARGIN + 250, self.y, value)
+
+    def finish(self) -> list:
+        self.pages.append("\n".join(self.ops))
+        return self.pages
+
+
+def _weight_chart(canvas: _Canvas, entries: list):
+    weights = [e.get("weight") for e in entries if isinstance(e.get("weight"), (int, float))]
+    if len(weights) < 2:
+        return
+    height, width = 140, PAGE_WIDTH - 2 * MARGIN
+    canvas.ensure_space(height + 30)
+    canvas.y -= height + 14
+    bottom = canvas.y
+    canvas.rect(MARGIN, bottom, width, height, (0.96, 0.96, 0.96))
+    low, high = min(weights), max(weights)
+    spread = (high - low) or 1
+    step = width / (len(weights) - 1)
+    points = [(MARGIN + i * step, bottom + 10 + (w - low) / spread * (height - 20)) for i, w in enumerate(weights)]
+    canvas.line(points)
+    canvas.text(MARGIN + 4, bottom + height - 12, f"max {_fmt(high, 'kg')}", size=8)
+    canvas.text(MARGIN + 4, bottom + 4, f"min {_fmt(low, 'kg')}", size=8)
+
+
+def _build_pdf(pages: list) -> bytes:
+    """Serialize content streams into a PDF file (Helvetica, FlateDecode streams)"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled once page object numbers are known
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    streams = {}
+    page_numbers = []
+    for content in pages:
+        data = zlib.compress(content.encode("latin-1"))
+        objects.append(None)
+        streams[len(objects)] = data
+        content_number = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_number} 0 R >>"
+        )
+        page_numbers.append(len(objects))
+    kids = " ".join(f"{n} 0 R" for n in page_numbers)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>"
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode()
+        if number in streams:
+            data = streams[number]
+            out += f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode() + data + b"\nendstream"
+        else:
+            out += obj.encode("latin-1")
+        out += b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def render_progress_pdf(report: dict) -> bytes:
+    """Render the aggregated progress report (see generate_progress_pdf) as a PDF"""
+    canvas = _Canvas()
+    user = report.get("user", {})
+    profile = report.get("profile", {})
+    weight = report.get("weight_progress", {})
+    nutrition = report.get("nutrition_stats", {})
+    activity = report.get("activity_stats", {})
+
+    canvas.rect(0, PAGE_HEIGHT - 70, PAGE_WIDTH, 70, PRIMARY)
+    canvas.text(MARGIN, PAGE_HEIGHT - 40, "Fat & Slim", size=24, bold=True, color=(1, 1, 1))
+    canvas.text(MARGIN, PAGE_HEIGHT - 58, "Rapport de progression", size=12, color=(1, 1, 1))
+    canvas.y = PAGE_HEIGHT - 90
+    canvas.text(MARGIN, canvas.y, f"Généré le {report.get('generated_at', '')[:10]}", size=9)
+    canvas.y -= 14
+    canvas.text(MARGIN, canvas.y, f"{user.get('name', 'Utilisateur')} - membre depuis {str(user.get('created_at', ''))[:10]}"
+                f" ({user.get('days_active', 0)} jours)", size=9)
+
+    canvas.heading("Profil")
+    canvas.row("Âge", _fmt(profile.get("age"), "ans"))
+    canvas.row("Taille", _fmt(profile.get("height"), "cm"))
+    canvas.row("Objectif", _fmt(profile.get("goal")))
+    canvas.row("Objectif calories", _fmt(profile.get("daily_calorie_target"), "kcal/jour"))
+    canvas.row("Poids cible", _fmt(profile.get("target_weight"), "kg"))
+
+    canvas.heading("Évolution du poids")
+    canvas.row("Poids de départ", _fmt(weight.get("start_weight"), "kg"))
+    canvas.row("Poids actuel", _fmt(weight.get("current_weight"), "kg"))
+    canvas.row("Variation", _fmt(weight.get("weight_change"), "kg"))
+    canvas.row("Minimum / maximum", f"{_fmt(weight.get('weight_min'), 'kg')} / {_fmt(weight.get('weight_max'), 'kg')}")
+    canvas.row("IMC départ / actuel", f"{_fmt(weight.get('bmi_start'))} / {_fmt(weight.get('bmi_current'))}")
+    canvas.row("Pesées enregistrées", _fmt(weight.get("entries_count")))
+    _weight_chart(canvas, weight.get("entries") or [])
+
+    canvas.heading("Nutrition")
+    canvas.row("Repas enregistrés", _fmt(nutrition.get("total_meals_logged")))
+    canvas.row("Calories enregistrées", _fmt(nutrition.get("total_calories_logged"), "kcal"))
+    canvas.row("Moyenne quotidienne", _fmt(nutrition.get("avg_daily_calories"), "kcal"))
+    canvas.row("Objectif", _fmt(nutrition.get("target_calories"), "kcal"))
+
+    canvas.heading("Activité")
+    canvas.row("Pas au total", _fmt(activity.get("total_steps")))
+    canvas.row("Moyenne quotidienne", _fmt(activity.get("avg_daily_steps"), "pas"))
+    canvas.row("Calories brûlées", _fmt(activity.get("total_calories_burned"), "kcal"))
+    canvas.row("Jours suivis", _fmt(activity.get("days_tracked")))
+
+    dossier = report.get("bariatric_dossier")
+    if dossier:
+        canvas.heading("Dossier bariatrique")
+        canvas.row("Intervention", _fmt(dossier.get("surgery_type")))
+        canvas.row("Date", _fmt(str(dossier.get("surgery_date") or "")[:10]))
+        canvas.row("Jours depuis l'opération", _fmt(dossier.get("days_since_surgery")))
+        canvas.row("Phase actuelle", _fmt(dossier.get("current_phase")))
+        canvas.row("Poids perdu", _fmt(dossier.get("total_weight_lost"), "kg"))
+        canvas.row("Perte d'excès de poids", _fmt(dossier.get("excess_weight_loss_percent"), "%"))
+        tracking = dossier.get("tracking_stats", {})
+        canvas.row("Jours suivis / observance", f"{_fmt(tracking.get('days_tracked'))} / {_fmt(tracking.get('compliance_rate'), '%')}")
+        for key, value in (dossier.get("symptom_stats") or {}).items():
+            canvas.row(f"Symptômes - {key}", _fmt(value))
+        for key, value in (dossier.get("supplement_adherence") or {}).items():
+            canvas.row(f"Suppléments - {key}", _fmt(value, "%"))
+        dossier_nutrition = dossier.get("nutrition_stats", {})
+        canvas.row("Protéines moyennes", f"{_fmt(dossier_nutrition.get('avg_protein_intake_g'), 'g')}"
+                   f" (cible {_fmt(dossier_nutrition.get('protein_target_g'), 'g')})")
+        canvas.row("Eau moyenne", _fmt(dossier_nutrition.get("avg_water_intake_ml"), "ml"))
+
+    return _build_pdf(canvas.finish())
+
+
+def report_version(report: dict) -> str:
+    """Data version of an aggregated report (ignores VOLATILE_FIELDS)"""
+    payload = copy.deepcopy(report)
+    for path in VOLATILE_FIELDS:
+        parent = payload
+        for key in path[:-1]:
+            parent = parent.get(key) if isinstance(parent, dict) else None
+        if isinstance(parent, dict):
+            parent.pop(path[-1], None)
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+# ==================== JOBS & CACHE ====================
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS)
+    return _pool
+
+
+def shutdown_report_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def ensure_report_indexes(db):
+    await db.report_cache.create_index("user_id", unique=True)
+    await db.report_data_versions.create_index("user_id", unique=True)
+    await db.report_jobs.create_index("job_id", unique=True)
+    # (user_id, version) unique index: built by the unique_report_jobs migration
+
+
+async def get_cached_report(db, user_id: str, version: str = None):
+    """Cached PDF of a user ({"pdf", "version", ...}), only if it matches `version` when given"""
+    query = {"user_id": user_id}
+    if version:
+        query["version"] = version
+    return await db.report_cache.find_one(query, {"_id": 0})
+
+
+async def bump_report_data_version(db, user_id: str):
+    """Mark a user's report input as changed (next render runs the aggregation)"""
+    await db.report_data_versions.update_one({"user_id": user_id}, {"$inc": {"counter": 1}}, upsert=True)
+
+
+def _cached_result(cached: dict) -> dict:
+    return {"job_id": None, "status": "completed", "version": cached["version"], "size": cached["size"], "cached": True}
+
+
+async def run_report_job(db, job: dict, owner: str, report: dict, data_counter: int = 0):
+    """Render in the process pool and store the result in the cache (lease held by owner)"""
+    job_id = job["job_id"]
+    try:
+        async with renewing_lease(db.report_jobs, job_id, owner, REPORT_LEASE_SECONDS):
+            loop = asyncio.get_running_loop()
+            pdf = await loop.run_in_executor(_get_pool(), render_progress_pdf, report)
+        now = datetime.now(timezone.utc).isoformat()
+        await db.report_cache.update_one(
+            {"user_id": job["user_id"]},
+            {"$set": {"version": job["version"], "data_counter": data_counter, "pdf": pdf, "size": len(pdf), "created_at": now}},
+            upsert=True
+        )
+        await finish_job(db.report_jobs, job_id, owner, {"size": len(pdf), "finished_at": now})
+        logger.info(f"[Report] {job_id} rendered ({len(pdf)} bytes)")
+    except Exception as e:
+        logger.error(f"[Report] {job_id} failed: {e}")
+        await fail_job(db.report_jobs, job_id, owner, str(e))
+
+
+async def create_report_job(db, user_id: str, build_report) -> dict:
+    """Start rendering a report, reusing the cache or the job of the same data version
+
+    build_report() returns the aggregated report; it is only awaited when the
+    user's data counter moved since the cached PDF was rendered or checked.
+    """
+    # Counter read before aggregating: a write landing during the aggregation bumps it past this value
+    counter_doc, cached = await asyncio.gather(
+        db.report_data_versions.find_one({"user_id": user_id}, {"_id": 0, "counter": 1}),
+        db.report_cache.find_one({"user_id": user_id}, {"_id": 0, "version": 1, "size": 1, "data_counter": 1})
+    )
+    data_counter = counter_doc["counter"] if counter_doc else 0
+    if cached and cached.get("data_counter") == data_counter:
+        return _cached_result(cached)
+
+    report = await build_report()
+    version = report_version(report)
+    now = datetime.now(timezone.utc)
+    if cached and cached["version"] == version:
+        await db.report_cache.update_one({"user_id": user_id}, {"$set": {"data_counter": data_counter}})
+        return _cached_result(cached)
+
+    # One job document per (user_id, version), shared by every worker
+    try:
+        job = await db.report_jobs.find_one_and_update(
+            {"user_id": user_id, "version": version},
+            {"$setOnInsert": {
+                "job_id": f"report_{uuid.uuid4().hex[:12]}",
+                "status": "pending",
+                "lease_until": None,
+                "created_at": now.isoformat()
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0}
+        )
+    except DuplicateKeyError:
+        job = await db.report_jobs.find_one({"user_id": user_id, "version": version}, {"_id": 0})
+    if job["status"] in ("completed", "failed"):
+        # The cache holds another version now (or the last attempt failed): render again
+        await db.report_jobs.update_one(
+            {"job_id": job["job_id"], "status": job["status"]},
+            {"$set": {"status": "pending", "lease_until": None}, "$unset": {"error": ""}}
+        )
+
+    owner = uuid.uuid4().hex
+    claimed = await claim_lease(db.report_jobs, job["job_id"], owner, REPORT_LEASE_SECONDS)
+    if not claimed:
+        # Rendering on another request or worker
+        return {k: v for k, v in job.items() if k not in ("owner", "lease_until")}
+    task = asyncio.create_task(run_report_job(db, claimed, owner, report, data_counter))
+    _RUNNING[claimed["job_id"]] = task
+    task.add_done_callback(lambda _: _RUNNING.pop(claimed["job_id"], None))
+    return {k: v for k, v in claimed.items() if k not in ("owner", "lease_until")}
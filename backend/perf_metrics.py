@@ -0,0 +1,241 @@
+"""
+Per-route latency and Mongo command-count instrumentation
+RequestMetricsMiddleware (pure ASGI) times every HTTP request and labels it
+with the route template ("/api/social/posts/{post_id}", not the raw path).
+MongoCommandCounter is a PyMongo command listener registered on the Motor
+client: each command is charged to the request that issued it through a
+context variable (Motor runs operations in executor threads with a copy of
+the caller's context).
+
+Exposed in the Prometheus text format by render_metrics():
+- http_request_duration_seconds   histogram  {method, route}
+- http_requests_total             counter    {method, route, status}
+- http_request_mongo_commands     histogram  {method, route}
+- mongo_commands_total            counter    {command}
+- mongo_command_duration_seconds  histogram  {command}
+- http_request_query_alarms_total counter    {method, route}
+
+Metrics live in process memory: each worker process counts only the requests
+it served. Every sample carries a `worker` label (the process id) so that a
+scrape of each worker (or one through a load balancer) yields distinct series,
+to be summed across workers in Prometheus.
+
+A request issuing more than QUERY_ALARM_THRESHOLD commands (env, 0 disables)
+logs a warning with its per-command breakdown and calls the alarm handler
+(set_query_alarm_handler) if one is registered.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+QUERY_ALARM_THRESHOLD = int(os.environ.get("QUERY_ALARM_THRESHOLD", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+COMMAND_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Handshake and session housekeeping, not application queries
+_IGNORED_COMMANDS = {"endSessions", "hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue"}
+
+
+class RequestStats:
+    """Mongo activity of one HTTP request (shared with executor threads)"""
+
+    __slots__ = ("scope", "commands", "_lock")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.commands = Counter()
+        self._lock = threading.Lock()
+
+    def add_command(self, name: str):
+        with self._lock:
+            self.commands[name] += 1
+
+    @property
+    def command_count(self) -> int:
+        return sum(self.commands.values())
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+_current_request = contextvars.ContextVar("perf_request", default=None)
+
+
+def current_request() -> "RequestStats | None":
+    return _current_request.get()
+
+
+def route_label(scope: dict) -> str:
+    """Route template of a request, "unmatched" for 404s (bounded label set)"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = Counter()  # (name, labels) -> value
+
+    def observe(self, name: str, labels: tuple, value: float, buckets):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: tuple, value: float = 1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self, common_labels: tuple = ()) -> str:
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+            counters = sorted(self._counters.items(), key=lambda kv: kv[0])
+        lines, typed = [], set()
+        for (name, labels), histogram in histograms:
+            labels = common_labels + labels
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for (name, labels), value in counters:
+            labels = common_labels + labels
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+registry = MetricsRegistry()
+
+
+def render_metrics() -> str:
+    """All metrics of this worker process in the Prometheus text exposition format"""
+    return registry.render((("worker", str(os.getpid())),))
+
+
+class MongoCommandCounter(monitoring.CommandListener):
+    """Counts and times Mongo commands, charging them to the current request"""
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        stats = _current_request.get()
+        if stats is not None:
+            stats.add_command(event.command_name)
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        labels = (("command", event.command_name),)
+        registry.inc("mongo_commands_total", labels)
+        registry.observe("mongo_command_duration_seconds", labels, event.duration_micros / 1e6, COMMAND_LATENCY_BUCKETS)
+
+
+_alarm_handler = None
+
+
+def set_query_alarm_handler(handler):
+    """handler(method, route, stats) is called for requests over QUERY_ALARM_THRESHOLD"""
+    global _alarm_handler
+    _alarm_handler = handler
+
+
+def _check_query_alarm(method: str, route: str, stats: RequestStats):
+    if not QUERY_ALARM_THRESHOLD or stats.command_count <= QUERY_ALARM_THRESHOLD:
+        return
+    registry.inc("http_request_query_alarms_total", (("method", method), ("route", route)))
+    logger.warning(
+        f"[Perf] {method} {route} ran {stats.command_count} Mongo commands "
+        f"(threshold {QUERY_ALARM_THRESHOLD}): {dict(stats.commands.most_common())}"
+    )
+    if _alarm_handler:
+        try:
+            _alarm_handler(method, route, stats)
+        except Exception as e:
+            logger.error(f"[Perf] Query alarm handler failed: {e}")
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording latency, status and Mongo command count per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            method, route = scope["method"], stats.route
+            labels = (("method", method), ("route", route))
+            registry.observe("http_request_duration_seconds", labels, elapsed, LATENCY_BUCKETS)
+            registry.observe("http_request_mongo_commands", labels, stats.command_count, QUERY_COUNT_BUCKETS)
+            registry.inc("http_requests_total", labels + (("status", str(status["code"])),))
+            _check_query_alarm(method, route, stats)
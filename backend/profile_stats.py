@@ -0,0 +1,62 @@
+"""
+Per-user profile counters (favorite recipes, posts, friends)
+One `profile_stats` document per user replaces the count_documents calls made
+on every profile view. Write paths $inc the counters; the document is computed
+from the source collections the first time it is read and again once it is
+older than STATS_MAX_AGE, which also absorbs any drift.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+
+from pymongo import UpdateOne
+
+STAT_FIELDS = ("favorite_recipes_count", "posts_count", "friends_count")
+# Counters older than this are recomputed on read
+STATS_MAX_AGE = timedelta(days=1)
+
+
+async def compute_profile_stats(db, user_id: str) -> dict:
+    """Recount every counter from the source collections and store the result"""
+    favorites, posts, friends = await asyncio.gather(
+        db.favorite_recipes.count_documents({"user_id": user_id}),
+        db.social_posts.count_documents({"user_id": user_id}),
+        db.friendships.count_documents({
+            "$or": [{"user_id": user_id}, {"friend_id": user_id}],
+            "status": "accepted"
+        })
+    )
+    stats = {
+        "favorite_recipes_count": favorites,
+        "posts_count": posts,
+        "friends_count": friends,
+        "computed_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.profile_stats.update_one({"user_id": user_id}, {"$set": stats}, upsert=True)
+    return stats
+
+
+async def get_profile_stats(db, user_id: str) -> dict:
+    """Counters for a profile (one read, recomputed only when missing or stale)"""
+    stats = await db.profile_stats.find_one({"user_id": user_id}, {"_id": 0})
+    stale_before = (datetime.now(timezone.utc) - STATS_MAX_AGE).isoformat()
+    if not stats or stats.get("computed_at", "") < stale_before:
+        stats = await compute_profile_stats(db, user_id)
+    return {field: max(stats.get(field, 0), 0) for field in STAT_FIELDS}
+
+
+async def bump_profile_stats(db, user_id: str, **deltas):
+    """$inc counters of one user (no-op until the document has been computed)"""
+    await db.profile_stats.update_one({"user_id": user_id}, {"$inc": deltas})
+
+
+async def bump_profile_stats_many(db, field: str, user_ids: list):
+    """+1 on `field` for each occurrence of a user id, in one bulk_write"""
+    deltas = defaultdict(int)
+    for user_id in user_ids:
+        deltas[user_id] += 1
+    if deltas:
+        await db.profile_stats.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$inc": {field: delta}})
+            for user_id, delta in deltas.items()
+        ], ordered=False)
@@ -0,0 +1,142 @@
+"""
+Real-time delivery (WebSocket) over a pluggable pub/sub backend
+Producers (send_message, create_notification) publish per-user events; a like
+reaches its author as the notification event. Each open WebSocket subscribes to
+its user's channel and forwards them.
+
+Backends implement PubSub. InProcessPubSub fans out inside one process (single
+node, tests). A multi-node deployment plugs in a shared broker by subclassing
+PubSub and registering it in PUBSUB_BACKENDS (selected with REALTIME_BACKEND).
+"""
+import abc
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def user_channel(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class PubSub(abc.ABC):
+    """Pub/sub backend interface"""
+
+    @abc.abstractmethod
+    async def publish(self, channel: str, event: dict) -> int:
+        """Deliver event to current subscribers of channel, returns local deliveries"""
+
+    @abc.abstractmethod
+    def subscribe(self, channel: str) -> "Subscription":
+        """Start receiving events of channel (use as an async context manager)"""
+
+    @abc.abstractmethod
+    def unsubscribe(self, sub: "Subscription"):
+        """Stop delivering to sub"""
+
+    async def close(self):
+        pass
+
+
+class Subscription:
+    """Queue-backed subscription, iterate with `async for event in sub`"""
+
+    def __init__(self, pubsub, channel: str, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        # Slow consumer: drop the oldest event rather than block producers
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        while True:
+            yield await self.queue.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.pubsub.unsubscribe(self)
+
+
+class InProcessPubSub(PubSub):
+    """Fan-out within the current process"""
+
+    def __init__(self):
+        self._subscribers = {}
+
+    async def publish(self, channel: str, event: dict) -> int:
+        subscribers = self._subscribers.get(channel, ())
+        for sub in list(subscribers):
+            sub.put(event)
+        return len(subscribers)
+
+    def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(self, channel)
+        self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subscribers = self._subscribers.get(sub.channel)
+        if subscribers:
+            subscribers.discard(sub)
+            if not subscribers:
+                del self._subscribers[sub.channel]
+
+    def subscriber_count(self, channel: str = None) -> int:
+        if channel:
+            return len(self._subscribers.get(channel, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+
+PUBSUB_BACKENDS = {
+    "memory": InProcessPubSub,
+}
+
+_pubsub = None
+
+
+def get_pubsub() -> PubSub:
+    """Process-wide backend, chosen by REALTIME_BACKEND (default: memory)"""
+    global _pubsub
+    if _pubsub is None:
+        backend = os.environ.get("REALTIME_BACKEND", "memory")
+        if backend not in PUBSUB_BACKENDS:
+            logger.warning(f"[Realtime] Unknown backend '{backend}', using in-process pub/sub")
+            backend = "memory"
+        _pubsub = PUBSUB_BACKENDS[backend]()
+    return _pubsub
+
+
+def set_pubsub(pubsub: PubSub):
+    """Swap the backend (tests, custom brokers)"""
+    global _pubsub
+    _pubsub = pubsub
+
+
+async def publish_to_user(user_id: str, event_type: str, data: dict) -> int:
+    """Push an event to every open connection of a user; never raises"""
+    try:
+        return await get_pubsub().publish(user_channel(user_id), {"type": event_type, "data": data})
+    except Exception as e:
+        logger.error(f"[Realtime] Publish failed for {user_id}: {e}")
+        return 0
+
+
+def encode_event(event: dict) -> str:
+    return json.dumps(event, default=str, ensure_ascii=False)
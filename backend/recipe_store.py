@@ -0,0 +1,346 @@
+"""
+Compact binary recipe store
+Columnar numeric section + offset-indexed string section, read through mmap so
+every uvicorn worker shares the same pages. Recipes are only turned back into
+dicts when they are actually served.
+
+Build the store from the JSON produced by generate_30k_recipes.py:
+    python recipe_store.py recipes_30k.json recipes_30k.bin
+
+Layout (little-endian):
+    header   magic "FSRB", version u16, reserved u16, count u32, meta_len u32
+    meta     JSON: field names, dictionaries, section offsets (relative to data)
+    data     int32 numeric columns | uint16 coded columns | presence bitmap |
+             uint32 string offsets (count * len(STRING_FIELDS) + 1) | utf-8 heap
+"""
+import json
+import mmap
+import random
+import struct
+import sys
+from collections import Counter
+from collections.abc import Sequence
+from pathlib import Path
+
+MAGIC = b"FSRB"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHII")
+_ALIGN = 8
+_MISSING_NUM = -(2 ** 31)
+_MISSING_CODE = 0xFFFF
+
+# int32 columns
+NUMERIC_FIELDS = ("calories", "proteins", "carbs", "fats", "prep_time")
+# uint16 dictionary-encoded columns (low cardinality, at most _MISSING_CODE values)
+CODED_FIELDS = ("category", "nutriscore", "area", "source", "bariatric_phase", "dish_type")
+# utf-8 strings in the heap; lists and unknown keys are stored as JSON
+STRING_FIELDS = ("id", "name", "image", "instructions", "youtube", "ingredients", "tags", "extra")
+_JSON_FIELDS = ("ingredients", "tags", "extra")
+_KNOWN_FIELDS = set(NUMERIC_FIELDS) | set(CODED_FIELDS) | set(STRING_FIELDS[:-1])
+
+
+def _aligned(n: int) -> int:
+    return n + (-n % _ALIGN)
+
+
+def _code(field: str, value: str, lookup: dict, dictionaries: dict) -> int:
+    """Dictionary code of a coded column value (allocated on first use)"""
+    code = lookup[field].get(value)
+    if code is None:
+        code = len(dictionaries[field])
+        if code >= _MISSING_CODE:
+            # 0xFFFF is the missing-value code: a column this diverse is not low cardinality
+            raise ValueError(f"Coded column '{field}' has more than {_MISSING_CODE} distinct values")
+        lookup[field][value] = code
+        dictionaries[field].append(value)
+    return code
+
+
+def build_store(recipes: list) -> bytes:
+    """Encode a list of recipe dicts into the binary store format"""
+    count = len(recipes)
+    dictionaries = {f: [] for f in CODED_FIELDS}
+    lookup = {f: {} for f in CODED_FIELDS}
+    numeric = {f: [] for f in NUMERIC_FIELDS}
+    codes = {f: [] for f in CODED_FIELDS}
+    presence = bytearray(count)
+    heap = bytearray()
+    offsets = [0]
+
+    for i, recipe in enumerate(recipes):
+        # Anything that does not fit its column (floats, odd types) goes to "extra"
+        extra = {k: v for k, v in recipe.items() if k not in _KNOWN_FIELDS}
+
+        for f in NUMERIC_FIELDS:
+            value = recipe.get(f)
+            if type(value) is int and _MISSING_NUM < value < 2 ** 31:
+                numeric[f].append(value)
+                continue
+            numeric[f].append(_MISSING_NUM)
+            if value is not None:
+                extra[f] = value
+
+        for f in CODED_FIELDS:
+            value = recipe.get(f)
+            if not isinstance(value, str):
+                codes[f].append(_MISSING_CODE)
+                if value is not None:
+                    extra[f] = value
+                continue
+            codes[f].append(_code(f, value, lookup, dictionaries))
+
+        for j, f in enumerate(STRING_FIELDS):
+            value = (extra or None) if f == "extra" else recipe.get(f)
+            if f not in _JSON_FIELDS and value is not None and not isinstance(value, str):
+                extra[f] = value
+                value = None
+            if value is not None:
+                presence[i] |= 1 << j
+                if f in _JSON_FIELDS:
+                    value = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+                heap.extend(value.encode("utf-8"))
+            offsets.append(len(heap))
+
+    chunks = [struct.pack(f"<{count}i", *numeric[f]) for f in NUMERIC_FIELDS]
+    chunks += [struct.pack(f"<{count}H", *codes[f]) for f in CODED_FIELDS]
+    chunks += [bytes(presence), struct.pack(f"<{len(offsets)}I", *offsets), bytes(heap)]
+    names = list(NUMERIC_FIELDS) + list(CODED_FIELDS) + ["presence", "offsets", "heap"]
+
+    data = bytearray()
+    sections = {}
+    for name, chunk in zip(names, chunks):
+        sections[name] = [len(data), len(chunk)]
+        data.extend(chunk)
+        data.extend(b"\0" * (_aligned(len(data)) - len(data)))
+
+    meta = json.dumps({
+        "numeric": list(NUMERIC_FIELDS),
+        "coded": list(CODED_FIELDS),
+        "strings": list(STRING_FIELDS),
+        "dictionaries": dictionaries,
+        "sections": sections,
+    }, ensure_ascii=False).encode("utf-8")
+
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, 0, count, len(meta)))
+    out.extend(meta)
+    out.extend(b"\0" * (_aligned(len(out)) - len(out)))
+    out.extend(data)
+    return bytes(out)
+
+
+def convert_json_to_store(json_path, store_path) -> int:
+    """Convert a recipes JSON file into a binary store file, returns recipe count"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        recipes = json.load(f)
+    payload = build_store(recipes)
+    tmp_path = Path(str(store_path) + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    tmp_path.replace(store_path)
+    return len(recipes)
+
+
+class RecipeStore(Sequence):
+    """Read-only, lazily materialized view over a binary recipe store.
+
+    Behaves like a list of recipe dicts (len, indexing, slicing, iteration) but
+    only decodes the recipes that are accessed. Filters and stats run on the
+    numeric/coded columns without touching the string heap.
+    """
+
+    def __init__(self, buffer, _mmap=None, _file=None):
+        if sys.byteorder != "little":
+            raise ValueError("RecipeStore requires a little-endian host")
+        self._mmap = _mmap
+        self._file = _file
+        self._view = view = memoryview(buffer)
+        magic, version, _, count, meta_len = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a recipe store file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported recipe store version: {version}")
+
+        meta = json.loads(bytes(view[_HEADER.size:_HEADER.size + meta_len]).decode("utf-8"))
+        base = _aligned(_HEADER.size + meta_len)
+
+        def section(name, fmt=None):
+            start, length = meta["sections"][name]
+            chunk = view[base + start:base + start + length]
+            return chunk.cast(fmt) if fmt else chunk
+
+        self._count = count
+        self._numeric = {f: section(f, "i") for f in meta["numeric"]}
+        self._codes = {f: section(f, "H") for f in meta["coded"]}
+        self._dictionaries = meta["dictionaries"]
+        self._string_fields = meta["strings"]
+        self._presence = section("presence")
+        self._offsets = section("offsets", "I")
+        self._heap = section("heap")
+
+    @classmethod
+    def open(cls, path) -> "RecipeStore":
+        """Memory-map a store file (pages are shared between processes)"""
+        f = open(path, "rb")
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        return cls(mm, _mmap=mm, _file=f)
+
+    @classmethod
+    def from_records(cls, recipes: list) -> "RecipeStore":
+        """Build an in-memory store (used when only the JSON file is available)"""
+        return cls(build_store(recipes))
+
+    # ---- Sequence protocol ----
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("recipe index out of range")
+        return self._materialize(index)
+
+    def copy(self) -> list:
+        """Materialize every recipe (list-compatible, avoid on hot paths)"""
+        return self[:]
+
+    # ---- Column access ----
+
+    def _string(self, index: int, j: int):
+        if not self._presence[index] & (1 << j):
+            return None
+        k = index * len(self._string_fields) + j
+        return bytes(self._heap[self._offsets[k]:self._offsets[k + 1]]).decode("utf-8")
+
+    def field(self, index: int, name: str):
+        """Decode a single field of one recipe without materializing the rest"""
+        if name in self._numeric:
+            value = self._numeric[name][index]
+            if value != _MISSING_NUM:
+                return value
+        elif name in self._codes:
+            code = self._codes[name][index]
+            if code != _MISSING_CODE:
+                return self._dictionaries[name][code]
+        elif name in self._string_fields:
+            value = self._string(index, self._string_fields.index(name))
+            if value is not None:
+                return json.loads(value) if name in _JSON_FIELDS else value
+        # Not in a column: unknown keys and values that did not fit live in "extra"
+        extra = self._string(index, self._string_fields.index("extra"))
+        return json.loads(extra).get(name) if extra else None
+
+    def _materialize(self, index: int) -> dict:
+        recipe = {}
+        extra = None
+        for j, name in enumerate(self._string_fields):
+            value = self._string(index, j)
+            if value is None:
+                continue
+            if name in _JSON_FIELDS:
+                value = json.loads(value)
+            if name == "extra":
+                extra = value
+            else:
+                recipe[name] = value
+        for name, column in self._codes.items():
+            code = column[index]
+            if code != _MISSING_CODE:
+                recipe[name] = self._dictionaries[name][code]
+        for name, column in self._numeric.items():
+            value = column[index]
+            if value != _MISSING_NUM:
+                recipe[name] = value
+        if extra:
+            recipe.update(extra)
+        return recipe
+
+    def _code_matcher(self, name: str, predicate):
+        """Codes of a coded column whose dictionary value satisfies predicate"""
+        return {code for code, value in enumerate(self._dictionaries[name]) if predicate(value)}
+
+    def select(self, category: str = None, nutriscore: str = None,
+               category_contains: str = None, bariatric_phase: str = None,
+               dish_type: str = None) -> list:
+        """Indices of recipes matching all given filters, computed on columns only"""
+        if dish_type is not None and "dish_type" not in self._codes:
+            # Store built before dish_type was a column: filter through "extra"
+            return [
+                i for i in self.select(category, nutriscore, category_contains, bariatric_phase)
+                if self.field(i, "dish_type") == dish_type
+            ]
+        wanted = []
+        if category is not None:
+            wanted.append(("category", self._code_matcher("category", lambda v: v == category)))
+        if category_contains is not None:
+            wanted.append(("category", self._code_matcher("category", lambda v: category_contains in v)))
+        if nutriscore is not None:
+            wanted.append(("nutriscore", self._code_matcher("nutriscore", lambda v: v == nutriscore)))
+        if bariatric_phase is not None:
+            wanted.append(("bariatric_phase", self._code_matcher("bariatric_phase", lambda v: v == bariatric_phase)))
+        if dish_type is not None:
+            wanted.append(("dish_type", self._code_matcher("dish_type", lambda v: v == dish_type)))
+
+        if not wanted:
+            return list(range(self._count))
+        if any(not codes for _, codes in wanted):
+            return []
+        columns = [(self._codes[name], codes) for name, codes in wanted]
+        return [i for i in range(self._count) if all(col[i] in codes for col, codes in columns)]
+
+    def value_counts(self, name: str) -> dict:
+        """Histogram of a coded column, e.g. recipes per category"""
+        dictionary = self._dictionaries[name]
+        return {
+            dictionary[code]: n
+            for code, n in Counter(self._codes[name]).items()
+            if code != _MISSING_CODE
+        }
+
+    def search_name(self, query: str, limit: int = 20) -> list:
+        """Case-insensitive substring search on names, only matches are materialized"""
+        query_lower = query.lower()
+        j = self._string_fields.index("name")
+        results = []
+        for i in range(self._count):
+            name = self._string(i, j) or ""
+            if query_lower in name.lower():
+                results.append(self._materialize(i))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def sample(self, count: int, indices: list = None) -> list:
+        """Random recipes (optionally drawn from pre-filtered indices)"""
+        pool = range(self._count) if indices is None else indices
+        if len(pool) <= count:
+            return [self._materialize(i) for i in pool]
+        return [self._materialize(i) for i in random.sample(pool, count)]
+
+    def close(self):
+        """Release the memory map (views must not be used afterwards)"""
+        for column in list(self._numeric.values()) + list(self._codes.values()):
+            column.release()
+        self._offsets.release()
+        self._presence.release()
+        self._heap.release()
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python recipe_store.py <recipes.json> <recipes.bin>")
+        sys.exit(1)
+    total = convert_json_to_store(sys.argv[1], sys.argv[2])
+    print(f"✅ Wrote {total} recipes to {sys.argv[2]}")
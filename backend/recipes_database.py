@@ -3,100 +3,101 @@ Complete recipe database with 30,000+ verified recipes
 Sources: TheMealDB (570 real recipes), French cuisine, International, Bariatric specialized
 """
 import json
-import os
+import logging
+import threading
 from pathlib import Path
 
-# Load recipes from JSON file
+from recipe_store import RecipeStore
+
+logger = logging.getLogger(__name__)
+
+# Binary store (preferred, memory-mapped) and JSON fallback
+_STORE_FILE = Path(__file__).parent / 'recipes_30k.bin'
 _RECIPES_FILE = Path(__file__).parent / 'recipes_30k.json'
 
+_store = None
+_store_lock = threading.Lock()
+
 def _load_recipes():
-    """Load recipes from JSON file"""
+    """Open the binary recipe store, falling back to the JSON file"""
+    if _STORE_FILE.exists():
+        try:
+            return RecipeStore.open(_STORE_FILE)
+        except Exception as e:
+            logger.error(f"Error opening recipe store: {e}")
     try:
         with open(_RECIPES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            return RecipeStore.from_records(json.load(f))
     except Exception as e:
-        print(f"Error loading recipes: {e}")
-        return []
+        logger.error(f"Error loading recipes: {e}")
+        return RecipeStore.from_records([])
 
-# Load all recipes at module import
-VERIFIED_RECIPES = _load_recipes()
+def get_store() -> RecipeStore:
+    """Recipe store, opened on first use (recipes are decoded only when served)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _load_recipes()
+    return _store
 
-def get_verified_recipes():
-    """Get all verified recipes"""
-    return VERIFIED_RECIPES
+def __getattr__(name):
+    # VERIFIED_RECIPES stays importable but no longer loads at module import
+    if name == 'VERIFIED_RECIPES':
+        return get_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_verified_recipes(category: str = None, count: int = None):
+    """Get all verified recipes, or a random selection when count is given"""
+    if count is None:
+        return get_store()
+    return get_random_recipes(count, category=None if category in (None, "all") else category)
 
 def get_recipes_count():
     """Get total recipe count"""
-    return len(VERIFIED_RECIPES)
+    return len(get_store())
 
 def search_recipes_by_name(query: str, limit: int = 20):
     """Search recipes by name"""
-    query_lower = query.lower()
-    results = []
-    for recipe in VERIFIED_RECIPES:
-        if query_lower in recipe.get('name', '').lower():
-            results.append(recipe)
-            if len(results) >= limit:
-                break
-    return results
+    return get_store().search_name(query, limit)
 
 def get_recipes_by_category(category: str, limit: int = 50):
     """Get recipes by category"""
-    results = []
-    for recipe in VERIFIED_RECIPES:
-        if recipe.get('category') == category:
-            results.append(recipe)
-            if len(results) >= limit:
-                break
-    return results
+    store = get_store()
+    return [store[i] for i in store.select(category=category)[:limit]]
 
 def get_recipes_by_nutriscore(nutriscore: str, limit: int = 50):
     """Get recipes by nutri-score"""
-    results = []
-    for recipe in VERIFIED_RECIPES:
-        if recipe.get('nutriscore') == nutriscore:
-            results.append(recipe)
-            if len(results) >= limit:
-                break
-    return results
+    store = get_store()
+    return [store[i] for i in store.select(nutriscore=nutriscore)[:limit]]
 
 def get_bariatric_recipes(phase: str = None, limit: int = 50):
     """Get bariatric specialized recipes"""
-    results = []
-    for recipe in VERIFIED_RECIPES:
-        cat = recipe.get('category', '')
-        if 'bariatric' in cat:
-            if phase is None or recipe.get('bariatric_phase') == phase:
-                results.append(recipe)
-                if len(results) >= limit:
-                    break
-    return results
+    store = get_store()
+    indices = store.select(category_contains='bariatric', bariatric_phase=phase)
+    return [store[i] for i in indices[:limit]]
 
 def get_random_recipes(count: int = 10, category: str = None, nutriscore: str = None):
     """Get random recipes with optional filters"""
-    import random
-    filtered = VERIFIED_RECIPES
-    
-    if category:
-        filtered = [r for r in filtered if r.get('category') == category]
-    if nutriscore:
-        filtered = [r for r in filtered if r.get('nutriscore') == nutriscore]
-    
-    if len(filtered) <= count:
-        return filtered
-    
-    return random.sample(filtered, count)
-
-# Print stats on load
-if VERIFIED_RECIPES:
-    print(f"✅ Loaded {len(VERIFIED_RECIPES)} recipes from database")
-    
-    # Category stats
-    categories = {}
-    for r in VERIFIED_RECIPES:
-        cat = r.get('category', 'autre')
-        categories[cat] = categories.get(cat, 0) + 1
-    
-    bariatric = sum(v for k, v in categories.items() if 'bariatric' in k)
-    print(f"   - Bariatric recipes: {bariatric}")
-    print(f"   - Categories: {len(categories)}")
+    store = get_store()
+    return store.sample(count, store.select(category=category, nutriscore=nutriscore))
+
+def get_recipes_stats():
+    """Recipe counts per category and nutri-score, computed on the columns"""
+    store = get_store()
+    return {
+        "total": len(store),
+        "by_category": store.value_counts('category'),
+        "by_nutri_score": store.value_counts('nutriscore'),
+    }
+
+def warm_up():
+    """Open the store and log its stats (startup warm-up hook)"""
+    stats = get_recipes_stats()
+    if stats["total"]:
+        bariatric = sum(v for k, v in stats["by_category"].items() if 'bariatric' in k)
+        logger.info(
+            f"✅ Loaded {stats['total']} recipes from database "
+            f"(bariatric: {bariatric}, categories: {len(stats['by_category'])})"
+        )
+    return stats
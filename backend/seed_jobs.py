@@ -0,0 +1,269 @@
+"""
+Background seeding job for fake community users
+Builds users, points, group memberships and posts in chunks written with
+unordered insert_many, then friendships. Progress lives in `seed_jobs` so a
+job can be polled, and resumed after a crash or restart.
+
+Idempotency: every seeded document carries `seed_chunk` ("<job_id>:<n>").
+A chunk that was interrupted is wiped by that key and rewritten, and
+completed chunks are never replayed.
+
+Throughput target: SEED_TARGET_DOCS_PER_SECOND documents per second across
+all collections (~8 docs per user). The measured rate is reported on the
+status endpoint next to the target.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo.errors import BulkWriteError
+
+from community_scheduler import friendship_pair_key
+from job_lease import acquire_lease, claim_lease, finish_job, fail_job, retry_job
+from utils.search_tokens import user_search_tokens
+
+logger = logging.getLogger(__name__)
+
+SEED_CHUNK_SIZE = 250
+SEED_TARGET_DOCS_PER_SECOND = 5000
+SEED_LEASE_SECONDS = 120
+SEED_FRIENDSHIPS = 500
+SEEDED_COLLECTIONS = ("users", "user_points", "group_members", "social_posts", "friendships")
+
+FEMALE_NAMES = ["Marie", "Camille", "Léa", "Manon", "Emma", "Chloé", "Louise", "Jade", "Alice", "Sarah",
+                "Julie", "Laura", "Marion", "Pauline", "Clara", "Charlotte", "Anaïs", "Océane", "Margot", "Valentine",
+                "Sophie", "Lucie", "Audrey", "Justine", "Mathilde", "Caroline", "Amélie", "Élodie", "Mélanie", "Aurélie",
+                "Céline", "Marine", "Nathalie", "Sandrine", "Virginie", "Stéphanie", "Delphine", "Isabelle", "Valérie", "Laetitia",
+                "Alexandra", "Christelle", "Séverine", "Morgane", "Floriane", "Élise", "Gaëlle", "Noémie", "Agathe", "Inès",
+                "Zoé", "Lola", "Romane", "Nina", "Eva", "Maëva", "Alicia", "Mélissa", "Coralie", "Cindy"]
+MALE_NAMES = ["Thomas", "Lucas", "Hugo", "Maxime", "Alexandre", "Antoine", "Julien", "Nicolas", "Pierre", "Louis",
+              "Clément", "Vincent", "François", "Guillaume", "Romain", "Mathieu", "Adrien", "Quentin", "Xavier", "Florian",
+              "Sébastien", "Laurent", "Christophe", "Olivier", "Frédéric", "David", "Philippe", "Jérôme", "Benoît", "Damien",
+              "Kevin", "Jonathan", "Benjamin", "Raphaël", "Théo", "Nathan", "Léo", "Noah", "Enzo", "Mathis",
+              "Dylan", "Jordan", "Alexis", "Valentin", "Victor", "Baptiste", "Gabriel", "Arthur", "Ethan", "Paul"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+              "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier",
+              "Morel", "Girard", "André", "Mercier", "Dupont", "Lambert", "Bonnet", "François", "Martinez", "Legrand",
+              "Garnier", "Faure", "Rousseau", "Blanc", "Guerin", "Muller", "Henry", "Roussel", "Nicolas", "Perrin",
+              "Morin", "Mathieu", "Clement", "Gauthier", "Dumont", "Lopez", "Fontaine", "Chevalier", "Robin", "Masson"]
+
+AVATAR_BASE = "https://ui-avatars.com/api/?background=random&name="
+SEED_GROUPS = ["fitness", "cardio", "nutrition", "weight_loss", "muscle_gain", "yoga"]
+OBJECTIVES = ["Perdre du poids", "Gagner en muscle", "Améliorer mon endurance", "Manger plus sainement", "Être en meilleure forme"]
+
+SEED_POST_CONTENTS = [
+    "Super séance aujourd'hui ! 💪", "Je me sens en forme ! 🏋️", "Objectif du jour atteint ✅",
+    "Petit déjeuner healthy 🥗", "Merci pour vos encouragements ! ❤️", "Nouvelle semaine, nouveaux objectifs 🎯",
+    "Le sport, c'est la vie ! 🏃", "Progrès du mois, fier(e) de moi 📈", "Recette du jour : smoothie protéiné 🍓",
+    "Motivation au top ! 🔥", "Jour de repos bien mérité 😴", "30 min de cardio ce matin 🚴",
+    "Mes muscles me disent merci 💪", "Premier jour sans grignotage ! 🎉", "Meal prep du dimanche 🍱",
+    "1kg de perdu cette semaine ! ⬇️", "Nouvelle PR au squat 🏆", "Hydratation on point 💧",
+    "Je ne lâche rien ! 💯", "Semaine 4 de mon programme 📅", "Mon coach serait fier de moi 🌟",
+    "Les résultats commencent à se voir 👀", "Alimentation équilibrée = énergie décuplée ⚡",
+    "Marche quotidienne ✅ 10 000 pas atteints", "Stretching du soir 🧘", "Sleep is the best recovery 😴",
+    "Protéines ✓ Légumes ✓ Hydratation ✓", "Batch cooking pour la semaine 🍳", "Objectif 5km en moins de 30min 🏃‍♂️",
+    "Mental fort, corps fort 🧠💪", "Yoga flow du matin terminé 🙏", "Félicitations à tous pour vos efforts ! 🎊"
+]
+
+# Keep references to running jobs so tasks are not garbage collected
+_RUNNING = {}
+
+
+def build_seed_chunk(job: dict, chunk: int) -> dict:
+    """Documents of one chunk, keyed by collection"""
+    key = f"{job['job_id']}:{chunk}"
+    rng = random.Random(key)
+    now = datetime.now(timezone.utc)
+    docs = {"users": [], "user_points": [], "group_members": [], "social_posts": []}
+
+    first = chunk * SEED_CHUNK_SIZE
+    last = min(first + SEED_CHUNK_SIZE, job["to_create"])
+    for i in range(first, last):
+        is_female = i < job["female_count"]
+        first_name = rng.choice(FEMALE_NAMES if is_female else MALE_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        user_id = f"fake_{uuid.UUID(int=rng.getrandbits(128)).hex[:10]}"
+        points = rng.randint(50, 8000)
+
+        email = f"{first_name.lower()}.{last_name.lower()}{rng.randint(1, 999)}@example.com"
+        name = f"{first_name} {last_name}"
+        docs["users"].append({
+            "user_id": user_id,
+            "email": email,
+            "name": name,
+            "picture": f"{AVATAR_BASE}{first_name}+{last_name}",
+            "onboarding_completed": True,
+            "is_premium": rng.random() < 0.15,
+            "is_fake": True,
+            "gender": "female" if is_female else "male",
+            "objective": rng.choice(OBJECTIVES),
+            "badges_count": rng.randint(0, 20),
+            "created_at": (now - timedelta(days=rng.randint(1, 365))).isoformat(),
+            "search_tokens": user_search_tokens(name, email),
+            "seed_chunk": key
+        })
+        docs["user_points"].append({
+            "user_id": user_id,
+            "total_points": points,
+            "challenge_points": rng.randint(0, points // 3),
+            "created_at": now.isoformat(),
+            "seed_chunk": key
+        })
+        for group_id in rng.sample(SEED_GROUPS, rng.randint(1, 4)):
+            docs["group_members"].append({
+                "group_id": group_id,
+                "user_id": user_id,
+                "joined_at": (now - timedelta(days=rng.randint(1, 180))).isoformat(),
+                "seed_chunk": key
+            })
+        for _ in range(rng.randint(0, 5)):
+            docs["social_posts"].append({
+                "post_id": f"post_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+                "user_id": user_id,
+                "content": rng.choice(SEED_POST_CONTENTS),
+                "type": "text",
+                "is_public": True,
+                "group_id": rng.choice(SEED_GROUPS) if rng.random() < 0.6 else None,
+                "likes": [],
+                "comments": [],
+                "created_at": (now - timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23))).isoformat(),
+                "seed_chunk": key
+            })
+    return docs
+
+
+async def _write_chunk(db, key: str, docs: dict) -> int:
+    """Wipe any partial write of this chunk, then insert it (unordered, in parallel)"""
+    await asyncio.gather(*(db[name].delete_many({"seed_chunk": key}) for name in docs))
+    await asyncio.gather(*(db[name].insert_many(batch, ordered=False) for name, batch in docs.items() if batch))
+    return sum(len(batch) for batch in docs.values())
+
+
+async def _seed_friendships(db, job: dict) -> int:
+    """Random accepted friendships between the users created by this job"""
+    key = f"{job['job_id']}:friendships"
+    prefix = f"^{job['job_id']}:"
+    user_ids = [u["user_id"] for u in await db.users.find(
+        {"seed_chunk": {"$regex": prefix}}, {"_id": 0, "user_id": 1}
+    ).to_list(None)]
+    if len(user_ids) < 2:
+        return 0
+
+    rng = random.Random(key)
+    now = datetime.now(timezone.utc)
+    pairs = {}
+    for _ in range(min(len(user_ids), SEED_FRIENDSHIPS)):
+        user_id, friend_id = rng.sample(user_ids, 2)
+        pairs.setdefault(friendship_pair_key(user_id, friend_id), (user_id, friend_id))
+    friendships = [{
+        "friendship_id": f"friend_{uuid.UUID(int=rng.getrandbits(128)).hex[:8]}",
+        "pair_key": pair_key,
+        "user_id": user_id,
+        "friend_id": friend_id,
+        "status": "accepted",
+        "created_at": (now - timedelta(days=rng.randint(1, 90))).isoformat(),
+        "seed_chunk": key
+    } for pair_key, (user_id, friend_id) in pairs.items()]
+    try:
+        return await _write_chunk(db, key, {"friendships": friendships})
+    except BulkWriteError as e:
+        # Unique pair_key: pairs the community scheduler already linked are skipped
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+async def run_seed_job(db, job_id: str):
+    """Run (or resume) a seeding job until all chunks and friendships are written"""
+    owner = uuid.uuid4().hex
+    job = await acquire_lease(db.seed_jobs, job_id, owner, SEED_LEASE_SECONDS)
+    if not job:
+        return
+    start = time.perf_counter()
+    written = 0
+    try:
+        for chunk in range(job["chunks_done"], job["chunks_total"]):
+            docs = build_seed_chunk(job, chunk)
+            chunk_docs = await _write_chunk(db, f"{job_id}:{chunk}", docs)
+            written += chunk_docs
+            elapsed = time.perf_counter() - start
+            await db.seed_jobs.update_one({"job_id": job_id, "owner": owner}, {
+                "$set": {"chunks_done": chunk + 1, "docs_per_second": round(written / elapsed) if elapsed else None},
+                "$inc": {"created": len(docs["users"]), "docs_written": chunk_docs}
+            })
+            if not await claim_lease(db.seed_jobs, job_id, owner, SEED_LEASE_SECONDS):
+                logger.warning(f"[Seed] Lost lease on job {job_id}, stopping")
+                return
+
+        friendships = await _seed_friendships(db, job)
+        written += friendships
+        elapsed = time.perf_counter() - start
+        await db.seed_jobs.update_one({"job_id": job_id, "owner": owner}, {"$inc": {"docs_written": friendships}})
+        await finish_job(db.seed_jobs, job_id, owner, {
+            "friendships": friendships,
+            "docs_per_second": round(written / elapsed) if elapsed else None
+        })
+        logger.info(f"[Seed] Job {job_id} completed: {written} docs in {elapsed:.1f}s")
+    except Exception as e:
+        logger.error(f"[Seed] Job {job_id} failed: {e}")
+        await fail_job(db.seed_jobs, job_id, owner, str(e))
+
+
+def start_seed_job(db, job_id: str):
+    """Schedule run_seed_job in the running event loop"""
+    if job_id in _RUNNING and not _RUNNING[job_id].done():
+        return
+    task = asyncio.create_task(run_seed_job(db, job_id))
+    _RUNNING[job_id] = task
+    task.add_done_callback(lambda _: _RUNNING.pop(job_id, None))
+
+
+async def create_seed_job(db, target_count: int, requested_by: str) -> dict:
+    """Create a job for the missing fake users, or resume the unfinished one"""
+    active = await db.seed_jobs.find_one({"status": {"$in": ["pending", "running", "failed"]}}, {"_id": 0})
+    if active:
+        if active["status"] == "failed":
+            await retry_job(db.seed_jobs, active["job_id"])
+            active["status"] = "pending"
+        start_seed_job(db, active["job_id"])
+        return active
+
+    existing_fake = await db.users.count_documents({"is_fake": True})
+    to_create = max(0, target_count - existing_fake)
+    job = {
+        "job_id": f"seed_{uuid.uuid4().hex[:12]}",
+        "status": "pending" if to_create else "completed",
+        "target": target_count,
+        "existing": existing_fake,
+        "to_create": to_create,
+        "female_count": int(to_create * 0.6),
+        "chunk_size": SEED_CHUNK_SIZE,
+        "chunks_total": -(-to_create // SEED_CHUNK_SIZE),
+        "chunks_done": 0,
+        "created": 0,
+        "docs_written": 0,
+        "docs_per_second": None,
+        "target_docs_per_second": SEED_TARGET_DOCS_PER_SECOND,
+        "requested_by": requested_by,
+        "lease_until": None,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.seed_jobs.insert_one(job)
+    job.pop("_id", None)
+    if to_create:
+        start_seed_job(db, job["job_id"])
+    return job
+
+
+async def resume_seed_jobs(db) -> int:
+    """Restart jobs interrupted by a crash or redeploy (called at startup)
+
+    A job whose lease has not expired yet is picked up once it does.
+    """
+    jobs = await db.seed_jobs.find({"status": {"$in": ["pending", "running"]}}, {"_id": 0, "job_id": 1}).to_list(None)
+    for job in jobs:
+        start_seed_job(db, job["job_id"])
+    return len(jobs)
@@ -1,12 +1,19 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Response, Request
-from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, StreamingResponse
+# Imported first so boot phases are timed from before fastapi/motor load
+import startup_profile
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Response, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
 import random
 import hashlib
+import hmac
 import json
 import re
 from pathlib import Path
@@ -20,17 +27,44 @@ import bcrypt
 import httpx
 from difflib import SequenceMatcher
 
-# APScheduler for automated community interactions
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from community_scheduler import run_community_automation
-
-# Import recipes database
-from recipes_database import (
-    VERIFIED_RECIPES, 
-    get_verified_recipes,
-    search_recipes_by_name
+# Lazy loading of heavy optional dependencies
+from lazy_imports import lazy_import, register_warmup, run_warmups
+
+# asyncio-native scheduler for automated community interactions
+from community_scheduler import CommunityScheduler, friendship_pair_key
+from seed_jobs import SEEDED_COLLECTIONS, create_seed_job, resume_seed_jobs
+from account_deletion import create_deletion_job, resume_deletion_jobs
+from migrations import run_migrations
+from realtime import get_pubsub, publish_to_user, user_channel, encode_event
+from profile_stats import get_profile_stats, bump_profile_stats, bump_profile_stats_many
+from user_analytics import get_user_analytics
+from entitlements import get_entitlement, is_premium, invalidate as invalidate_entitlement, is_active as entitlement_active
+from calendar_sync import run_blocking, get_calendar_service, sync_calendar_events
+from pdf_report import (
+    ensure_report_indexes, create_report_job, get_cached_report, shutdown_report_pool, bump_report_data_version
 )
+from timeline import (
+    ensure_timeline_indexes, build_timeline, read_timeline, publish_activity,
+    add_author_to_timeline, remove_author_from_timeline
+)
+from utils.search_tokens import user_search_tokens, query_tokens
+from utils.food_categories import categorize_food_item, categorize_food_items
+from utils.shopping_quantities import merge_quantities
+from perf_metrics import MongoCommandCounter, RequestMetricsMiddleware, render_metrics
+from slow_queries import slow_query_listener, ensure_slow_query_indexes, list_slow_queries
+
+# Import recipes database (store is opened lazily / by the warm-up hook)
+import recipes_database
+from recipes_database import search_recipes_by_name
+
+# Heavy optional dependencies: imported on first use, preloaded after startup
+llm_chat = lazy_import("emergentintegrations.llm.chat")
+dateutil_parser = lazy_import("dateutil.parser")
+google_oauth_flow = lazy_import("google_auth_oauthlib.flow")
+google_credentials = lazy_import("google.oauth2.credentials")
+google_auth_requests = lazy_import("google.auth.transport.requests")
+google_discovery = lazy_import("googleapiclient.discovery")
+register_warmup("recipes", recipes_database.warm_up)
 
 ROOT_DIR = Path(__file__).parent
 FRONTEND_PUBLIC_DIR = ROOT_DIR.parent / 'frontend' / 'public'
@@ -38,7 +72,9 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Command listeners: per-request Mongo command counts and timings (see perf_metrics),
+# slow-query log with explain capture (see slow_queries)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandCounter(), slow_query_listener])
 db = client[os.environ['DB_NAME']]
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'fatandslim_secret')
@@ -395,6 +431,26 @@ async def get_current_user(request: Request) -> dict:
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header.split(" ")[1]
     
+    return await get_user_from_token(token)
+
+# Comma-separated emails allowed on /api/admin endpoints
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',') if e.strip()}
+
+async def get_admin_user(request: Request) -> dict:
+    user = await get_current_user(request)
+    if (user.get("email") or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def with_entitlement(user: dict) -> dict:
+    """Fold the cached premium entitlement into the auth context (premium_active / premium_until)"""
+    entitlement = await get_entitlement(db, user["user_id"])
+    user["premium_active"] = entitlement_active(entitlement)
+    user["premium_until"] = entitlement["expires_at"].isoformat() if entitlement["expires_at"] else None
+    return user
+
+async def get_user_from_token(token: Optional[str]) -> dict:
+    """Resolve a session token or JWT to the user document (HTTP and WebSocket auth)"""
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
@@ -410,17 +466,17 @@ async def get_current_user(request: Request) -> dict:
             raise HTTPException(status_code=401, detail="Session expired")
         
         user = await db.users.find_one({"user_id": session["user_id"]}, {"_id": 0})
-        if not user:
+        if not user or user.get("disabled"):
             raise HTTPException(status_code=401, detail="User not found")
-        return user
+        return await with_entitlement(user)
     
     # Try JWT token
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0})
-        if not user:
+        if not user or user.get("disabled"):  # Account deletion in progress
             raise HTTPException(status_code=401, detail="User not found")
-        return user
+        return await with_entitlement(user)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
@@ -443,6 +499,7 @@ async def register(user: UserCreate, response: Response):
         "picture": None,
         "onboarding_completed": False,
         "is_premium": False,
+        "search_tokens": user_search_tokens(user.name, user.email),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.users.insert_one(user_doc)
@@ -578,7 +635,11 @@ async def process_session(request: Request, response: Response):
         user_id = existing_user["user_id"]
         await db.users.update_one(
             {"user_id": user_id},
-            {"$set": {"name": user_data["name"], "picture": user_data.get("picture")}}
+            {"$set": {
+                "name": user_data["name"],
+                "picture": user_data.get("picture"),
+                "search_tokens": user_search_tokens(user_data["name"], user_data["email"])
+            }}
         )
     else:
         user_id = f"user_{uuid.uuid4().hex[:12]}"
@@ -589,6 +650,7 @@ async def process_session(request: Request, response: Response):
             "picture": user_data.get("picture"),
             "onboarding_completed": False,
             "is_premium": False,
+            "search_tokens": user_search_tokens(user_data["name"], user_data["email"]),
             "created_at": datetime.now(timezone.utc).isoformat()
         })
     
@@ -913,6 +975,7 @@ async def complete_onboarding(data: OnboardingData, user: dict = Depends(get_cur
         {"$set": profile_doc},
         upsert=True
     )
+    await bump_report_data_version(db, user["user_id"])
     
     await db.users.update_one(
         {"user_id": user["user_id"]},
@@ -947,6 +1010,7 @@ async def update_profile(data: dict, user: dict = Depends(get_current_user)):
         {"$set": data},
         upsert=True
     )
+    await bump_report_data_version(db, user["user_id"])
     return {"message": "Profile updated"}
 
 @api_router.put("/profile/name")
@@ -959,7 +1023,11 @@ async def update_profile_name(data: dict, user: dict = Depends(get_current_user)
     # Update in users collection
     await db.users.update_one(
         {"user_id": user["user_id"]},
-        {"$set": {"name": new_name, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {
+            "name": new_name,
+            "search_tokens": user_search_tokens(new_name, user.get("email")),
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }}
     )
     
     # Also update in user_profiles
@@ -1303,6 +1371,7 @@ async def create_bariatric_log(data: dict, user: dict = Depends(get_current_user
             }},
             upsert=True
         )
+        await bump_report_data_version(db, user["user_id"])
     
     # Check for alerts
     alerts = []
@@ -2147,7 +2216,7 @@ Prévenez votre chirurgien si les symptômes persistent ou s'aggravent.""",
 @api_router.post("/bariatric/coach")
 async def bariatric_coach(data: dict, user: dict = Depends(get_current_user)):
     """Bariatric AI coach with strict medical guardrails - uses AI credits"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    LlmChat, UserMessage = llm_chat.LlmChat, llm_chat.UserMessage
     
     profile = await db.user_profiles.find_one({"user_id": user["user_id"]}, {"_id": 0})
     
@@ -2345,6 +2414,7 @@ async def save_daily_bariatric_log(data: dict, user: dict = Depends(get_current_
         {"$set": log_entry},
         upsert=True
     )
+    await bump_report_data_version(db, user["user_id"])
     
     # Update weight in profile if provided
     if data.get("weight"):
@@ -2392,7 +2462,7 @@ async def accept_bariatric_disclaimer(user: dict = Depends(get_current_user)):
 @api_router.post("/food/analyze")
 async def analyze_food(file: UploadFile = File(...), user: dict = Depends(get_current_user)):
     """Analyze food image using AI vision with user profile context"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
+    LlmChat, UserMessage, ImageContent = llm_chat.LlmChat, llm_chat.UserMessage, llm_chat.ImageContent
     import json
     
     # ===== AI LIMIT CHECK =====
@@ -2756,7 +2826,7 @@ async def scan_barcode(barcode: str, user: dict = Depends(get_current_user)):
 @api_router.post("/food/recommend-alternatives")
 async def recommend_alternatives(entry: dict, user: dict = Depends(get_current_user)):
     """Get AI recommendations for healthier alternatives - IN FRENCH"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    LlmChat, UserMessage = llm_chat.LlmChat, llm_chat.UserMessage
     import json
     
     # ===== AI LIMIT CHECK =====
@@ -2851,6 +2921,7 @@ async def log_food(entry: FoodLogEntry, user: dict = Depends(get_current_user)):
         "logged_at": now.isoformat()
     }
     await db.food_logs.insert_one(log_doc)
+    await bump_report_data_version(db, user["user_id"])
     
     # Also add to agenda for tracking
     meal_type_labels = {
@@ -2989,6 +3060,7 @@ async def delete_food_log(entry_id: str, user: dict = Depends(get_current_user))
     result = await db.food_logs.delete_one({"entry_id": entry_id, "user_id": user["user_id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Entry not found")
+    await bump_report_data_version(db, user["user_id"])
     return {"message": "Entry deleted"}
 
 # ==================== AGENDA NOTES ENDPOINTS ====================
@@ -3039,7 +3111,7 @@ async def delete_agenda_note(note_id: str, user: dict = Depends(get_current_user
 @api_router.post("/meals/generate")
 async def generate_meal_plan(data: dict = {}, user: dict = Depends(get_current_user)):
     """Generate AI-powered meal plan based on user profile"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    LlmChat, UserMessage = llm_chat.LlmChat, llm_chat.UserMessage
     import json
     
     # ===== AI LIMIT CHECK =====
@@ -3253,7 +3325,7 @@ async def search_recipes_simple(query: str = "", user: dict = Depends(get_curren
 @api_router.post("/recipes/generate")
 async def generate_recipes(data: dict = {}, user: dict = Depends(get_current_user)):
     """Generate AI-powered simple and affordable recipes"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    LlmChat, UserMessage = llm_chat.LlmChat, llm_chat.UserMessage
     import json
     
     # ===== AI LIMIT CHECK =====
@@ -3385,7 +3457,7 @@ Réponds UNIQUEMENT avec ce JSON:
 @api_router.post("/recipes/search")
 async def search_recipe_by_ai(data: dict, user: dict = Depends(get_current_user)):
     """Search for a specific recipe using AI based on user query"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    LlmChat, UserMessage = llm_chat.LlmChat, llm_chat.UserMessage
     import json
     
     query = data.get("query", "")
@@ -3524,6 +3596,7 @@ async def add_favorite_recipe(data: dict, user: dict = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Recipe already in favorites")
     
     await db.favorite_recipes.insert_one(fav_doc)
+    await bump_profile_stats(db, user["user_id"], favorite_recipes_count=1)
     return {"message": "Recipe added to favorites", "favorite_id": fav_doc["favorite_id"]}
 
 @api_router.get("/recipes/favorites")
@@ -3540,6 +3613,7 @@ async def remove_favorite_recipe(favorite_id: str, user: dict = Depends(get_curr
     result = await db.favorite_recipes.delete_one({"favorite_id": favorite_id, "user_id": user["user_id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Favorite not found")
+    await bump_profile_stats(db, user["user_id"], favorite_recipes_count=-1)
     return {"message": "Recipe removed from favorites"}
 
 # ==================== SHOPPING LIST (LISTE DE COURSES) ====================
@@ -3553,84 +3627,16 @@ async def get_shopping_list(user: dict = Depends(get_current_user)):
     ).to_list(200)
     
     # Auto-categorize items that don't have a category
-    for item in items:
-        if not item.get("category") or item.get("category") == "Autres" or item.get("category") == "Ingrédients":
-            item["category"] = categorize_food_item(item.get("display_name", item.get("item", "")))
+    uncategorized = [
+        item for item in items
+        if not item.get("category") or item.get("category") == "Autres" or item.get("category") == "Ingrédients"
+    ]
+    categories = categorize_food_items(item.get("display_name", item.get("item", "")) for item in uncategorized)
+    for item, category in zip(uncategorized, categories):
+        item["category"] = category
     
     return items
 
-def categorize_food_item(item_name: str) -> str:
-    """Automatically categorize food items"""
-    item_lower = item_name.lower()
-    
-    # Fruits
-    fruits = ["pomme", "banane", "orange", "citron", "fraise", "framboise", "myrtille", "raisin", 
-              "poire", "pêche", "abricot", "cerise", "mangue", "ananas", "kiwi", "melon", "pastèque",
-              "fruit", "agrume", "baie", "clémentine", "mandarine", "prune", "figue"]
-    if any(f in item_lower for f in fruits):
-        return "🍎 Fruits"
-    
-    # Légumes
-    legumes = ["carotte", "tomate", "salade", "laitue", "épinard", "courgette", "aubergine", 
-               "poivron", "oignon", "ail", "échalote", "brocoli", "chou", "haricot vert",
-               "petit pois", "asperge", "artichaut", "betterave", "navet", "radis", "céleri",
-               "poireau", "fenouil", "légume", "concombre", "avocat", "champignon", "endive"]
-    if any(l in item_lower for l in legumes):
-        return "🥬 Légumes"
-    
-    # Viandes
-    viandes = ["poulet", "boeuf", "porc", "veau", "agneau", "dinde", "canard", "lapin",
-               "viande", "steak", "escalope", "filet", "côte", "rôti", "saucisse", "jambon",
-               "bacon", "lard", "chorizo", "merguez"]
-    if any(v in item_lower for v in viandes):
-        return "🥩 Viandes"
-    
-    # Poissons et fruits de mer
-    poissons = ["saumon", "thon", "cabillaud", "colin", "sole", "bar", "dorade", "truite",
-                "sardine", "maquereau", "crevette", "moule", "huître", "crabe", "homard",
-                "poisson", "fruit de mer", "anchois", "lieu"]
-    if any(p in item_lower for p in poissons):
-        return "🐟 Poissons"
-    
-    # Produits laitiers
-    laitiers = ["lait", "fromage", "yaourt", "yogourt", "crème", "beurre", "œuf", "oeuf",
-                "mozzarella", "parmesan", "gruyère", "comté", "camembert", "chèvre", "feta"]
-    if any(l in item_lower for l in laitiers):
-        return "🥛 Produits laitiers"
-    
-    # Féculents
-    feculents = ["riz", "pâte", "spaghetti", "tagliatelle", "penne", "pain", "baguette",
-                 "pomme de terre", "patate", "quinoa", "boulgour", "semoule", "couscous",
-                 "lentille", "pois chiche", "haricot sec", "fève", "céréale", "flocon",
-                 "avoine", "blé", "orge", "maïs", "farine", "féculent"]
-    if any(f in item_lower for f in feculents):
-        return "🍞 Féculents"
-    
-    # Épices et condiments
-    epices = ["sel", "poivre", "épice", "herbe", "thym", "romarin", "basilic", "persil",
-              "coriandre", "menthe", "cumin", "curry", "paprika", "cannelle", "muscade",
-              "huile", "vinaigre", "moutarde", "ketchup", "mayonnaise", "sauce", "bouillon"]
-    if any(e in item_lower for e in epices):
-        return "🧂 Épices & Condiments"
-    
-    # Boissons
-    boissons = ["eau", "jus", "café", "thé", "lait", "soda", "limonade", "sirop", "boisson"]
-    if any(b in item_lower for b in boissons):
-        return "🥤 Boissons"
-    
-    # Sucreries et desserts
-    sucres = ["sucre", "chocolat", "bonbon", "gâteau", "biscuit", "cookie", "miel", 
-              "confiture", "dessert", "glace", "crème glacée", "pâtisserie", "tarte"]
-    if any(s in item_lower for s in sucres):
-        return "🍫 Sucreries"
-    
-    # Surgelés
-    surgeles = ["surgelé", "congelé", "glacé"]
-    if any(s in item_lower for s in surgeles):
-        return "❄️ Surgelés"
-    
-    return "📦 Autres"
-
 @api_router.post("/shopping-list")
 async def add_shopping_item(data: dict, user: dict = Depends(get_current_user)):
     """Add item to shopping list with auto-categorization"""
@@ -3646,71 +3652,89 @@ async def add_shopping_item(data: dict, user: dict = Depends(get_current_user)):
     if not category:
         category = categorize_food_item(item_name)
     
-    # Check if item already exists
-    existing = await db.shopping_list.find_one({
-        "user_id": user["user_id"],
-        "item": item_name.lower()
-    })
-    
-    if existing:
-        # Update quantity and portions
-        await db.shopping_list.update_one(
-            {"item_id": existing["item_id"]},
-            {"$set": {
-                "quantity": quantity, 
-                "portions": portions,
-                "category": category,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        return {"message": "Item updated", "item_id": existing["item_id"]}
-    
-    item_doc = {
-        "item_id": f"item_{uuid.uuid4().hex[:8]}",
-        "user_id": user["user_id"],
-        "item": item_name.lower(),
-        "display_name": item_name,
-        "quantity": quantity,
-        "portions": portions,
-        "category": category,
-        "checked": False,
-        "added_at": datetime.now(timezone.utc).isoformat()
-    }
+    # One upsert on the unique (user_id, item) index: an existing item gets the new quantity and portions
+    now = datetime.now(timezone.utc).isoformat()
+    new_item_id = f"item_{uuid.uuid4().hex[:8]}"
+    item_doc = await db.shopping_list.find_one_and_update(
+        {"user_id": user["user_id"], "item": item_name.lower()},
+        {
+            "$set": {"quantity": quantity, "portions": portions, "category": category, "updated_at": now},
+            "$setOnInsert": {"item_id": new_item_id, "display_name": item_name, "checked": False, "added_at": now}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0, "item_id": 1}
+    )
     
-    await db.shopping_list.insert_one(item_doc)
-    return {"message": "Item added", "item_id": item_doc["item_id"], "category": category}
+    if item_doc["item_id"] != new_item_id:
+        return {"message": "Item updated", "item_id": item_doc["item_id"]}
+    return {"message": "Item added", "item_id": new_item_id, "category": category}
 
 @api_router.post("/shopping-list/bulk")
 async def add_shopping_items_bulk(data: dict, user: dict = Depends(get_current_user)):
-    """Add multiple items to shopping list with auto-categorization"""
-    items = data.get("items", [])
-    added = 0
+    """Add multiple items to shopping list with auto-categorization
+
+    One $in read finds the items already on the list (their quantities are
+    merged); new items are upserted in the same bulk_write, so an item added
+    concurrently is not duplicated.
+    """
+    user_id = user["user_id"]
+    # Collapse the request first: same item twice -> one entry, merged quantity
+    requested = {}
+    for item in data.get("items", []):
+        item_name = item if isinstance(item, str) else item.get("item", "")
+        if not isinstance(item_name, str) or not item_name.strip():
+            continue
+        item_name = item_name.strip()
+        quantity = item.get("quantity", "") if isinstance(item, dict) else ""
+        key = item_name.lower()
+        if key in requested:
+            requested[key]["quantity"] = merge_quantities(requested[key]["quantity"], quantity)
+        else:
+            requested[key] = {"display_name": item_name, "quantity": quantity}
+    
+    if not requested:
+        return {"message": "0 items added", "added_count": 0, "updated_count": 0}
+    
+    existing = await db.shopping_list.find(
+        {"user_id": user_id, "item": {"$in": list(requested)}},
+        {"_id": 0, "item_id": 1, "item": 1, "quantity": 1}
+    ).to_list(None)
+    existing_by_name = {e["item"]: e for e in existing}
+    
+    now = datetime.now(timezone.utc).isoformat()
+    updates = [
+        UpdateOne(
+            {"item_id": e["item_id"]},
+            {"$set": {"quantity": merge_quantities(e.get("quantity"), requested[e["item"]]["quantity"]), "updated_at": now}}
+        )
+        for e in existing_by_name.values() if requested[e["item"]]["quantity"]
+    ]
+    new_names = [key for key in requested if key not in existing_by_name]
+    categories = categorize_food_items(requested[key]["display_name"] for key in new_names)
+    inserts = [
+        UpdateOne(
+            {"user_id": user_id, "item": key},
+            {"$setOnInsert": {
+                "item_id": f"item_{uuid.uuid4().hex[:8]}",
+                "display_name": requested[key]["display_name"],
+                "quantity": requested[key]["quantity"],
+                "portions": 1,
+                "category": category,
+                "checked": False,
+                "added_at": now
+            }},
+            upsert=True
+        )
+        for key, category in zip(new_names, categories)
+    ]
     
-    for item in items:
-        item_name = item.get("item") or item if isinstance(item, str) else item.get("item", "")
-        if isinstance(item_name, str) and item_name.strip():
-            existing = await db.shopping_list.find_one({
-                "user_id": user["user_id"],
-                "item": item_name.lower()
-            })
-            
-            if not existing:
-                quantity = item.get("quantity", "") if isinstance(item, dict) else ""
-                item_doc = {
-                    "item_id": f"item_{uuid.uuid4().hex[:8]}",
-                    "user_id": user["user_id"],
-                    "item": item_name.lower(),
-                    "display_name": item_name,
-                    "quantity": quantity,
-                    "portions": 1,
-                    "category": categorize_food_item(item_name),
-                    "checked": False,
-                    "added_at": datetime.now(timezone.utc).isoformat()
-                }
-                await db.shopping_list.insert_one(item_doc)
-                added += 1
+    added = 0
+    if inserts or updates:
+        result = await db.shopping_list.bulk_write(inserts + updates, ordered=False)
+        added = result.upserted_count
     
-    return {"message": f"{added} items added", "added_count": added}
+    return {"message": f"{added} items added", "added_count": added, "updated_count": len(updates)}
 
 @api_router.put("/shopping-list/{item_id}")
 async def update_shopping_item(item_id: str, data: dict, user: dict = Depends(get_current_user)):
@@ -4695,60 +4719,33 @@ async def get_all_recipes_endpoint(
     offset: int = 0
 ):
     """Get all available recipes with filtering - using VERIFIED database"""
-    from recipes_database import VERIFIED_RECIPES
-    
-    recipes = VERIFIED_RECIPES.copy()
-    
-    # Filter by nutri_score
-    if nutri_score:
-        recipes = [r for r in recipes if r["nutri_score"] == nutri_score.upper()]
-    
-    # Filter by category
-    if category:
-        recipes = [r for r in recipes if r["category"] == category.lower()]
-    
-    # Filter by dish_type (entree, plat, dessert, accompagnement, viande, gouter)
-    if dish_type:
-        recipes = [r for r in recipes if r.get("dish_type", "") == dish_type.lower()]
-    
-    total = len(recipes)
-    paginated = recipes[offset:offset + limit]
-    
-    # Get stats from verified recipes
-    stats = {
-        "total": len(VERIFIED_RECIPES),
-        "by_category": {},
-        "by_nutri_score": {}
-    }
+    from recipes_database import VERIFIED_RECIPES, get_recipes_stats
+    
+    # Filter on the store columns, only the requested page is materialized.
+    # `nutri_score` (query param) filters the recipes' "nutriscore" field.
+    indices = VERIFIED_RECIPES.select(
+        nutriscore=nutri_score.upper() if nutri_score else None,
+        category=category.lower() if category else None,
+        # entree, plat, dessert, accompagnement, viande, gouter
+        dish_type=dish_type.lower() if dish_type else None
+    )
     
-    for r in VERIFIED_RECIPES:
-        cat = r.get("category", "other")
-        stats["by_category"][cat] = stats["by_category"].get(cat, 0) + 1
-        ns = r.get("nutri_score", "B")
-        stats["by_nutri_score"][ns] = stats["by_nutri_score"].get(ns, 0) + 1
+    total = len(indices)
+    paginated = [VERIFIED_RECIPES[i] for i in indices[offset:offset + limit]]
     
     return {
         "recipes": paginated, 
         "total": total,
         "limit": limit,
         "offset": offset,
-        "stats": stats
+        "stats": get_recipes_stats()
     }
 
 @api_router.get("/recipes/stats")
 async def get_recipes_stats_endpoint():
     """Get statistics about the recipe database"""
-    stats = {
-        "total": len(VERIFIED_RECIPES),
-        "by_category": {},
-        "by_nutri_score": {}
-    }
-    for r in VERIFIED_RECIPES:
-        cat = r.get("category", "other")
-        stats["by_category"][cat] = stats["by_category"].get(cat, 0) + 1
-        ns = r.get("nutri_score", "B")
-        stats["by_nutri_score"][ns] = stats["by_nutri_score"].get(ns, 0) + 1
-    return stats
+    from recipes_database import get_recipes_stats
+    return get_recipes_stats()
 
 # ==================== PROFILE PICTURE UPLOAD ====================
 
@@ -4800,32 +4797,31 @@ async def delete_profile_picture(user: dict = Depends(get_current_user)):
 
 @api_router.delete("/profile/account")
 async def delete_account(user: dict = Depends(get_current_user)):
-    """Delete user account and all associated data"""
-    user_id = user["user_id"]
-    
-    # Delete all user data from all collections
-    collections_to_clean = [
-        "users", "user_profiles", "user_points", "user_badges",
-        "food_logs", "workout_logs", "weight_history", "bmi_history",
-        "agenda_events", "bariatric_logs", "scan_history",
-        "social_posts", "friendships", "conversations", "messages",
-        "group_members", "favorite_recipes", "shopping_list",
-        "ai_usage", "ai_cache", "recipe_generation_cache"
-    ]
-    
-    for collection in collections_to_clean:
-        try:
-            await db[collection].delete_many({"user_id": user_id})
-        except Exception:
-            pass
-    
-    # Also delete where user might be friend_id
-    try:
-        await db.friendships.delete_many({"friend_id": user_id})
-    except Exception:
-        pass
-    
-    return {"message": "Account deleted successfully"}
+    """Delete user account and all associated data (sessions revoked now, data by a background job, see account_deletion)"""
+    job = await create_deletion_job(db, user["user_id"])
+    invalidate_entitlement(user["user_id"])
+    return {
+        "message": "Account deletion started",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/api/profile/account/deletion/{job['job_id']}"
+    }
+
+@api_router.get("/profile/account/deletion/{job_id}")
+async def get_account_deletion_status(job_id: str):
+    """Progress of an account deletion (no auth: the account may already be gone, so status and progress only)"""
+    job = await db.deletion_jobs.find_one(
+        {"job_id": job_id},
+        {"_id": 0, "job_id": 1, "status": 1, "collections": 1, "collections_total": 1}
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    done = len(job.get("collections") or {})
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": round(done / job["collections_total"] * 100, 1) if job.get("collections_total") else 100.0
+    }
 
 @api_router.post("/profile/reset-onboarding")
 async def reset_onboarding(user: dict = Depends(get_current_user)):
@@ -4878,6 +4874,7 @@ async def add_meal_to_diary(data: dict, user: dict = Depends(get_current_user)):
     }
     
     await db.food_logs.insert_one(log_doc)
+    await bump_report_data_version(db, user["user_id"])
     
     # Also save to agenda notes
     await db.agenda_notes.update_one(
@@ -4900,7 +4897,7 @@ async def add_meal_to_diary(data: dict, user: dict = Depends(get_current_user)):
 @api_router.post("/workouts/generate")
 async def generate_workout(user: dict = Depends(get_current_user)):
     """Generate AI-powered workout plan"""
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    LlmChat, UserMessage = llm_chat.LlmChat, llm_chat.UserMessage
     import json
     
     # ===== AI LIMIT CHECK =====
@@ -5159,6 +5156,7 @@ async def share_workout_to_feed(data: dict, user: dict = Depends(get_current_use
     }
     
     await db.social_posts.insert_one(post)
+    await bump_profile_stats(db, user["user_id"], posts_count=1)
     
     # Award points
     await db.users.update_one(
@@ -5364,7 +5362,7 @@ Format JSON attendu:
 }}"""
 
     try:
-        from emergentintegrations.llm.chat import chat, Message
+        chat, Message = llm_chat.chat, llm_chat.Message
         
         response = await chat(
             api_key=os.environ.get('EMERGENT_LLM_KEY'),
@@ -5428,6 +5426,22 @@ Format JSON attendu:
     
     return program
 
+AGENDA_INSERT_CHUNK = 500
+
+async def insert_many_chunked(collection, docs: list, chunk_size: int = AGENDA_INSERT_CHUNK) -> int:
+    """Unordered insert_many in concurrent chunks; duplicates (unique index) are skipped, returns inserted count"""
+    async def insert_chunk(chunk):
+        try:
+            result = await collection.insert_many(chunk, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            return e.details.get("nInserted", 0)
+    
+    chunks = [docs[i:i + chunk_size] for i in range(0, len(docs), chunk_size)]
+    return sum(await asyncio.gather(*(insert_chunk(c) for c in chunks)))
+
 @api_router.post("/workouts/coach/add-to-agenda")
 async def add_program_to_agenda(data: dict, user: dict = Depends(get_current_user)):
     """Add generated program to user's agenda with reminders"""
@@ -5446,9 +5460,12 @@ async def add_program_to_agenda(data: dict, user: dict = Depends(get_current_use
     
     default_time = time_of_day_hours.get(config.get("timeOfDay", "morning"), "08:00")
     
-    appointments_added = 0
+    program_id = program.get("program_id")
     today = datetime.now(timezone.utc)
+    created_at = today.isoformat()
     
+    # Build the whole schedule in memory; program_slot identifies a session within the program
+    appointments = []
     for week in program.get("weeks", []):
         week_num = week.get("week_number", 1)
         
@@ -5459,7 +5476,6 @@ async def add_program_to_agenda(data: dict, user: dict = Depends(get_current_use
             days_offset = (week_num - 1) * 7 + day_num - 1
             workout_date = (today + timedelta(days=days_offset)).strftime("%Y-%m-%d")
             
-            # Create appointment
             appointment = {
                 "appointment_id": f"apt_{uuid.uuid4().hex[:8]}",
                 "user_id": user["user_id"],
@@ -5470,16 +5486,35 @@ async def add_program_to_agenda(data: dict, user: dict = Depends(get_current_use
                 "notes": f"Programme: {program.get('name', 'Coach IA')}\n{len(day.get('exercises', []))} exercices",
                 "pinned": day_num == 1 and week_num == 1,  # Pin first workout
                 "reminder": True,
-                "program_id": program.get("program_id"),
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "program_id": program_id,
+                "created_at": created_at
             }
-            
-            await db.appointments.insert_one(appointment)
-            appointments_added += 1
+            if program_id:
+                # Only keyed sessions fall under the (user_id, program_id, program_slot) unique index
+                appointment["program_slot"] = f"w{week_num}d{day_num}"
+            appointments.append(appointment)
+    
+    # Re-adding a program only adds the sessions not already in the agenda
+    already_added = 0
+    if program_id:
+        existing = await db.appointments.find(
+            {"user_id": user["user_id"], "program_id": program_id},
+            {"_id": 0, "program_slot": 1}
+        ).to_list(None)
+        existing_slots = {a.get("program_slot") for a in existing}
+        already_added = len(existing)
+        if None in existing_slots:
+            # Added before sessions were keyed: treat the program as already scheduled
+            appointments = []
+        else:
+            appointments = [a for a in appointments if a["program_slot"] not in existing_slots]
+    
+    appointments_added = await insert_many_chunked(db.appointments, appointments)
     
     return {
         "message": f"{appointments_added} séances ajoutées à l'agenda",
-        "appointments_added": appointments_added
+        "appointments_added": appointments_added,
+        "already_in_agenda": already_added
     }
 
 # ==================== PROGRESS & STATS ENDPOINTS ====================
@@ -5502,6 +5537,7 @@ async def log_weight(entry: WeightEntry, user: dict = Depends(get_current_user))
         "logged_at": datetime.now(timezone.utc).isoformat()
     }
     await db.weight_history.insert_one(weight_doc)
+    await bump_report_data_version(db, user["user_id"])
     
     # Also log BMI history
     await db.bmi_history.insert_one({
@@ -6272,8 +6308,7 @@ async def get_user_stats(user: dict = Depends(get_current_user)):
     
     created_at = user_doc.get("created_at")
     if isinstance(created_at, str):
-        from dateutil import parser
-        created_at = parser.parse(created_at)
+        created_at = dateutil_parser.parse(created_at)
     elif not created_at:
         created_at = datetime.now(timezone.utc)
     
@@ -6468,6 +6503,7 @@ async def log_steps(data: dict, user: dict = Depends(get_current_user)):
         {"$set": step_doc},
         upsert=True
     )
+    await bump_report_data_version(db, user["user_id"])
     
     return {
         "message": "Steps logged",
@@ -6627,69 +6663,32 @@ async def get_smart_recommendation(user: dict = Depends(get_current_user)):
 
 # ==================== PDF REPORT GENERATION ====================
 
-@api_router.get("/reports/progress-pdf")
-async def generate_progress_pdf(user: dict = Depends(get_current_user)):
-    """Generate a comprehensive PDF report of user progress"""
-    from io import BytesIO
-    import base64
-    
-    profile = await db.user_profiles.find_one({"user_id": user["user_id"]}, {"_id": 0})
-    user_doc = await db.users.find_one({"user_id": user["user_id"]}, {"_id": 0})
+async def build_progress_report(user_id: str) -> dict:
+    """Aggregated progress report: statistics come from the user analytics primitive"""
+    profile, user_doc = await asyncio.gather(
+        db.user_profiles.find_one({"user_id": user_id}, {"_id": 0}),
+        db.users.find_one({"user_id": user_id}, {"_id": 0, "name": 1, "email": 1, "created_at": 1})
+    )
     
     if not profile:
         raise HTTPException(status_code=400, detail="Profile not found")
     
-    # Get all data
-    weight_entries = await db.weight_entries.find(
-        {"user_id": user["user_id"]},
-        {"_id": 0}
-    ).sort("date", 1).to_list(1000)
-    
-    food_logs = await db.food_logs.find(
-        {"user_id": user["user_id"]},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    step_logs = await db.step_logs.find(
-        {"user_id": user["user_id"]},
-        {"_id": 0}
-    ).to_list(365)
-    
-    # Calculate statistics
     created_at = user_doc.get("created_at", datetime.now(timezone.utc).isoformat())
     if isinstance(created_at, str):
-        from dateutil import parser
-        created_at = parser.parse(created_at)
+        created_at = dateutil_parser.parse(created_at)
     
     days_active = (datetime.now(timezone.utc) - created_at.replace(tzinfo=timezone.utc)).days + 1
     
-    # Weight stats
-    if weight_entries:
-        weights = [e["weight"] for e in weight_entries]
-        weight_start = weights[0]
-        weight_current = weights[-1]
-        weight_change = weight_current - weight_start
-        weight_min = min(weights)
-        weight_max = max(weights)
-    else:
-        weight_start = weight_current = profile.get("weight", 0)
-        weight_change = 0
-        weight_min = weight_max = profile.get("weight", 0)
-    
-    # Food stats
-    total_meals_logged = len(food_logs)
-    total_calories_logged = sum(log.get("calories", 0) for log in food_logs)
-    avg_daily_calories = round(total_calories_logged / max(days_active, 1))
-    
-    # Steps stats
-    total_steps = sum(log.get("steps", 0) for log in step_logs)
-    total_calories_burned = sum(log.get("calories_burned", 0) for log in step_logs)
-    avg_daily_steps = round(total_steps / max(len(step_logs), 1))
-    
-    # BMI calculation
-    height_m = profile.get("height", 170) / 100
-    bmi_start = round(weight_start / (height_m ** 2), 1) if weight_start else 0
-    bmi_current = round(weight_current / (height_m ** 2), 1) if weight_current else 0
+    # Weight / nutrition / activity statistics: one $facet aggregation
+    height_cm = profile.get("height", 170)
+    analytics = await get_user_analytics(
+        db, user_id, height_cm=height_cm, days_active=days_active, fallback_weight=profile.get("weight", 0)
+    )
+    weight_stats = analytics["weight"]
+    weight_start = weight_stats["start"]
+    weight_current = weight_stats["current"]
+    height_m = height_cm / 100
+    bmi_current = weight_stats["bmi_current"]
     
     # Prepare report data
     report_data = {
@@ -6713,43 +6712,69 @@ async def generate_progress_pdf(user: dict = Depends(get_current_user)):
             "start_weight": weight_start,
             "current_weight": weight_current,
             "target_weight": profile.get("target_weight"),
-            "weight_change": round(weight_change, 1),
-            "weight_min": weight_min,
-            "weight_max": weight_max,
-            "bmi_start": bmi_start,
+            "weight_change": weight_stats["change"],
+            "weight_min": weight_stats["min"],
+            "weight_max": weight_stats["max"],
+            "bmi_start": weight_stats["bmi_start"],
             "bmi_current": bmi_current,
-            "entries_count": len(weight_entries),
-            "entries": weight_entries[-30:]  # Last 30 entries
+            "entries_count": weight_stats["entries_count"],
+            "entries": analytics["series"]["weight"]  # Downsampled weight curve
         },
         "nutrition_stats": {
-            "total_meals_logged": total_meals_logged,
-            "total_calories_logged": total_calories_logged,
-            "avg_daily_calories": avg_daily_calories,
+            "total_meals_logged": analytics["nutrition"]["meals_logged"],
+            "total_calories_logged": analytics["nutrition"]["total_calories"],
+            "avg_daily_calories": analytics["nutrition"]["avg_daily_calories"],
             "target_calories": profile.get("daily_calorie_target", 2000)
         },
         "activity_stats": {
-            "total_steps": total_steps,
-            "total_calories_burned": total_calories_burned,
-            "avg_daily_steps": avg_daily_steps,
-            "days_tracked": len(step_logs)
+            "total_steps": analytics["activity"]["total_steps"],
+            "total_calories_burned": analytics["activity"]["total_calories_burned"],
+            "avg_daily_steps": analytics["activity"]["avg_daily_steps"],
+            "days_tracked": analytics["activity"]["days_tracked"],
+            "steps_series": analytics["series"]["steps"]
         }
     }
     
     # ========== DOSSIER BARIATRIQUE COMPLET ==========
     if profile.get("bariatric_surgery"):
-        # Récupérer tous les logs bariatriques
-        bariatric_logs = await db.bariatric_daily_logs.find(
-            {"user_id": user["user_id"]},
-            {"_id": 0}
-        ).sort("date", 1).to_list(1000)
+        # Statistiques agrégées + 14 derniers logs bariatriques
+        def level_avg(field):
+            return {"$avg": {"$ifNull": [f"${field}", 0]}}
+        
+        def share_of(field):
+            return {"$avg": {"$cond": [{"$ifNull": [f"${field}", False]}, 1, 0]}}
+        
+        bariatric_agg, recent_bariatric_logs = await asyncio.gather(
+            db.bariatric_daily_logs.aggregate([
+                {"$match": {"user_id": user_id}},
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "nausea_avg": level_avg("nausea_level"),
+                    "reflux_avg": level_avg("reflux_level"),
+                    "fatigue_avg": level_avg("fatigue_level"),
+                    "pain_avg": level_avg("pain_level"),
+                    "dumping_episodes": {"$sum": {"$cond": [{"$ifNull": ["$dumping_episode", False]}, 1, 0]}},
+                    "vomiting_count": {"$sum": {"$cond": [{"$ifNull": ["$vomiting", False]}, 1, 0]}},
+                    "vitamins": share_of("vitamins_taken"),
+                    "calcium": share_of("calcium_taken"),
+                    "iron": share_of("iron_taken"),
+                    "b12": share_of("b12_taken"),
+                    "protein": level_avg("protein_intake_g"),
+                    "water": level_avg("water_intake_ml")
+                }}
+            ]).to_list(1),
+            db.bariatric_daily_logs.find({"user_id": user_id}, {"_id": 0}).sort("date", -1).limit(14).to_list(14)
+        )
+        bariatric_stats = bariatric_agg[0] if bariatric_agg else None
+        bariatric_days_tracked = bariatric_stats["count"] if bariatric_stats else 0
         
         # Calculer les statistiques bariatriques
         surgery_date = profile.get("bariatric_surgery_date")
         days_since_surgery = 0
         if surgery_date:
             if isinstance(surgery_date, str):
-                from dateutil import parser
-                surgery_date_dt = parser.parse(surgery_date)
+                surgery_date_dt = dateutil_parser.parse(surgery_date)
             else:
                 surgery_date_dt = surgery_date
             days_since_surgery = (datetime.now(timezone.utc) - surgery_date_dt.replace(tzinfo=timezone.utc)).days
@@ -6763,22 +6788,17 @@ async def generate_progress_pdf(user: dict = Depends(get_current_user)):
         protein_intake_avg = 0
         water_intake_avg = 0
         
-        if bariatric_logs:
-            symptom_stats["nausea_avg"] = round(sum(l.get("nausea_level", 0) for l in bariatric_logs) / len(bariatric_logs), 1)
-            symptom_stats["reflux_avg"] = round(sum(l.get("reflux_level", 0) for l in bariatric_logs) / len(bariatric_logs), 1)
-            symptom_stats["fatigue_avg"] = round(sum(l.get("fatigue_level", 0) for l in bariatric_logs) / len(bariatric_logs), 1)
-            symptom_stats["pain_avg"] = round(sum(l.get("pain_level", 0) for l in bariatric_logs) / len(bariatric_logs), 1)
-            symptom_stats["dumping_episodes"] = sum(1 for l in bariatric_logs if l.get("dumping_episode"))
-            symptom_stats["vomiting_count"] = sum(1 for l in bariatric_logs if l.get("vomiting"))
+        if bariatric_stats:
+            for key in ("nausea_avg", "reflux_avg", "fatigue_avg", "pain_avg"):
+                symptom_stats[key] = round(bariatric_stats[key], 1)
+            symptom_stats["dumping_episodes"] = bariatric_stats["dumping_episodes"]
+            symptom_stats["vomiting_count"] = bariatric_stats["vomiting_count"]
             
-            supplement_adherence["vitamins"] = round(sum(1 for l in bariatric_logs if l.get("vitamins_taken")) / len(bariatric_logs) * 100)
-            supplement_adherence["calcium"] = round(sum(1 for l in bariatric_logs if l.get("calcium_taken")) / len(bariatric_logs) * 100)
-            supplement_adherence["iron"] = round(sum(1 for l in bariatric_logs if l.get("iron_taken")) / len(bariatric_logs) * 100)
-            supplement_adherence["b12"] = round(sum(1 for l in bariatric_logs if l.get("b12_taken")) / len(bariatric_logs) * 100)
+            for key in supplement_adherence:
+                supplement_adherence[key] = round(bariatric_stats[key] * 100)
             
-            protein_intake_avg = round(sum(l.get("protein_intake_g", 0) for l in bariatric_logs) / len(bariatric_logs))
-            water_intake_avg = round(sum(l.get("water_intake_ml", 0) for l in bariatric_logs) / len(bariatric_logs))
-        
+            protein_intake_avg = round(bariatric_stats["protein"])
+            water_intake_avg = round(bariatric_stats["water"])
         # Perte de poids depuis l'opération
         weight_at_surgery = profile.get("weight_at_surgery") or weight_start
         excess_weight_loss = 0
@@ -6801,8 +6821,8 @@ async def generate_progress_pdf(user: dict = Depends(get_current_user)):
             "bmi_at_surgery": round(weight_at_surgery / (height_m ** 2), 1) if weight_at_surgery else 0,
             "bmi_current": bmi_current,
             "tracking_stats": {
-                "days_tracked": len(bariatric_logs),
-                "compliance_rate": round(len(bariatric_logs) / max(days_since_surgery, 1) * 100, 1) if days_since_surgery > 0 else 0
+                "days_tracked": bariatric_days_tracked,
+                "compliance_rate": round(bariatric_days_tracked / max(days_since_surgery, 1) * 100, 1) if days_since_surgery > 0 else 0
             },
             "symptom_stats": symptom_stats,
             "supplement_adherence": supplement_adherence,
@@ -6811,13 +6831,68 @@ async def generate_progress_pdf(user: dict = Depends(get_current_user)):
                 "avg_water_intake_ml": water_intake_avg,
                 "protein_target_g": 60 if profile.get("bariatric_surgery") == "sleeve" else 80
             },
-            "recent_logs": bariatric_logs[-14:],  # Last 14 days
+            "recent_logs": recent_bariatric_logs[::-1],  # Last 14 days
             "supplements": profile.get("bariatric_supplements", []),
             "intolerances": profile.get("bariatric_intolerances", [])
         }
     
     return report_data
 
+@api_router.get("/analytics/summary")
+async def get_analytics_summary(series_points: int = 30, user: dict = Depends(get_current_user)):
+    """Weight, nutrition and activity statistics with downsampled chart series"""
+    profile = await db.user_profiles.find_one({"user_id": user["user_id"]}, {"_id": 0, "height": 1, "weight": 1})
+    return await get_user_analytics(
+        db, user["user_id"],
+        height_cm=(profile or {}).get("height"),
+        fallback_weight=(profile or {}).get("weight"),
+        series_points=max(2, min(series_points, 365))
+    )
+
+@api_router.get("/reports/progress-pdf")
+async def generate_progress_pdf(user: dict = Depends(get_current_user)):
+    """Progress report data (rendered client-side); see /reports/progress-pdf/render for the server PDF"""
+    return await build_progress_report(user["user_id"])
+
+@api_router.post("/reports/progress-pdf/render")
+async def render_progress_report(user: dict = Depends(get_current_user)):
+    """Render the progress report PDF in the background (no-op if the cached PDF is current)"""
+    job = await create_report_job(db, user["user_id"], lambda: build_progress_report(user["user_id"]))
+    return {
+        **job,
+        "status_url": f"/api/reports/progress-pdf/jobs/{job['job_id']}" if job.get("job_id") else None,
+        "download_url": f"/api/reports/progress-pdf/download?version={job['version']}"
+    }
+
+@api_router.get("/reports/progress-pdf/jobs/{job_id}")
+async def get_report_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Status of a report rendering job"""
+    job = await db.report_jobs.find_one(
+        {"job_id": job_id, "user_id": user["user_id"]}, {"_id": 0, "owner": 0, "lease_until": 0}
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+@api_router.get("/reports/progress-pdf/download")
+async def download_progress_pdf(version: Optional[str] = None, user: dict = Depends(get_current_user)):
+    """Send the cached PDF (latest rendered one, or a specific data version)
+
+    The file is read whole from report_cache (a few tens of KB) and sent as one body.
+    """
+    cached = await get_cached_report(db, user["user_id"], version)
+    if not cached:
+        raise HTTPException(status_code=404, detail="Report not rendered yet")
+    filename = f"fatandslim-rapport-{cached['created_at'][:10]}.pdf"
+    return Response(
+        content=cached["pdf"],
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "ETag": f'"{cached["version"]}"'
+        }
+    )
+
 # ==================== GOOGLE CALENDAR INTEGRATION ====================
 
 # Google Calendar OAuth Configuration
@@ -6832,7 +6907,7 @@ async def get_calendar_auth_url(user: dict = Depends(get_current_user)):
     if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
         raise HTTPException(status_code=503, detail="Google Calendar not configured")
     
-    from google_auth_oauthlib.flow import Flow
+    Flow = google_oauth_flow.Flow
     
     flow = Flow.from_client_config(
         {
@@ -6866,7 +6941,7 @@ async def get_calendar_auth_url(user: dict = Depends(get_current_user)):
 @api_router.get("/calendar/callback")
 async def calendar_oauth_callback(code: str, state: str):
     """Handle Google Calendar OAuth callback"""
-    from google.oauth2.credentials import Credentials
+    Credentials = google_credentials.Credentials
     
     # Verify state
     state_doc = await db.oauth_states.find_one({"state": state})
@@ -6933,8 +7008,8 @@ async def disconnect_calendar(user: dict = Depends(get_current_user)):
 
 async def get_valid_calendar_credentials(user_id: str):
     """Get valid Google Calendar credentials, refreshing if needed"""
-    from google.oauth2.credentials import Credentials
-    from google.auth.transport.requests import Request as GoogleRequest
+    Credentials = google_credentials.Credentials
+    GoogleRequest = google_auth_requests.Request
     
     tokens = await db.google_calendar_tokens.find_one({"user_id": user_id}, {"_id": 0})
     
@@ -6949,10 +7024,10 @@ async def get_valid_calendar_credentials(user_id: str):
         client_secret=GOOGLE_CLIENT_SECRET
     )
     
-    # Check if expired and refresh
+    # Check if expired and refresh (blocking HTTP: calendar thread pool)
     if creds.expired and creds.refresh_token:
         try:
-            creds.refresh(GoogleRequest())
+            await run_blocking(creds.refresh, GoogleRequest())
             # Update stored tokens
             await db.google_calendar_tokens.update_one(
                 {"user_id": user_id},
@@ -6978,15 +7053,13 @@ async def get_calendar_events(
     max_results: int = 50
 ):
     """Get Google Calendar events"""
-    from googleapiclient.discovery import build
-    
     creds = await get_valid_calendar_credentials(user["user_id"])
     
     if not creds:
         raise HTTPException(status_code=401, detail="Google Calendar not connected")
     
     try:
-        service = build('calendar', 'v3', credentials=creds)
+        service = await get_calendar_service(creds)
         
         # Default to next 30 days
         if not time_min:
@@ -6994,14 +7067,14 @@ async def get_calendar_events(
         if not time_max:
             time_max = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
         
-        events_result = service.events().list(
-            calendarId='primary',
+        events_result = await run_blocking(
+            service.list_events,
             timeMin=time_min,
             timeMax=time_max,
             maxResults=max_results,
             singleEvents=True,
             orderBy='startTime'
-        ).execute()
+        )
         
         events = events_result.get('items', [])
         
@@ -7031,64 +7104,19 @@ async def get_calendar_events(
 
 @api_router.get("/calendar/sync")
 async def sync_calendar_to_agenda(user: dict = Depends(get_current_user)):
-    """Sync Google Calendar events to app agenda"""
-    from googleapiclient.discovery import build
-    
+    """Sync Google Calendar events to app agenda (incremental after the first sync)"""
     creds = await get_valid_calendar_credentials(user["user_id"])
     
     if not creds:
         raise HTTPException(status_code=401, detail="Google Calendar not connected")
     
     try:
-        service = build('calendar', 'v3', credentials=creds)
-        
-        # Get events for next 30 days
-        time_min = datetime.now(timezone.utc).isoformat()
-        time_max = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
-        
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            maxResults=100,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        synced_count = 0
-        
-        for event in events:
-            start = event.get('start', {})
-            start_time = start.get('dateTime') or start.get('date')
-            
-            # Check if already synced
-            existing = await db.appointments.find_one({
-                "user_id": user["user_id"],
-                "google_event_id": event.get('id')
-            })
-            
-            if not existing:
-                # Create appointment from Google event
-                appointment = {
-                    "appointment_id": f"gcal_{event.get('id')}",
-                    "user_id": user["user_id"],
-                    "google_event_id": event.get('id'),
-                    "title": event.get('summary', 'Sans titre'),
-                    "description": event.get('description', ''),
-                    "datetime": start_time,
-                    "type": "event",
-                    "source": "google_calendar",
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                
-                await db.appointments.insert_one(appointment)
-                synced_count += 1
+        service = await get_calendar_service(creds)
+        result = await sync_calendar_events(db, user["user_id"], service)
         
         return {
             "message": f"Synchronisation terminée",
-            "synced": synced_count,
-            "total_events": len(events)
+            **result
         }
         
     except Exception as e:
@@ -7101,40 +7129,28 @@ async def sync_calendar_to_agenda(user: dict = Depends(get_current_user)):
 @api_router.get("/social/profile/{user_id}")
 async def get_public_profile(user_id: str, current_user: dict = Depends(get_current_user)):
     """Get a user's public profile with badges, points and objective"""
-    user_doc = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0})
+    # Independent reads run concurrently; counts come from the profile_stats counters
+    user_doc, profile, user_badges, user_points, stats, friendship = await asyncio.gather(
+        db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0, "search_tokens": 0}),
+        db.user_profiles.find_one({"user_id": user_id}, {"_id": 0}),
+        db.user_badges.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+        db.user_points.find_one({"user_id": user_id}, {"_id": 0}),
+        get_profile_stats(db, user_id),
+        # Check friendship status
+        db.friendships.find_one({
+            "$or": [
+                {"user_id": current_user["user_id"], "friend_id": user_id},
+                {"user_id": user_id, "friend_id": current_user["user_id"]}
+            ]
+        }, {"_id": 0})
+    )
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    profile = await db.user_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    
-    # Get badges
-    user_badges = await db.user_badges.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    
-    # Get points (total + challenge)
-    user_points = await db.user_points.find_one({"user_id": user_id}, {"_id": 0})
+    # Points (total + challenge)
     total_points = user_points.get("total_points", 0) if user_points else 0
     challenge_points = user_points.get("challenge_points", 0) if user_points else 0
     
-    # Get favorite recipes count
-    favorite_count = await db.favorite_recipes.count_documents({"user_id": user_id})
-    
-    # Get posts count
-    posts_count = await db.social_posts.count_documents({"user_id": user_id})
-    
-    # Get friends count
-    friends_count = await db.friendships.count_documents({
-        "$or": [{"user_id": user_id}, {"friend_id": user_id}],
-        "status": "accepted"
-    })
-    
-    # Check friendship status
-    friendship = await db.friendships.find_one({
-        "$or": [
-            {"user_id": current_user["user_id"], "friend_id": user_id},
-            {"user_id": user_id, "friend_id": current_user["user_id"]}
-        ]
-    }, {"_id": 0})
-    
     is_friend = friendship and friendship.get("status") == "accepted"
     is_pending = friendship and friendship.get("status") == "pending"
     is_self = current_user["user_id"] == user_id
@@ -7153,9 +7169,9 @@ async def get_public_profile(user_id: str, current_user: dict = Depends(get_curr
         "badges_count": len(user_badges) or user_doc.get("badges_count", 0),
         "total_points": total_points,
         "challenge_points": challenge_points,
-        "favorite_recipes_count": favorite_count,
-        "posts_count": posts_count,
-        "friends_count": friends_count,
+        "favorite_recipes_count": stats["favorite_recipes_count"],
+        "posts_count": stats["posts_count"],
+        "friends_count": stats["friends_count"],
         "is_friend": is_friend,
         "is_pending": is_pending,
         "is_self": is_self,
@@ -7163,38 +7179,53 @@ async def get_public_profile(user_id: str, current_user: dict = Depends(get_curr
         "created_at": user_doc.get("created_at")
     }
 
+async def get_friendship_statuses(user_id: str, other_ids: list) -> dict:
+    """{other_id: friendship status} for many users in one query"""
+    if not other_ids:
+        return {}
+    friendships = await db.friendships.find(
+        {"$or": [
+            {"user_id": user_id, "friend_id": {"$in": other_ids}},
+            {"user_id": {"$in": other_ids}, "friend_id": user_id}
+        ]},
+        {"_id": 0, "user_id": 1, "friend_id": 1, "status": 1}
+    ).to_list(None)
+    return {
+        (f["friend_id"] if f["user_id"] == user_id else f["user_id"]): f.get("status")
+        for f in friendships
+    }
+
+async def get_users_by_ids(user_ids: list, fields: tuple = ("name", "picture")) -> dict:
+    """{user_id: user} for many users in one query, projected to `fields`"""
+    if not user_ids:
+        return {}
+    projection = {"_id": 0, "user_id": 1, **{f: 1 for f in fields}}
+    users = await db.users.find({"user_id": {"$in": list(set(user_ids))}}, projection).to_list(None)
+    return {u["user_id"]: u for u in users}
+
 @api_router.get("/social/search")
 async def search_users(q: str, user: dict = Depends(get_current_user)):
-    """Search for users by name or email"""
-    if len(q) < 2:
+    """Search for users by name or email (word-prefix match on the search_tokens index)"""
+    tokens = query_tokens(q)
+    if len(q) < 2 or not tokens:
         return {"users": []}
     
-    users = await db.users.find({
-        "$and": [
-            {"user_id": {"$ne": user["user_id"]}},
-            {"$or": [
-                {"name": {"$regex": q, "$options": "i"}},
-                {"email": {"$regex": q, "$options": "i"}}
-            ]}
-        ]
-    }, {"_id": 0, "password_hash": 0}).limit(20).to_list(20)
+    users = await db.users.find(
+        {"search_tokens": {"$all": tokens}, "user_id": {"$ne": user["user_id"]}},
+        {"_id": 0, "user_id": 1, "name": 1, "email": 1, "picture": 1}
+    ).limit(20).to_list(20)
+    
+    # Add friendship status (one batched lookup)
+    statuses = await get_friendship_statuses(user["user_id"], [u["user_id"] for u in users])
     
-    # Add friendship status
     result = []
     for u in users:
-        friendship = await db.friendships.find_one({
-            "$or": [
-                {"user_id": user["user_id"], "friend_id": u["user_id"]},
-                {"user_id": u["user_id"], "friend_id": user["user_id"]}
-            ]
-        }, {"_id": 0})
-        
         result.append({
             "user_id": u["user_id"],
             "name": u.get("name", "Utilisateur"),
             "email": u.get("email", ""),
             "picture": u.get("picture"),
-            "friendship_status": friendship.get("status") if friendship else None
+            "friendship_status": statuses.get(u["user_id"])
         })
     
     return {"users": result}
@@ -7223,16 +7254,21 @@ async def send_friend_request(data: dict, user: dict = Depends(get_current_user)
     
     friendship = {
         "friendship_id": f"friend_{uuid.uuid4().hex[:8]}",
+        "pair_key": friendship_pair_key(user["user_id"], friend_id),
         "user_id": user["user_id"],
         "friend_id": friend_id,
         "status": "pending",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.friendships.insert_one(friendship)
+    try:
+        await db.friendships.insert_one(friendship)
+    except DuplicateKeyError:
+        # Both users sent a request at the same time
+        raise HTTPException(status_code=400, detail="Friendship already exists or pending")
     
     # Create notification
-    await create_notification(friend_id, "friend_request", f"{user.get('name') or 'Quelquun'} veut être votre ami !", user["user_id"])
+    await create_notification(friend_id, "friend_request", f"{user.get('name') or 'Quelquun'} veut être votre ami !", user["user_id"], from_user=user)
     
     return {"message": "Friend request sent", "friendship_id": friendship["friendship_id"]}
 
@@ -7252,7 +7288,13 @@ async def accept_friend_request(data: dict, user: dict = Depends(get_current_use
     # Get the friendship to notify the other user
     friendship = await db.friendships.find_one({"friendship_id": friendship_id}, {"_id": 0})
     if friendship:
-        await create_notification(friendship["user_id"], "friend_accepted", f"{user.get('name') or 'Quelquun'} a accepté votre demande d'ami !", user["user_id"])
+        # Each friend's recent activities join the other's timeline
+        await asyncio.gather(
+            add_author_to_timeline(db, friendship["user_id"], friendship["friend_id"]),
+            add_author_to_timeline(db, friendship["friend_id"], friendship["user_id"]),
+            bump_profile_stats_many(db, "friends_count", [friendship["user_id"], friendship["friend_id"]])
+        )
+        await create_notification(friendship["user_id"], "friend_accepted", f"{user.get('name') or 'Quelquun'} a accepté votre demande d'ami !", user["user_id"], from_user=user)
     
     return {"message": "Friend request accepted"}
 
@@ -7288,6 +7330,13 @@ async def remove_friend(friend_id: str, user: dict = Depends(get_current_user)):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Friendship not found")
     
+    await asyncio.gather(
+        remove_author_from_timeline(db, user["user_id"], friend_id),
+        remove_author_from_timeline(db, friend_id, user["user_id"]),
+        bump_profile_stats(db, user["user_id"], friends_count=-1),
+        bump_profile_stats(db, friend_id, friends_count=-1)
+    )
+    
     return {"message": "Friend removed"}
 
 @api_router.get("/social/friends")
@@ -7298,18 +7347,25 @@ async def get_friends(user: dict = Depends(get_current_user)):
         "status": "accepted"
     }, {"_id": 0}).to_list(100)
     
+    friend_ids = [f["friend_id"] if f["user_id"] == user["user_id"] else f["user_id"] for f in friendships]
+    friend_users, friend_points = await asyncio.gather(
+        get_users_by_ids(friend_ids),
+        db.user_points.find(
+            {"user_id": {"$in": friend_ids}},
+            {"_id": 0, "user_id": 1, "total_points": 1}
+        ).to_list(None)
+    )
+    points_by_user = {p["user_id"]: p.get("total_points", 0) for p in friend_points}
+    
     friends = []
-    for f in friendships:
-        friend_user_id = f["friend_id"] if f["user_id"] == user["user_id"] else f["user_id"]
-        friend_user = await db.users.find_one({"user_id": friend_user_id}, {"_id": 0, "password_hash": 0})
-        
+    for f, friend_user_id in zip(friendships, friend_ids):
+        friend_user = friend_users.get(friend_user_id)
         if friend_user:
-            user_points = await db.user_points.find_one({"user_id": friend_user_id}, {"_id": 0})
             friends.append({
                 "user_id": friend_user_id,
                 "name": friend_user.get("name", "Utilisateur"),
                 "picture": friend_user.get("picture"),
-                "total_points": user_points.get("total_points", 0) if user_points else 0,
+                "total_points": points_by_user.get(friend_user_id, 0),
                 "friendship_id": f["friendship_id"],
                 "since": f.get("accepted_at", f.get("created_at"))
             })
@@ -7319,15 +7375,25 @@ async def get_friends(user: dict = Depends(get_current_user)):
 @api_router.get("/social/friends/requests")
 async def get_friend_requests(user: dict = Depends(get_current_user)):
     """Get pending friend requests"""
-    # Requests received
-    received = await db.friendships.find({
-        "friend_id": user["user_id"],
-        "status": "pending"
-    }, {"_id": 0}).to_list(50)
+    received, sent = await asyncio.gather(
+        # Requests received
+        db.friendships.find({
+            "friend_id": user["user_id"],
+            "status": "pending"
+        }, {"_id": 0}).to_list(50),
+        # Requests sent
+        db.friendships.find({
+            "user_id": user["user_id"],
+            "status": "pending"
+        }, {"_id": 0}).to_list(50)
+    )
+    
+    # One user lookup for both directions
+    users = await get_users_by_ids([r["user_id"] for r in received] + [s["friend_id"] for s in sent])
     
     received_list = []
     for r in received:
-        sender = await db.users.find_one({"user_id": r["user_id"]}, {"_id": 0, "password_hash": 0})
+        sender = users.get(r["user_id"])
         if sender:
             received_list.append({
                 "friendship_id": r["friendship_id"],
@@ -7337,15 +7403,9 @@ async def get_friend_requests(user: dict = Depends(get_current_user)):
                 "sent_at": r["created_at"]
             })
     
-    # Requests sent
-    sent = await db.friendships.find({
-        "user_id": user["user_id"],
-        "status": "pending"
-    }, {"_id": 0}).to_list(50)
-    
     sent_list = []
     for s in sent:
-        recipient = await db.users.find_one({"user_id": s["friend_id"]}, {"_id": 0, "password_hash": 0})
+        recipient = users.get(s["friend_id"])
         if recipient:
             sent_list.append({
                 "friendship_id": s["friendship_id"],
@@ -7359,9 +7419,14 @@ async def get_friend_requests(user: dict = Depends(get_current_user)):
 
 # --- Activity Feed ---
 @api_router.get("/social/feed")
-async def get_activity_feed(user: dict = Depends(get_current_user), limit: int = 30, feed_type: str = "friends"):
-    """Get activity feed - friends only or public"""
-    
+async def get_activity_feed(
+    user: dict = Depends(get_current_user),
+    limit: int = 30,
+    feed_type: str = "friends",
+    before: Optional[str] = None
+):
+    """Get activity feed - friends only (home timeline, paginated with `before`) or public"""
+    next_cursor = None
     if feed_type == "public":
         # Get ALL public activities
         activities = await db.social_activities.find(
@@ -7369,63 +7434,104 @@ async def get_activity_feed(user: dict = Depends(get_current_user), limit: int =
             {"_id": 0}
         ).sort("created_at", -1).limit(limit).to_list(limit)
     else:
-        # Get friend activities only
-        friendships = await db.friendships.find({
-            "$or": [{"user_id": user["user_id"]}, {"friend_id": user["user_id"]}],
-            "status": "accepted"
-        }, {"_id": 0}).to_list(100)
-        
-        friend_ids = [user["user_id"]]
-        for f in friendships:
-            friend_ids.append(f["friend_id"] if f["user_id"] == user["user_id"] else f["user_id"])
-        
-        activities = await db.social_activities.find(
-            {"user_id": {"$in": friend_ids}},
-            {"_id": 0}
-        ).sort("created_at", -1).limit(limit).to_list(limit)
+        # Friend activities: precomputed home timeline (+ high-fanout authors merged on read)
+        await build_timeline(db, user["user_id"])  # First read only
+        page = await read_timeline(db, user["user_id"], limit, before)
+        activities = page["activities"]
+        next_cursor = page["next_cursor"]
+    
+    result = await enrich_activities(activities, user["user_id"])
+    return {"activities": result, "next_cursor": next_cursor}
+
+ACTIVITY_COMMENTS_SHOWN = 10
+
+async def enrich_activities(activities: list, user_id: str) -> list:
+    """Attach author, likes, the caller's like and the first comments to a page of activities (5 queries, whatever the page size)"""
+    if not activities:
+        return []
+    activity_ids = [a["activity_id"] for a in activities]
+    likes, liked, comment_groups, profiles = await asyncio.gather(
+        db.activity_likes.aggregate([
+            {"$match": {"activity_id": {"$in": activity_ids}}},
+            {"$group": {"_id": "$activity_id", "count": {"$sum": 1}}}
+        ]).to_list(None),
+        db.activity_likes.find(
+            {"user_id": user_id, "activity_id": {"$in": activity_ids}},
+            {"_id": 0, "activity_id": 1}
+        ).to_list(None),
+        db.activity_comments.aggregate([
+            {"$match": {"activity_id": {"$in": activity_ids}}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": "$activity_id",
+                "count": {"$sum": 1},
+                "comments": {"$push": {
+                    "comment_id": "$comment_id",
+                    "activity_id": "$activity_id",
+                    "user_id": "$user_id",
+                    "content": "$content",
+                    "created_at": "$created_at"
+                }}
+            }},
+            {"$project": {"count": 1, "comments": {"$slice": ["$comments", ACTIVITY_COMMENTS_SHOWN]}}}
+        ]).to_list(None),
+        db.user_profiles.find(
+            {"user_id": {"$in": list({a["user_id"] for a in activities})}},
+            {"_id": 0, "user_id": 1, "picture": 1}
+        ).to_list(None)
+    )
+    likes_by_activity = {l["_id"]: l["count"] for l in likes}
+    liked_ids = {l["activity_id"] for l in liked}
+    comments_by_activity = {g["_id"]: g for g in comment_groups}
+    pictures = {p["user_id"]: p.get("picture") for p in profiles}
+    users = await get_users_by_ids(
+        [a["user_id"] for a in activities]
+        + [c["user_id"] for g in comment_groups for c in g["comments"]]
+    )
     
-    # Enrich with user info and comments
     result = []
     for activity in activities:
-        activity_user = await db.users.find_one({"user_id": activity["user_id"]}, {"_id": 0, "password_hash": 0})
-        profile = await db.user_profiles.find_one({"user_id": activity["user_id"]}, {"_id": 0})
-        likes_count = await db.activity_likes.count_documents({"activity_id": activity["activity_id"]})
-        user_liked = await db.activity_likes.find_one({
-            "activity_id": activity["activity_id"],
-            "user_id": user["user_id"]
-        })
-        
-        # Get comments
-        comments = await db.activity_comments.find(
-            {"activity_id": activity["activity_id"]},
-            {"_id": 0}
-        ).sort("created_at", 1).limit(10).to_list(10)
-        
-        # Enrich comments with user info
-        enriched_comments = []
-        for comment in comments:
-            comment_user = await db.users.find_one({"user_id": comment["user_id"]}, {"_id": 0, "password_hash": 0})
-            enriched_comments.append({
+        activity_user = users.get(activity["user_id"])
+        group = comments_by_activity.get(activity["activity_id"], {})
+        comments = []
+        for comment in group.get("comments", []):
+            comment_user = users.get(comment["user_id"])
+            comments.append({
                 **comment,
                 "user_name": comment_user.get("name") if comment_user else "Utilisateur",
                 "user_picture": comment_user.get("picture") if comment_user else None
             })
-        
-        user_picture = profile.get("picture") if profile else None
-        if not user_picture:
-            user_picture = activity_user.get("picture") if activity_user else None
-        
         result.append({
             **activity,
             "user_name": activity_user.get("name", "Utilisateur") if activity_user else "Utilisateur",
-            "user_picture": user_picture,
-            "likes_count": likes_count,
-            "user_liked": bool(user_liked),
-            "comments": enriched_comments,
-            "comments_count": len(enriched_comments)
+            "user_picture": pictures.get(activity["user_id"]) or (activity_user.get("picture") if activity_user else None),
+            "likes_count": likes_by_activity.get(activity["activity_id"], 0),
+            "user_liked": activity["activity_id"] in liked_ids,
+            "comments": comments,
+            "comments_count": group.get("count", 0)
         })
+    return result
+
+@api_router.post("/social/activity")
+async def share_activity(data: dict, user: dict = Depends(get_current_user)):
+    """Share an activity (workout, meal, milestone...) to the author's and friends' home timelines"""
+    content = data.get("content", "").strip()
+    if not content and not data.get("data"):
+        raise HTTPException(status_code=400, detail="Content or data required")
     
-    return {"activities": result}
+    activity = {
+        "activity_id": f"act_{uuid.uuid4().hex[:12]}",
+        "user_id": user["user_id"],
+        "type": data.get("type", "update"),
+        "content": content,
+        "data": data.get("data"),
+        "visibility": data.get("visibility", "friends"),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    # Fan-out on write: every social_activities writer goes through publish_activity
+    result = await publish_activity(db, activity)
+    activity.pop("_id", None)
+    return {"message": "Activity shared", "activity": activity, "fanned_out": result["fanned_out"]}
 
 # Old post endpoint - redirecting to new system
 # (Keeping comment endpoint for backward compatibility)
@@ -7452,7 +7558,7 @@ async def add_comment(data: dict, user: dict = Depends(get_current_user)):
     # Notify post owner
     activity = await db.social_activities.find_one({"activity_id": activity_id}, {"_id": 0})
     if activity and activity["user_id"] != user["user_id"]:
-        await create_notification(activity["user_id"], "comment", f"{user.get('name') or 'Quelquun'} a commenté votre publication", user["user_id"])
+        await create_notification(activity["user_id"], "comment", f"{user.get('name') or 'Quelquun'} a commenté votre publication", user["user_id"], from_user=user)
     
     return {"message": "Comment added", "comment": comment}
 
@@ -7477,59 +7583,257 @@ async def like_activity(activity_id: str, user: dict = Depends(get_current_user)
         # Create notification for post owner
         activity = await db.social_activities.find_one({"activity_id": activity_id}, {"_id": 0})
         if activity and activity["user_id"] != user["user_id"]:
-            await create_notification(activity["user_id"], "like", f"{user.get('name') or 'Quelquun'} a aimé votre publication", user["user_id"])
+            await create_notification(activity["user_id"], "like", f"{user.get('name') or 'Quelquun'} a aimé votre publication", user["user_id"], from_user=user)
         
         return {"message": "Liked", "liked": True}
 
 # --- Messaging ---
+# --- Conversation summaries ---
+# One document per (user_id, partner_id) with the last message, unread count and
+# a partner snapshot. Maintained on send/read so the inbox is a single indexed query.
+
+async def update_conversation_summaries(message: dict, sender: dict, recipient: dict):
+    """Upsert both sides' conversation summary for a newly sent message"""
+    last_message = {k: v for k, v in message.items() if k != "_id"}
+    now = message["created_at"]
+    await db.conversation_summaries.bulk_write([
+        UpdateOne(
+            {"user_id": sender["user_id"], "partner_id": recipient["user_id"]},
+            {
+                "$set": {
+                    "last_message": last_message,
+                    "last_message_at": now,
+                    "partner_name": recipient.get("name", "Utilisateur"),
+                    "partner_picture": recipient.get("picture")
+                },
+                "$setOnInsert": {"unread_count": 0}
+            },
+            upsert=True
+        ),
+        UpdateOne(
+            {"user_id": recipient["user_id"], "partner_id": sender["user_id"]},
+            {
+                "$set": {
+                    "last_message": last_message,
+                    "last_message_at": now,
+                    "partner_name": sender.get("name", "Utilisateur"),
+                    "partner_picture": sender.get("picture")
+                },
+                "$inc": {"unread_count": 1}
+            },
+            upsert=True
+        )
+    ], ordered=False)
+
+async def rebuild_conversation_summaries(user_id: str) -> int:
+    """Backfill a user's summaries from the messages collection (pre-existing history)
+
+    Unread state comes from the read_up_to watermark only: the legacy per-message
+    `read` flags are folded into it once here, and unread_count is the number of
+    received messages past it.
+    """
+    pipeline = [
+        {"$match": {"$or": [{"sender_id": user_id}, {"recipient_id": user_id}]}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": {"$cond": [{"$eq": ["$sender_id", user_id]}, "$recipient_id", "$sender_id"]},
+            "last_message": {"$first": "$$ROOT"},
+            "legacy_read_up_to": {"$max": {"$cond": [
+                {"$and": [{"$eq": ["$recipient_id", user_id]}, {"$eq": ["$read", True]}]},
+                {"$concat": ["$created_at", "|", "$message_id"]},
+                ""
+            ]}}
+        }}
+    ]
+    groups = await db.messages.aggregate(pipeline).to_list(None)
+    if not groups:
+        return 0
+    
+    partner_ids = [g["_id"] for g in groups]
+    partners, existing = await asyncio.gather(
+        db.users.find(
+            {"user_id": {"$in": partner_ids}},
+            {"_id": 0, "user_id": 1, "name": 1, "picture": 1}
+        ).to_list(None),
+        db.conversation_summaries.find(
+            {"user_id": user_id, "partner_id": {"$in": partner_ids}},
+            {"_id": 0, "partner_id": 1, "read_up_to": 1}
+        ).to_list(None)
+    )
+    partners_by_id = {p["user_id"]: p for p in partners}
+    read_up_to = {s["partner_id"]: s.get("read_up_to") or "" for s in existing}
+    for g in groups:
+        read_up_to[g["_id"]] = max(read_up_to.get(g["_id"], ""), g["legacy_read_up_to"] or "")
+    
+    # Received messages past each conversation's watermark
+    unread = await db.messages.aggregate([
+        {"$match": {"recipient_id": user_id, "$or": [
+            {"sender_id": partner_id, **(_cursor_query(read_up_to[partner_id], "$gt") if read_up_to[partner_id] else {})}
+            for partner_id in partner_ids
+        ]}},
+        {"$group": {"_id": "$sender_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    unread_by_partner = {u["_id"]: u["count"] for u in unread}
+    
+    operations = []
+    for g in groups:
+        partner = partners_by_id.get(g["_id"], {})
+        last_message = g["last_message"]
+        last_message.pop("_id", None)
+        update = {"$set": {
+            "last_message": last_message,
+            "last_message_at": last_message["created_at"],
+            "unread_count": unread_by_partner.get(g["_id"], 0),
+            "partner_name": partner.get("name", "Utilisateur"),
+            "partner_picture": partner.get("picture")
+        }}
+        if read_up_to[g["_id"]]:
+            update["$max"] = {"read_up_to": read_up_to[g["_id"]]}
+        operations.append(UpdateOne({"user_id": user_id, "partner_id": g["_id"]}, update, upsert=True))
+    await db.conversation_summaries.bulk_write(operations, ordered=False)
+    return len(operations)
+
 @api_router.get("/social/messages")
-async def get_conversations(user: dict = Depends(get_current_user)):
-    """Get list of conversations"""
-    # Get all messages where user is sender or recipient
-    messages = await db.messages.find({
-        "$or": [{"sender_id": user["user_id"]}, {"recipient_id": user["user_id"]}]
-    }, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Group by conversation partner
-    conversations = {}
-    for msg in messages:
-        partner_id = msg["recipient_id"] if msg["sender_id"] == user["user_id"] else msg["sender_id"]
-        
-        if partner_id not in conversations:
-            partner = await db.users.find_one({"user_id": partner_id}, {"_id": 0, "password_hash": 0})
-            unread_count = await db.messages.count_documents({
-                "sender_id": partner_id,
-                "recipient_id": user["user_id"],
-                "read": False
-            })
-            
-            conversations[partner_id] = {
-                "partner_id": partner_id,
-                "partner_name": partner.get("name", "Utilisateur") if partner else "Utilisateur",
-                "partner_picture": partner.get("picture") if partner else None,
-                "last_message": msg,
-                "unread_count": unread_count
-            }
+async def get_conversations(limit: int = 30, before: Optional[str] = None, user: dict = Depends(get_current_user)):
+    """Get list of conversations (most recent first, paginated with `before`)
+
+    `before` is the `next_cursor` of the previous page (last_message_at|partner_id).
+    """
+    limit = max(1, min(limit, 100))
     
-    return {"conversations": list(conversations.values())}
+    # First visit since summaries exist: backfill from the message history once per user
+    if not user.get("conversation_summaries_built"):
+        await rebuild_conversation_summaries(user["user_id"])
+        await db.users.update_one({"user_id": user["user_id"]}, {"$set": {"conversation_summaries_built": True}})
+    
+    query = {"user_id": user["user_id"]}
+    if before:
+        query.update(_cursor_query(before, "$lt", ("last_message_at", "partner_id")))
+    summaries = await db.conversation_summaries.find(query, {"_id": 0, "user_id": 0}).sort(
+        [("last_message_at", -1), ("partner_id", -1)]
+    ).limit(limit).to_list(limit)
+    
+    next_cursor = None
+    if len(summaries) == limit:
+        next_cursor = f"{summaries[-1]['last_message_at']}|{summaries[-1]['partner_id']}"
+    return {"conversations": summaries, "next_cursor": next_cursor}
+
+def conversation_key(user1: str, user2: str) -> str:
+    """Canonical, direction-independent key of a conversation (min:max)"""
+    return f"{min(user1, user2)}:{max(user1, user2)}"
+
+def message_cursor(message: dict) -> str:
+    """Keyset cursor of a message; sorts like (created_at, message_id)"""
+    return f"{message['created_at']}|{message['message_id']}"
+
+def _cursor_query(cursor: str, op: str, fields: tuple = ("created_at", "message_id")) -> dict:
+    """Keyset condition on a "primary|tiebreak" cursor over two sort fields"""
+    primary, _, tiebreak = cursor.partition("|")
+    return {"$or": [
+        {fields[0]: {op: primary}},
+        {fields[0]: primary, fields[1]: {op: tiebreak}}
+    ]}
+
+async def mark_conversation_read(user_id: str, partner_id: str, read_up_to: str) -> str:
+    """Move a user's read watermark forward and recount unread past it (returns the stored watermark)
+
+    A page can end before the newest message (`after` paging, small limits), so
+    unread_count is recounted rather than zeroed: received messages past the
+    watermark, up to the summary's last message. A message sent meanwhile
+    either comes after that bound (its own $inc counts it) or changes
+    last_message, which makes the write miss and the count run again.
+    """
+    key = conversation_key(user_id, partner_id)
+    for _ in range(3):
+        # Upsert: the watermark must stick even before this side has a summary
+        summary = await db.conversation_summaries.find_one_and_update(
+            {"user_id": user_id, "partner_id": partner_id},
+            {"$max": {"read_up_to": read_up_to}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0, "read_up_to": 1, "last_message": 1}
+        )
+        watermark = summary["read_up_to"]
+        last_message = summary.get("last_message")
+        unread_query = {"conversation_key": key, "sender_id": partner_id, **_cursor_query(watermark, "$gt")}
+        if last_message:
+            last_at, last_id = last_message["created_at"], last_message["message_id"]
+            unread_query = {"$and": [unread_query, {"$or": [
+                {"created_at": {"$lt": last_at}},
+                {"created_at": last_at, "message_id": {"$lte": last_id}}
+            ]}]}
+        unread = await db.messages.count_documents(unread_query)
+        written = await db.conversation_summaries.update_one(
+            {
+                "user_id": user_id,
+                "partner_id": partner_id,
+                "last_message.message_id": last_message["message_id"] if last_message else None
+            },
+            {"$set": {"unread_count": unread}}
+        )
+        if written.matched_count:
+            break
+    return watermark
 
 @api_router.get("/social/messages/{partner_id}")
-async def get_messages(partner_id: str, user: dict = Depends(get_current_user)):
-    """Get messages with a specific user"""
-    messages = await db.messages.find({
-        "$or": [
-            {"sender_id": user["user_id"], "recipient_id": partner_id},
-            {"sender_id": partner_id, "recipient_id": user["user_id"]}
-        ]
-    }, {"_id": 0}).sort("created_at", 1).to_list(100)
+async def get_messages(
+    partner_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Get messages with a specific user.
+
+    Newest page by default; `before`/`after` take a cursor from a previous page
+    (created_at|message_id) to load older/newer messages. Always returned in
+    chronological order.
+    """
+    limit = max(1, min(limit, 100))
+    query = {"conversation_key": conversation_key(user["user_id"], partner_id)}
+    
+    if after:
+        query.update(_cursor_query(after, "$gt"))
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", 1), ("message_id", 1)]
+        ).limit(limit).to_list(limit)
+    else:
+        if before:
+            query.update(_cursor_query(before, "$lt"))
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", -1), ("message_id", -1)]
+        ).limit(limit).to_list(limit)
+        messages.reverse()
+    
+    # Read receipts: one "read up to" watermark per side instead of per-message updates
+    summaries = {
+        s["user_id"]: s for s in await db.conversation_summaries.find(
+            {"$or": [
+                {"user_id": user["user_id"], "partner_id": partner_id},
+                {"user_id": partner_id, "partner_id": user["user_id"]}
+            ]},
+            {"_id": 0, "user_id": 1, "read_up_to": 1}
+        ).to_list(2)
+    }
+    my_read_up_to = summaries.get(user["user_id"], {}).get("read_up_to") or ""
+    partner_read_up_to = summaries.get(partner_id, {}).get("read_up_to") or ""
     
-    # Mark as read
-    await db.messages.update_many(
-        {"sender_id": partner_id, "recipient_id": user["user_id"], "read": False},
-        {"$set": {"read": True, "read_at": datetime.now(timezone.utc).isoformat()}}
+    newest_received = next(
+        (m for m in reversed(messages) if m["sender_id"] == partner_id), None
     )
+    if newest_received and message_cursor(newest_received) > my_read_up_to:
+        my_read_up_to = await mark_conversation_read(user["user_id"], partner_id, message_cursor(newest_received))
     
-    return {"messages": messages}
+    for m in messages:
+        watermark = partner_read_up_to if m["sender_id"] == user["user_id"] else my_read_up_to
+        m["read"] = m.get("read", False) or message_cursor(m) <= watermark
+    
+    return {
+        "messages": messages,
+        "before": message_cursor(messages[0]) if len(messages) == limit else None,
+        "after": message_cursor(messages[-1]) if messages else after,
+        "partner_read_up_to": partner_read_up_to or None
+    }
 
 @api_router.post("/social/messages")
 async def send_message(data: dict, user: dict = Depends(get_current_user)):
@@ -7557,38 +7861,108 @@ async def send_message(data: dict, user: dict = Depends(get_current_user)):
         "message_id": f"msg_{uuid.uuid4().hex[:8]}",
         "sender_id": user["user_id"],
         "recipient_id": recipient_id,
+        "conversation_key": conversation_key(user["user_id"], recipient_id),
         "content": content,
         "read": False,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.messages.insert_one(message)
+    await update_conversation_summaries(message, user, recipient)
+    
+    # Real-time delivery to the recipient's open connections
+    await publish_to_user(recipient_id, "message", {k: v for k, v in message.items() if k != "_id"})
     
     # Create notification
-    await create_notification(recipient_id, "message", f"Nouveau message de {user.get('name') or 'Quelquun'}", user["user_id"])
+    await create_notification(recipient_id, "message", f"Nouveau message de {user.get('name') or 'Quelquun'}", user["user_id"], from_user=user)
     
     # Remove _id before returning (MongoDB adds it after insert)
     message.pop("_id", None)
     
     return {"message": "Message sent", "data": message}
 
+# --- Real-time (WebSocket) ---
+@app.websocket("/api/ws")
+async def realtime_websocket(websocket: WebSocket):
+    """Push new messages and notifications (likes included) to the connected user.
+
+    Auth: `token` query parameter (JWT or session token) or the session cookie.
+    The client may send "ping" and receives "pong".
+    """
+    token = websocket.query_params.get("token") or websocket.cookies.get("session_token")
+    try:
+        user = await get_user_from_token(token)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    
+    await websocket.accept()
+    async with get_pubsub().subscribe(user_channel(user["user_id"])) as subscription:
+        async def forward_events():
+            async for event in subscription:
+                await websocket.send_text(encode_event(event))
+        
+        def forwarder_done(task: asyncio.Task):
+            if task.cancelled() or not task.exception():
+                return
+            logger.warning(f"[Realtime] Forwarding to {user['user_id']} failed: {task.exception()!r}")
+            # Closing the socket ends the receive loop below
+            start_background_task(close_websocket(websocket), "ws_close")
+        
+        forwarder = asyncio.create_task(forward_events())
+        forwarder.add_done_callback(forwarder_done)
+        try:
+            while True:
+                if await websocket.receive_text() == "ping":
+                    await websocket.send_text(encode_event({"type": "pong"}))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            forwarder.cancel()
+
+async def close_websocket(websocket: WebSocket, code: int = 1011):
+    try:
+        await websocket.close(code=code)
+    except Exception:
+        pass  # Already closed by the client
+
 # --- Notifications ---
-async def create_notification(user_id: str, notif_type: str, content: str, from_user_id: str = None):
-    """Helper to create notifications"""
+async def create_notification(user_id: str, notif_type: str, content: str, from_user_id: str = None, from_user: dict = None):
+    """Helper to create notifications (with a snapshot of the actor's name and picture)"""
+    if from_user_id and from_user is None:
+        from_user = await db.users.find_one({"user_id": from_user_id}, {"_id": 0, "name": 1, "picture": 1})
     notification = {
         "notification_id": f"notif_{uuid.uuid4().hex[:8]}",
         "user_id": user_id,
         "type": notif_type,
         "content": content,
         "from_user_id": from_user_id,
+        "from_user_name": from_user.get("name") if from_user else None,
+        "from_user_picture": from_user.get("picture") if from_user else None,
         "read": False,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.notifications.insert_one(notification)
+    counter = await db.notification_counters.update_one({"user_id": user_id}, {"$inc": {"unread": 1}})
+    if not counter.matched_count:
+        # No counter yet: initialize it from the existing notifications (includes this one)
+        await get_unread_notification_count(user_id)
     # Remove _id after insert
     notification.pop("_id", None)
+    await publish_to_user(user_id, "notification", notification)
     return notification
 
+async def get_unread_notification_count(user_id: str) -> int:
+    """Unread notifications from the maintained counter (initialized once by a count)"""
+    counter = await db.notification_counters.find_one({"user_id": user_id}, {"_id": 0, "unread": 1})
+    if counter is None:
+        unread = await db.notifications.count_documents({"user_id": user_id, "read": False})
+        await db.notification_counters.update_one(
+            {"user_id": user_id}, {"$setOnInsert": {"unread": unread}}, upsert=True
+        )
+        return unread
+    return max(0, counter.get("unread", 0))
+
 @api_router.get("/social/notifications")
 async def get_notifications(user: dict = Depends(get_current_user)):
     """Get user notifications"""
@@ -7597,18 +7971,31 @@ async def get_notifications(user: dict = Depends(get_current_user)):
         {"_id": 0}
     ).sort("created_at", -1).limit(50).to_list(50)
     
-    # Enrich with from_user info
-    result = []
-    for n in notifications:
-        if n.get("from_user_id"):
-            from_user = await db.users.find_one({"user_id": n["from_user_id"]}, {"_id": 0, "password_hash": 0})
-            n["from_user_name"] = from_user.get("name") if from_user else None
-            n["from_user_picture"] = from_user.get("picture") if from_user else None
-        result.append(n)
-    
-    unread_count = sum(1 for n in notifications if not n.get("read"))
-    
-    return {"notifications": result, "unread_count": unread_count}
+    # Older notifications have no actor snapshot: enrich them with one batched lookup
+    missing_ids = list({
+        n["from_user_id"] for n in notifications
+        if n.get("from_user_id") and "from_user_name" not in n
+    })
+    if missing_ids:
+        actors = await db.users.find(
+            {"user_id": {"$in": missing_ids}},
+            {"_id": 0, "user_id": 1, "name": 1, "picture": 1}
+        ).to_list(len(missing_ids))
+        actors_by_id = {a["user_id"]: a for a in actors}
+        for n in notifications:
+            if n.get("from_user_id") in actors_by_id and "from_user_name" not in n:
+                actor = actors_by_id[n["from_user_id"]]
+                n["from_user_name"] = actor.get("name")
+                n["from_user_picture"] = actor.get("picture")
+    
+    unread_count = await get_unread_notification_count(user["user_id"])
+    
+    return {"notifications": notifications, "unread_count": unread_count}
+
+@api_router.get("/social/notifications/unread-count")
+async def get_notifications_unread_count(user: dict = Depends(get_current_user)):
+    """Unread notification count (maintained counter, no collection scan)"""
+    return {"unread_count": await get_unread_notification_count(user["user_id"])}
 
 @api_router.post("/social/notifications/read")
 async def mark_notifications_read(data: dict, user: dict = Depends(get_current_user)):
@@ -7616,16 +8003,23 @@ async def mark_notifications_read(data: dict, user: dict = Depends(get_current_u
     notification_ids = data.get("notification_ids", [])
     
     if notification_ids:
-        await db.notifications.update_many(
-            {"notification_id": {"$in": notification_ids}, "user_id": user["user_id"]},
+        result = await db.notifications.update_many(
+            {"notification_id": {"$in": notification_ids}, "user_id": user["user_id"], "read": False},
             {"$set": {"read": True}}
         )
+        if result.modified_count:
+            await db.notification_counters.update_one(
+                {"user_id": user["user_id"]}, {"$inc": {"unread": -result.modified_count}}
+            )
     else:
         # Mark all as read
         await db.notifications.update_many(
             {"user_id": user["user_id"], "read": False},
             {"$set": {"read": True}}
         )
+        await db.notification_counters.update_one(
+            {"user_id": user["user_id"]}, {"$set": {"unread": 0}}, upsert=True
+        )
     
     return {"message": "Notifications marked as read"}
 
@@ -7670,7 +8064,7 @@ async def create_friend_challenge(data: dict, user: dict = Depends(get_current_u
     }
     
     await db.friend_challenges.insert_one(challenge)
-    await create_notification(friend_id, "challenge", f"{user.get('name') or 'Quelquun'} vous lance un défi !", user["user_id"])
+    await create_notification(friend_id, "challenge", f"{user.get('name') or 'Quelquun'} vous lance un défi !", user["user_id"], from_user=user)
     
     return {"message": "Challenge created", "challenge": challenge}
 
@@ -7708,7 +8102,7 @@ async def accept_friend_challenge(challenge_id: str, user: dict = Depends(get_cu
     
     challenge = await db.friend_challenges.find_one({"challenge_id": challenge_id}, {"_id": 0})
     if challenge:
-        await create_notification(challenge["creator_id"], "challenge_accepted", f"{user.get('name')} a accepté votre défi !", user["user_id"])
+        await create_notification(challenge["creator_id"], "challenge_accepted", f"{user.get('name')} a accepté votre défi !", user["user_id"], from_user=user)
     
     return {"message": "Challenge accepted"}
 
@@ -7812,6 +8206,32 @@ async def get_enhanced_leaderboard(leaderboard_type: str, group_id: str = None,
     
     return {"leaderboard": leaderboard, "type": leaderboard_type}
 
+# --- Feed helpers ---
+async def enrich_feed_posts(posts: list, user_id: str) -> list:
+    """Attach poster, counters and the caller's like to a page of posts (2 queries, whatever the page size)"""
+    post_ids = [p["post_id"] for p in posts]
+    posters, liked = await asyncio.gather(
+        get_users_by_ids([p["user_id"] for p in posts]),
+        db.post_likes.find(
+            {"user_id": user_id, "post_id": {"$in": post_ids}},
+            {"_id": 0, "post_id": 1}
+        ).to_list(None)
+    )
+    liked_ids = {like["post_id"] for like in liked}
+    
+    result = []
+    for post in posts:
+        poster = posters.get(post["user_id"])
+        result.append({
+            **post,
+            "user_name": poster.get("name") if poster else "Utilisateur",
+            "user_picture": poster.get("picture") if poster else None,
+            "likes_count": post.get("likes_count", 0),
+            "user_liked": post["post_id"] in liked_ids,
+            "comments_count": post.get("comments_count", 0)
+        })
+    return result
+
 # --- Public Feed (All Users) ---
 @api_router.get("/social/feed/public")
 async def get_public_feed(limit: int = 50, user: dict = Depends(get_current_user)):
@@ -7821,21 +8241,7 @@ async def get_public_feed(limit: int = 50, user: dict = Depends(get_current_user
         {"_id": 0}
     ).sort("created_at", -1).limit(limit).to_list(limit)
     
-    result = []
-    for post in posts:
-        poster = await db.users.find_one({"user_id": post["user_id"]}, {"_id": 0, "password_hash": 0})
-        likes_count = await db.post_likes.count_documents({"post_id": post["post_id"]})
-        user_liked = await db.post_likes.find_one({"post_id": post["post_id"], "user_id": user["user_id"]}) is not None
-        comments_count = await db.post_comments.count_documents({"post_id": post["post_id"]})
-        
-        result.append({
-            **post,
-            "user_name": poster.get("name") if poster else "Utilisateur",
-            "user_picture": poster.get("picture") if poster else None,
-            "likes_count": likes_count,
-            "user_liked": user_liked,
-            "comments_count": comments_count
-        })
+    result = await enrich_feed_posts(posts, user["user_id"])
     
     return {"posts": result}
 
@@ -7853,21 +8259,7 @@ async def get_group_feed(group_id: str, limit: int = 50, user: dict = Depends(ge
         {"_id": 0}
     ).sort("created_at", -1).limit(limit).to_list(limit)
     
-    result = []
-    for post in posts:
-        poster = await db.users.find_one({"user_id": post["user_id"]}, {"_id": 0, "password_hash": 0})
-        likes_count = await db.post_likes.count_documents({"post_id": post["post_id"]})
-        user_liked = await db.post_likes.find_one({"post_id": post["post_id"], "user_id": user["user_id"]}) is not None
-        comments_count = await db.post_comments.count_documents({"post_id": post["post_id"]})
-        
-        result.append({
-            **post,
-            "user_name": poster.get("name") if poster else "Utilisateur",
-            "user_picture": poster.get("picture") if poster else None,
-            "likes_count": likes_count,
-            "user_liked": user_liked,
-            "comments_count": comments_count
-        })
+    result = await enrich_feed_posts(posts, user["user_id"])
     
     return {"posts": result, "group_id": group_id}
 
@@ -7902,10 +8294,13 @@ async def create_post(data: dict, user: dict = Depends(get_current_user)):
         "group_id": group_id,
         "shared_item": shared_item,
         "is_public": is_public if not group_id else False,  # Group posts are private
+        "likes_count": 0,
+        "comments_count": 0,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.social_posts.insert_one(post)
+    await bump_profile_stats(db, user["user_id"], posts_count=1)
     
     # Award points for posting
     await db.user_points.update_one(
@@ -7977,10 +8372,11 @@ async def add_comment(post_id: str, data: dict, user: dict = Depends(get_current
     }
     
     await db.post_comments.insert_one(comment)
+    await db.social_posts.update_one({"post_id": post_id}, {"$inc": {"comments_count": 1}})
     
     # Notify post owner
     if post["user_id"] != user["user_id"]:
-        await create_notification(post["user_id"], "comment", f"{user.get('name', 'Quelquun')} a commenté votre publication", user["user_id"])
+        await create_notification(post["user_id"], "comment", f"{user.get('name', 'Quelquun')} a commenté votre publication", user["user_id"], from_user=user)
     
     return {"message": "Comment added", "comment": {k: v for k, v in comment.items() if k != "_id"}}
 
@@ -7991,21 +8387,30 @@ async def like_post(post_id: str, user: dict = Depends(get_current_user)):
     existing = await db.post_likes.find_one({"post_id": post_id, "user_id": user["user_id"]})
     
     if existing:
-        # Unlike
-        await db.post_likes.delete_one({"post_id": post_id, "user_id": user["user_id"]})
+        # Unlike (only the request that actually removed the like decrements)
+        result = await db.post_likes.delete_one({"post_id": post_id, "user_id": user["user_id"]})
+        if result.deleted_count:
+            await db.social_posts.update_one({"post_id": post_id}, {"$inc": {"likes_count": -1}})
         return {"message": "Post unliked", "liked": False}
     else:
-        # Like
-        await db.post_likes.insert_one({
-            "post_id": post_id,
-            "user_id": user["user_id"],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        })
+        # Like (upsert on the unique (user_id, post_id) index so a double tap cannot count twice)
+        try:
+            result = await db.post_likes.update_one(
+                {"post_id": post_id, "user_id": user["user_id"]},
+                {"$setOnInsert": {"created_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent request inserted the same like
+            return {"message": "Post liked", "liked": True}
+        if result.upserted_id is None:
+            return {"message": "Post liked", "liked": True}
+        await db.social_posts.update_one({"post_id": post_id}, {"$inc": {"likes_count": 1}})
         
         # Notify post owner
         post = await db.social_posts.find_one({"post_id": post_id})
         if post and post["user_id"] != user["user_id"]:
-            await create_notification(post["user_id"], "like", f"{user.get('name', 'Quelquun')} aime votre publication", user["user_id"])
+            await create_notification(post["user_id"], "like", f"{user.get('name', 'Quelquun')} aime votre publication", user["user_id"], from_user=user)
         
         return {"message": "Post liked", "liked": True}
 
@@ -8036,6 +8441,7 @@ async def share_program(data: dict, user: dict = Depends(get_current_user)):
     }
     
     await db.social_posts.insert_one(post)
+    await bump_profile_stats(db, user["user_id"], posts_count=1)
     
     return {"message": "Program shared", "post_id": post["post_id"]}
 
@@ -8066,6 +8472,7 @@ async def share_recipe(data: dict, user: dict = Depends(get_current_user)):
     }
     
     await db.social_posts.insert_one(post)
+    await bump_profile_stats(db, user["user_id"], posts_count=1)
     
     return {"message": "Recipe shared", "post_id": post["post_id"]}
 
@@ -8193,158 +8600,28 @@ async def complete_group_challenge(group_id: str, user: dict = Depends(get_curre
 # --- Seed Fake Users ---
 @api_router.post("/social/seed-fake-users")
 async def seed_fake_users(data: dict = None, user: dict = Depends(get_current_user)):
-    """Create 3798 fake users for community simulation with smart interactions"""
+    """Start (or resume) a background job creating 3798 fake users for community simulation"""
     target_count = data.get("count", 3798) if data else 3798
     
-    # Check existing
-    existing_fake = await db.users.count_documents({"is_fake": True})
-    if existing_fake >= target_count:
-        return {"message": f"Already have {existing_fake} fake users", "created": 0}
-    
-    # Extended French names for variety
-    female_names = ["Marie", "Camille", "Léa", "Manon", "Emma", "Chloé", "Louise", "Jade", "Alice", "Sarah", 
-                   "Julie", "Laura", "Marion", "Pauline", "Clara", "Charlotte", "Anaïs", "Océane", "Margot", "Valentine",
-                   "Sophie", "Lucie", "Audrey", "Justine", "Mathilde", "Caroline", "Amélie", "Élodie", "Mélanie", "Aurélie",
-                   "Céline", "Marine", "Nathalie", "Sandrine", "Virginie", "Stéphanie", "Delphine", "Isabelle", "Valérie", "Laetitia",
-                   "Alexandra", "Christelle", "Séverine", "Morgane", "Floriane", "Élise", "Gaëlle", "Noémie", "Agathe", "Inès",
-                   "Zoé", "Lola", "Romane", "Nina", "Eva", "Maëva", "Alicia", "Mélissa", "Coralie", "Cindy"]
-    male_names = ["Thomas", "Lucas", "Hugo", "Maxime", "Alexandre", "Antoine", "Julien", "Nicolas", "Pierre", "Louis",
-                 "Clément", "Vincent", "François", "Guillaume", "Romain", "Mathieu", "Adrien", "Quentin", "Xavier", "Florian",
-                 "Sébastien", "Laurent", "Christophe", "Olivier", "Frédéric", "David", "Philippe", "Jérôme", "Benoît", "Damien",
-                 "Kevin", "Jonathan", "Benjamin", "Raphaël", "Théo", "Nathan", "Léo", "Noah", "Enzo", "Mathis",
-                 "Dylan", "Jordan", "Alexis", "Valentin", "Victor", "Baptiste", "Gabriel", "Arthur", "Ethan", "Paul"]
-    
-    last_names = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
-                 "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier",
-                 "Morel", "Girard", "André", "Mercier", "Dupont", "Lambert", "Bonnet", "François", "Martinez", "Legrand",
-                 "Garnier", "Faure", "Rousseau", "Blanc", "Guerin", "Muller", "Henry", "Roussel", "Nicolas", "Perrin",
-                 "Morin", "Mathieu", "Clement", "Gauthier", "Dumont", "Lopez", "Fontaine", "Chevalier", "Robin", "Masson"]
-    
-    avatar_base = "https://ui-avatars.com/api/?background=random&name="
-    groups = ["fitness", "cardio", "nutrition", "weight_loss", "muscle_gain", "yoga"]
-    objectives = ["Perdre du poids", "Gagner en muscle", "Améliorer mon endurance", "Manger plus sainement", "Être en meilleure forme"]
-    
-    post_contents = [
-        "Super séance aujourd'hui ! 💪", "Je me sens en forme ! 🏋️", "Objectif du jour atteint ✅",
-        "Petit déjeuner healthy 🥗", "Merci pour vos encouragements ! ❤️", "Nouvelle semaine, nouveaux objectifs 🎯",
-        "Le sport, c'est la vie ! 🏃", "Progrès du mois, fier(e) de moi 📈", "Recette du jour : smoothie protéiné 🍓",
-        "Motivation au top ! 🔥", "Jour de repos bien mérité 😴", "30 min de cardio ce matin 🚴",
-        "Mes muscles me disent merci 💪", "Premier jour sans grignotage ! 🎉", "Meal prep du dimanche 🍱",
-        "1kg de perdu cette semaine ! ⬇️", "Nouvelle PR au squat 🏆", "Hydratation on point 💧",
-        "Je ne lâche rien ! 💯", "Semaine 4 de mon programme 📅", "Mon coach serait fier de moi 🌟",
-        "Les résultats commencent à se voir 👀", "Alimentation équilibrée = énergie décuplée ⚡",
-        "Marche quotidienne ✅ 10 000 pas atteints", "Stretching du soir 🧘", "Sleep is the best recovery 😴",
-        "Protéines ✓ Légumes ✓ Hydratation ✓", "Batch cooking pour la semaine 🍳", "Objectif 5km en moins de 30min 🏃‍♂️",
-        "Mental fort, corps fort 🧠💪", "Yoga flow du matin terminé 🙏", "Félicitations à tous pour vos efforts ! 🎊"
-    ]
-    
-    comment_templates = [
-        "Bravo ! Continue comme ça 💪", "Super motivation ! 🔥", "Tu gères ! 👏", "Félicitations ! 🎉",
-        "Ça donne envie ! 😍", "Respect ! 💯", "Top ! On lâche rien 🙌", "Inspirant ! ⭐",
-        "Belle performance ! 🏆", "Continue comme ça ! 👍", "Waouh impressionnant ! 😮", "Tu m'inspires ! 🌟",
-        "Quel courage ! 💪", "Bravo pour ta régularité ! 📈", "On est tous avec toi ! ❤️", "Force à toi ! 💥"
-    ]
-    
-    created = 0
-    to_create = target_count - existing_fake
-    female_count = int(to_create * 0.6)
-    
-    # Create users in batch
-    batch_size = 100
-    fake_user_ids = []
-    
-    for batch_start in range(0, to_create, batch_size):
-        batch_end = min(batch_start + batch_size, to_create)
-        users_batch = []
-        points_batch = []
-        memberships_batch = []
-        
-        for i in range(batch_start, batch_end):
-            is_female = i < female_count
-            first_name = random.choice(female_names if is_female else male_names)
-            last_name = random.choice(last_names)
-            name = f"{first_name} {last_name}"
-            
-            user_id = f"fake_{uuid.uuid4().hex[:10]}"
-            fake_user_ids.append(user_id)
-            
-            points = random.randint(50, 8000)
-            badges_count = random.randint(0, 20)
-            
-            fake_user = {
-                "user_id": user_id,
-                "email": f"{first_name.lower()}.{last_name.lower()}{random.randint(1,999)}@example.com",
-                "name": name,
-                "picture": f"{avatar_base}{first_name}+{last_name}",
-                "onboarding_completed": True,
-                "is_premium": random.random() < 0.15,
-                "is_fake": True,
-                "gender": "female" if is_female else "male",
-                "objective": random.choice(objectives),
-                "badges_count": badges_count,
-                "created_at": (datetime.now(timezone.utc) - timedelta(days=random.randint(1, 365))).isoformat()
-            }
-            users_batch.append(fake_user)
-            
-            points_batch.append({
-                "user_id": user_id,
-                "total_points": points,
-                "challenge_points": random.randint(0, points // 3),
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
-            
-            user_groups = random.sample(groups, random.randint(1, 4))
-            for group_id in user_groups:
-                memberships_batch.append({
-                    "group_id": group_id,
-                    "user_id": user_id,
-                    "joined_at": (datetime.now(timezone.utc) - timedelta(days=random.randint(1, 180))).isoformat()
-                })
-        
-        if users_batch:
-            await db.users.insert_many(users_batch)
-        if points_batch:
-            await db.user_points.insert_many(points_batch)
-        if memberships_batch:
-            await db.group_members.insert_many(memberships_batch)
-        
-        created += len(users_batch)
-        
-        # Create posts for this batch
-        posts_batch = []
-        for user in users_batch:
-            num_posts = random.randint(0, 5)
-            for _ in range(num_posts):
-                posts_batch.append({
-                    "post_id": f"post_{uuid.uuid4().hex[:12]}",
-                    "user_id": user["user_id"],
-                    "content": random.choice(post_contents),
-                    "type": "text",
-                    "is_public": True,
-                    "group_id": random.choice(groups) if random.random() < 0.6 else None,
-                    "likes": [],
-                    "comments": [],
-                    "created_at": (datetime.now(timezone.utc) - timedelta(days=random.randint(0, 60), hours=random.randint(0, 23))).isoformat()
-                })
-        if posts_batch:
-            await db.social_posts.insert_many(posts_batch)
-    
-    # Create friendships between fake users
-    friendships_batch = []
-    for i in range(min(len(fake_user_ids), 500)):
-        user_id = random.choice(fake_user_ids)
-        friend_id = random.choice([uid for uid in fake_user_ids if uid != user_id])
-        friendships_batch.append({
-            "friendship_id": f"friend_{uuid.uuid4().hex[:8]}",
-            "user_id": user_id,
-            "friend_id": friend_id,
-            "status": "accepted",
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=random.randint(1, 90))).isoformat()
-        })
-    if friendships_batch:
-        await db.friendships.insert_many(friendships_batch)
+    job = await create_seed_job(db, target_count, user["user_id"])
+    if job["status"] == "completed" and not job["to_create"]:
+        return {"message": f"Already have {job['existing']} fake users", "created": 0, "job": job}
     
-    return {"message": f"Created {created} fake users with interactions", "created": created, "target": target_count}
+    return {
+        "message": f"Seeding {job['to_create']} fake users in background",
+        "job_id": job["job_id"],
+        "status_url": f"/api/social/seed-fake-users/{job['job_id']}",
+        "job": job
+    }
+
+@api_router.get("/social/seed-fake-users/{job_id}")
+async def get_seed_job_status(job_id: str, user: dict = Depends(get_current_user)):
+    """Progress of a fake-user seeding job"""
+    job = await db.seed_jobs.find_one({"job_id": job_id}, {"_id": 0, "owner": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Seed job not found")
+    job["progress"] = round(job["chunks_done"] / job["chunks_total"] * 100, 1) if job["chunks_total"] else 100.0
+    return job
 
 @api_router.post("/social/simulate-interactions")
 async def simulate_fake_interactions(user: dict = Depends(get_current_user)):
@@ -8414,6 +8691,7 @@ async def simulate_fake_interactions(user: dict = Depends(get_current_user)):
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.social_posts.insert_one(post)
+        await bump_profile_stats(db, post["user_id"], posts_count=1)
         interactions += 1
     
     # Create new friendships
@@ -8424,13 +8702,18 @@ async def simulate_fake_interactions(user: dict = Depends(get_current_user)):
             {"user_id": user2, "friend_id": user1}
         ]})
         if not existing:
-            await db.friendships.insert_one({
-                "friendship_id": f"friend_{uuid.uuid4().hex[:8]}",
-                "user_id": user1,
-                "friend_id": user2,
-                "status": "accepted",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
+            try:
+                await db.friendships.insert_one({
+                    "friendship_id": f"friend_{uuid.uuid4().hex[:8]}",
+                    "pair_key": friendship_pair_key(user1, user2),
+                    "user_id": user1,
+                    "friend_id": user2,
+                    "status": "accepted",
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                })
+            except DuplicateKeyError:
+                continue
+            await bump_profile_stats_many(db, "friends_count", [user1, user2])
             interactions += 1
     
     return {"message": f"Simulated {interactions} interactions", "interactions": interactions}
@@ -8486,12 +8769,29 @@ async def block_user(data: dict, user: dict = Depends(get_current_user)):
             "created_at": datetime.now(timezone.utc).isoformat()
         })
         # Also remove friendship if exists
+        removed = await db.friendships.delete_many({
+            "status": "accepted",
+            "$or": [
+                {"user_id": user["user_id"], "friend_id": blocked_user_id},
+                {"user_id": blocked_user_id, "friend_id": user["user_id"]}
+            ]
+        })
         await db.friendships.delete_many({
             "$or": [
                 {"user_id": user["user_id"], "friend_id": blocked_user_id},
                 {"user_id": blocked_user_id, "friend_id": user["user_id"]}
             ]
         })
+        # Neither side keeps the other's activities in their friends feed
+        await asyncio.gather(
+            remove_author_from_timeline(db, user["user_id"], blocked_user_id),
+            remove_author_from_timeline(db, blocked_user_id, user["user_id"])
+        )
+        if removed.deleted_count:
+            await asyncio.gather(
+                bump_profile_stats(db, user["user_id"], friends_count=-removed.deleted_count),
+                bump_profile_stats(db, blocked_user_id, friends_count=-removed.deleted_count)
+            )
         return {"message": "Utilisateur bloqué", "is_blocked": True}
 
 @api_router.get("/social/blocked-users")
@@ -8541,6 +8841,7 @@ async def share_challenge_to_feed(data: dict, user: dict = Depends(get_current_u
     }
     
     await db.social_posts.insert_one(post)
+    await bump_profile_stats(db, user["user_id"], posts_count=1)
     await db.users.update_one({"user_id": user["user_id"]}, {"$inc": {"points": 5}})
     
     return {"message": "Défi partagé sur votre mur ! +5 points", "post": post}
@@ -8669,6 +8970,7 @@ async def share_achievement(data: dict, user: dict = Depends(get_current_user)):
     }
     
     await db.social_posts.insert_one(post)
+    await bump_profile_stats(db, user["user_id"], posts_count=1)
     
     # Award points
     await db.users.update_one(
@@ -8698,50 +9000,112 @@ async def init_default_groups():
             group["created_at"] = datetime.now(timezone.utc).isoformat()
             await db.groups.insert_one(group)
 
-# Initialize APScheduler for automated community interactions
-scheduler = BackgroundScheduler()
-
-def setup_community_scheduler():
-    """Setup automated community interactions at random intervals"""
-    # Run every 2-4 hours with some randomization
-    # Morning: 6-9 AM
-    scheduler.add_job(
-        run_community_automation,
-        CronTrigger(hour='6-9', minute='*/30'),
-        id='community_morning',
-        replace_existing=True
-    )
-    # Noon: 11-14
-    scheduler.add_job(
-        run_community_automation,
-        CronTrigger(hour='11-14', minute='*/45'),
-        id='community_noon',
-        replace_existing=True
-    )
-    # Afternoon: 15-18
-    scheduler.add_job(
-        run_community_automation,
-        CronTrigger(hour='15-18', minute='*/40'),
-        id='community_afternoon',
-        replace_existing=True
-    )
-    # Evening: 19-22
-    scheduler.add_job(
-        run_community_automation,
-        CronTrigger(hour='19-22', minute='*/35'),
-        id='community_evening',
-        replace_existing=True
+# asyncio-native community automation, runs in the app loop on the shared `db`
+community_scheduler = CommunityScheduler(db)
+
+@api_router.get("/social/automation/status")
+async def get_community_automation_status(user: dict = Depends(get_admin_user)):
+    """Community automation job metrics (runs, durations, next slot) for this worker"""
+    return community_scheduler.get_metrics()
+
+async def ensure_indexes():
+    """Create the indexes hot queries rely on (idempotent, built concurrently)"""
+    await asyncio.gather(
+        # Canonical friendship pair key: unique index built by the friendship_pair_keys migration
+        # Inbox: one range scan per user, newest conversation first
+        db.conversation_summaries.create_index([("user_id", 1), ("partner_id", 1)], unique=True),
+        db.conversation_summaries.create_index([("user_id", 1), ("last_message_at", -1), ("partner_id", -1)]),
+        # Message history: keyset pagination within a conversation
+        db.messages.create_index([("conversation_key", 1), ("created_at", -1), ("message_id", -1)]),
+        # Notifications: newest first per user, unread counter per user
+        db.notifications.create_index([("user_id", 1), ("created_at", -1)]),
+        db.notification_counters.create_index("user_id", unique=True),
+        # User search: multikey index on normalized name/email prefixes
+        db.users.create_index("search_tokens"),
+        # Feeds: newest posts, caller's likes per page, counter backfill
+        db.social_posts.create_index([("created_at", -1)]),
+        db.social_posts.create_index([("group_id", 1), ("created_at", -1)]),
+        # (user_id, post_id) unique index: built by the unique_post_likes migration
+        db.post_likes.create_index("post_id"),
+        db.post_comments.create_index([("post_id", 1), ("created_at", 1)]),
+        # Push: pruning unregistered tokens
+        db.users.create_index("fcm_token", sparse=True),
+        # Calendar sync: (user_id, google_event_id) unique index built by the unique_google_appointments migration
+        # Premium entitlement loads
+        db.premium_subscriptions.create_index([("user_id", 1), ("status", 1), ("expiry_date", -1)]),
+        # Coach programs: one agenda entry per program session
+        db.appointments.create_index(
+            [("user_id", 1), ("program_id", 1), ("program_slot", 1)],
+            unique=True,
+            partialFilterExpression={"program_slot": {"$type": "string"}}
+        ),
+        # Progress report PDFs: cache per user, job polling
+        ensure_report_indexes(db),
+        db.weight_entries.create_index([("user_id", 1), ("date", 1)]),
+        db.step_logs.create_index([("user_id", 1), ("date", 1)]),
+        db.food_logs.create_index([("user_id", 1), ("date", 1)]),
+        # Profile counters
+        db.profile_stats.create_index("user_id", unique=True),
+        db.favorite_recipes.create_index("user_id"),
+        db.social_posts.create_index("user_id"),
+        # Friends feed: home timelines
+        ensure_timeline_indexes(db),
+        # Friend lists / requests: batched $in lookups
+        db.users.create_index("user_id"),
+        db.user_points.create_index("user_id"),
+        db.friendships.create_index([("user_id", 1), ("status", 1)]),
+        db.friendships.create_index([("friend_id", 1), ("status", 1)]),
+        # Seeding jobs: status polling and per-chunk cleanup on resume
+        db.seed_jobs.create_index("job_id", unique=True),
+        # Shopping list: (user_id, item) unique index built by the unique_shopping_items migration
+        # Account deletion jobs: status polling, one unfinished job per user
+        db.deletion_jobs.create_index("job_id", unique=True),
+        db.deletion_jobs.create_index([("user_id", 1), ("status", 1)]),
+        # One-time migrations: one lease document per migration
+        db.migrations.create_index("migration_id", unique=True),
+        ensure_slow_query_indexes(db),
+        *(db[collection].create_index("seed_chunk", sparse=True) for collection in SEEDED_COLLECTIONS)
     )
-    logger.info("[Scheduler] Community automation jobs scheduled")
 
 # Call init on startup
 @app.on_event("startup")
 async def startup_event():
+    startup_profile.mark("startup_begin")
+    await ensure_indexes()
     await init_default_groups()
+    # Resume seeding jobs interrupted by a restart
+    await resume_seed_jobs(db)
+    await resume_deletion_jobs(db)
+    # Store slow queries and capture their plans off the request path
+    slow_query_listener.start(db)
+    # One-time backfills: run once per deployment, under a lease, off the startup path
+    start_background_task(run_migrations(db), "migrations")
     # Start the community scheduler
-    setup_community_scheduler()
-    scheduler.start()
-    logger.info("[Scheduler] APScheduler started for community automation")
+    community_scheduler.start()
+    startup_profile.mark("startup_hooks")
+    # Preload heavy dependencies in the background once the worker serves traffic
+    start_background_task(warm_up_worker(), "warm_up_worker")
+
+# Strong references: the event loop only keeps weak ones to running tasks
+_background_tasks = set()
+
+def start_background_task(coro, name: str) -> asyncio.Task:
+    """Run a startup coroutine in the background, keeping it alive and logging failures"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _background_task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"[Startup] Background task {task.get_name()} failed: {task.exception()!r}")
+
+async def warm_up_worker():
+    """Run warm-up hooks off the event loop and log the boot profile"""
+    await run_warmups()
+    startup_profile.mark("warmup")
+    logger.info(f"[Startup] Boot profile: {startup_profile.get_phases()}")
 
 # ==================== PREMIUM SUBSCRIPTION (GOOGLE PLAY BILLING) ====================
 
@@ -8756,20 +9120,18 @@ PREMIUM_PRODUCT_ID = "premium_monthly_1999"
 
 @api_router.get("/premium/status")
 async def get_premium_status(user: dict = Depends(get_current_user)):
-    """Get user's premium subscription status"""
-    subscription = await db.premium_subscriptions.find_one(
-        {"user_id": user["user_id"], "status": "active"},
-        {"_id": 0}
-    )
+    """Get user's premium subscription status (served from the entitlement cache)"""
+    entitlement = await get_entitlement(db, user["user_id"])
+    subscription = entitlement["subscription"]
     
     if subscription:
         # Check if subscription is still valid
-        expiry_date = datetime.fromisoformat(subscription.get("expiry_date", "2000-01-01"))
-        if expiry_date > datetime.now(timezone.utc):
+        if entitlement_active(entitlement):
             return {
                 "is_premium": True,
                 "subscription": {
                     "product_id": subscription.get("product_id"),
+                    "status": subscription.get("status"),
                     "start_date": subscription.get("start_date"),
                     "expiry_date": subscription.get("expiry_date"),
                     "next_billing_date": subscription.get("next_billing_date"),
@@ -8778,10 +9140,11 @@ async def get_premium_status(user: dict = Depends(get_current_user)):
             }
         else:
             # Subscription expired, update status
-            await db.premium_subscriptions.update_one(
-                {"user_id": user["user_id"], "status": "active"},
+            await db.premium_subscriptions.update_many(
+                {"user_id": user["user_id"], "status": {"$in": ["active", "cancelled"]}},
                 {"$set": {"status": "expired"}}
             )
+            invalidate_entitlement(user["user_id"])
     
     return {
         "is_premium": False,
@@ -8867,6 +9230,7 @@ async def verify_premium_purchase(data: PremiumVerifyRequest, user: dict = Depen
         upsert=True
     )
     
+    invalidate_entitlement(user["user_id"])
     logger.info(f"Premium subscription activated for user {user['user_id']}")
     
     return {
@@ -8897,6 +9261,8 @@ async def cancel_premium(user: dict = Depends(get_current_user)):
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="No active subscription found")
     
+    invalidate_entitlement(user["user_id"])
+    
     return {
         "success": True,
         "message": "Abonnement annulé. Il reste actif jusqu'à la fin de la période payée."
@@ -8946,17 +9312,8 @@ async def get_premium_features():
 
 # Helper function to check if user is premium
 async def is_user_premium(user_id: str) -> bool:
-    """Check if a user has active premium subscription"""
-    subscription = await db.premium_subscriptions.find_one({
-        "user_id": user_id,
-        "status": {"$in": ["active", "cancelled"]}  # Cancelled but not expired
-    })
-    
-    if subscription:
-        expiry_date = datetime.fromisoformat(subscription.get("expiry_date", "2000-01-01"))
-        return expiry_date > datetime.now(timezone.utc)
-    
-    return False
+    """Check if a user has active premium subscription (cancelled counts until expiry)"""
+    return await is_premium(db, user_id)
 
 # ==================== PWA MANIFEST & ASSETLINKS ====================
 
@@ -9043,10 +9400,23 @@ async def serve_assetlinks_api():
     return JSONResponse(content=ASSET_LINKS, media_type="application/json")
 
 # ==================== PUSH NOTIFICATIONS ENDPOINTS ====================
-from notifications import init_firebase, send_push_notification, send_typed_notification, send_push_to_multiple, NOTIFICATION_TYPES
+from notifications import (
+    init_firebase, send_push_notification, send_typed_notification, send_push_to_multiple,
+    get_push_dispatcher, set_token_pruner, NOTIFICATION_TYPES
+)
+
+# Initialize Firebase after startup (warm-up hook) instead of at import
+register_warmup("firebase", init_firebase)
+
+async def prune_push_tokens(tokens: list):
+    """Forget FCM tokens reported as unregistered by the push dispatcher"""
+    result = await db.users.update_many(
+        {"fcm_token": {"$in": tokens}},
+        {"$unset": {"fcm_token": ""}, "$set": {"notifications_enabled": False}}
+    )
+    logger.info(f"[Push] Pruned {result.modified_count} unregistered tokens")
 
-# Initialize Firebase on startup
-init_firebase()
+set_token_pruner(prune_push_tokens)
 
 @api_router.post("/notifications/register-token")
 async def register_push_token(data: dict, user: dict = Depends(get_current_user)):
@@ -9113,6 +9483,24 @@ async def get_notification_types():
     """Get available notification types"""
     return {"types": list(NOTIFICATION_TYPES.keys())}
 
+# ==================== METRICS (Prometheus scrape, no /api prefix) ====================
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Per-route latency / Mongo command histograms of this worker (Bearer METRICS_TOKEN, disabled when unset)"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(limit: int = 50, collection: Optional[str] = None, collscan_only: bool = False, user: dict = Depends(get_admin_user)):
+    """Slowest query shapes seen in production with their captured plan summary"""
+    queries = await list_slow_queries(db, limit=min(limit, 500), collection=collection, collscan_only=collscan_only)
+    return {"threshold_ms": slow_query_listener.threshold_ms, "count": len(queries), "queries": queries}
+
 # Include router - MUST be after all endpoint definitions
 app.include_router(api_router)
 
@@ -9130,11 +9518,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: times the whole request, CORS included
+app.add_middleware(RequestMetricsMiddleware)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    # Shutdown scheduler
-    if scheduler.running:
-        scheduler.shutdown(wait=False)
-        logger.info("[Scheduler] APScheduler shut down")
+    # Shutdown scheduler and push workers
+    await community_scheduler.stop()
+    await get_push_dispatcher().stop()
+    await slow_query_listener.stop()
+    shutdown_report_pool()
     client.close()
+
+# Module fully imported (routes, middleware, handlers registered)
+startup_profile.mark("imports")
@@ -0,0 +1,280 @@
+"""
+Slow-query log with background explain capture
+SlowQueryListener (PyMongo command listener on the Motor client) logs every
+command slower than SLOW_QUERY_MS together with the route that issued it
+(perf_metrics request context).
+
+Slow commands are grouped by fingerprint (database, collection, command, and
+the shape of the filter/pipeline with values stripped) in `perf_slow_queries`:
+count, total/max duration and routes. For the worst offender of a fingerprint
+the worker re-runs the command as explain("executionStats") off the request
+path, at most once per EXPLAIN_INTERVAL unless a slower occurrence shows up,
+and stores the plan summary (COLLSCAN, docs/keys examined, nReturned). Query
+values are never stored, only their shape.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+from perf_metrics import current_request
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+EXPLAIN_INTERVAL = int(os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", "3600"))
+SLOW_QUERY_QUEUE_SIZE = 1000
+
+# Commands explain() accepts -> field holding their namespace
+EXPLAINABLE = {
+    "find": "find",
+    "aggregate": "aggregate",
+    "count": "count",
+    "distinct": "distinct",
+    "update": "update",
+    "delete": "delete",
+    "findAndModify": "findAndModify",
+}
+# Fields describing the query shape per command
+_SHAPE_FIELDS = ("filter", "query", "pipeline", "sort", "updates", "deletes", "key", "q")
+# Driver/session fields that must not be sent inside explain
+_SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "$db", "$clusterTime", "$readPreference"}
+SLOW_QUERY_COLLECTION = "perf_slow_queries"
+
+
+def query_shape(value):
+    """Structure of a query with values replaced by their type name"""
+    if isinstance(value, dict):
+        return {key: query_shape(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Operators like $in: one element is enough to describe the shape
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+
+def _fingerprint(database: str, collection: str, command_name: str, shape: str) -> str:
+    return f"{database}.{collection}:{command_name}:{shape}"
+
+
+def _find_key(doc, key):
+    """First value of `key` anywhere in an explain document"""
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        values = doc.values()
+    elif isinstance(doc, list):
+        values = doc
+    else:
+        return None
+    for value in values:
+        found = _find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_stages(plan) -> list:
+    stages = []
+    while isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+        plan = plan.get("inputStage") or plan.get("queryPlan")
+    return stages
+
+
+def summarize_explain(explain: dict) -> dict:
+    """Plan summary of an explain("executionStats") result
+
+    The winning plan itself is not kept: its filters carry the query values.
+    """
+    winning_plan = _find_key(explain, "winningPlan") or {}
+    stats = _find_key(explain, "executionStats") or {}
+    stages = _plan_stages(winning_plan)
+    return {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "index_names": sorted(set(_index_names(winning_plan))),
+        "execution_time_ms": stats.get("executionTimeMillis"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "n_returned": stats.get("nReturned"),
+    }
+
+
+def _index_names(plan):
+    if isinstance(plan, dict):
+        if plan.get("indexName"):
+            yield plan["indexName"]
+        for value in plan.values():
+            yield from _index_names(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _index_names(value)
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Flags slow commands; the explain/store work happens in start()'s worker"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold_ms = threshold_ms
+        self._pending = {}  # (connection, request_id) -> (command, database)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def _key(self, event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE:
+            return
+        collection = event.command.get(EXPLAINABLE[event.command_name])
+        if collection == SLOW_QUERY_COLLECTION:
+            return
+        # Keep a reference: only the few commands over the threshold get copied
+        with self._lock:
+            self._pending[self._key(event)] = (event.command, event.database_name)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        if event.command_name not in EXPLAINABLE:
+            return
+        with self._lock:
+            pending = self._pending.pop(self._key(event), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        command, database = pending
+        command = dict(command)
+        request = current_request()
+        route = f"{request.scope.get('method')} {request.route}" if request else "background"
+        collection = command.get(EXPLAINABLE[event.command_name])
+        # Stored as JSON: operator keys ($in, $match...) are not valid field names
+        shape = json.dumps({f: query_shape(command[f]) for f in _SHAPE_FIELDS if f in command}, sort_keys=True)
+        logger.warning(
+            f"[SlowQuery] {event.command_name} {database}.{collection} took {duration_ms:.0f}ms "
+            f"(route {route}) shape={shape}"
+        )
+        record = {
+            "command_name": event.command_name,
+            "database": database,
+            "collection": collection,
+            "shape": shape,
+            "route": route,
+            "duration_ms": round(duration_ms, 1),
+            "command": command,
+        }
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._enqueue, record)
+            except RuntimeError:
+                pass  # Loop closed (shutdown)
+
+    def _enqueue(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            pass  # Backlog: losing a sample is fine, blocking the driver is not
+
+    def start(self, db) -> asyncio.Task:
+        """Bind to the running loop and start the store/explain worker"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=SLOW_QUERY_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._worker(db))
+        return self._task
+
+    async def stop(self):
+        self._loop = None
+        if self._task:
+            self._task.cancel()
+
+    async def _worker(self, db):
+        explained = {}  # fingerprint -> (monotonic time, duration_ms)
+        while True:
+            record = await self._queue.get()
+            try:
+                await self._store(db, record, explained)
+            except Exception as e:
+                logger.error(f"[SlowQuery] Could not record slow query: {e}")
+
+    async def _store(self, db, record: dict, explained: dict):
+        fingerprint = _fingerprint(record["database"], record["collection"], record["command_name"], record["shape"])
+        now = datetime.now(timezone.utc).isoformat()
+        update = {
+            "$setOnInsert": {
+                "fingerprint": fingerprint,
+                "database": record["database"],
+                "collection": record["collection"],
+                "command_name": record["command_name"],
+                "shape": record["shape"],
+                "first_seen": now,
+            },
+            "$set": {"last_seen": now, "last_route": record["route"]},
+            "$inc": {"count": 1, "total_duration_ms": record["duration_ms"]},
+            "$max": {"max_duration_ms": record["duration_ms"]},
+            "$addToSet": {"routes": record["route"]},
+        }
+
+        last = explained.get(fingerprint)
+        if last is None or time.monotonic() - last[0] > EXPLAIN_INTERVAL or record["duration_ms"] > last[1]:
+            explained[fingerprint] = (time.monotonic(), record["duration_ms"])
+            plan = await self._explain(db, record)
+            if plan:
+                update["$set"].update({
+                    "plan": plan,
+                    "collscan": plan["collscan"],
+                    "explained_at": now,
+                    "explained_duration_ms": record["duration_ms"],
+                })
+        await db[SLOW_QUERY_COLLECTION].update_one({"fingerprint": fingerprint}, update, upsert=True)
+
+    async def _explain(self, db, record: dict):
+        command = {k: v for k, v in record["command"].items() if k not in _SESSION_FIELDS}
+        if record["command_name"] == "aggregate" and any(
+            "$out" in stage or "$merge" in stage for stage in command.get("pipeline", [])
+        ):
+            return None
+        try:
+            result = await db.client[record["database"]].command(
+                {"explain": command, "verbosity": "executionStats"}
+            )
+        except Exception as e:
+            logger.info(f"[SlowQuery] explain failed for {record['collection']}.{record['command_name']}: {e}")
+            return None
+        return summarize_explain(result)
+
+
+slow_query_listener = SlowQueryListener()
+
+
+async def ensure_slow_query_indexes(db):
+    await db[SLOW_QUERY_COLLECTION].create_index("fingerprint", unique=True)
+    await db[SLOW_QUERY_COLLECTION].create_index([("max_duration_ms", -1)])
+
+
+async def list_slow_queries(db, limit: int = 50, collection: str = None, collscan_only: bool = False) -> list:
+    """Slow query fingerprints, worst first"""
+    query = {}
+    if collection:
+        query["collection"] = collection
+    if collscan_only:
+        query["collscan"] = True
+    return await db[SLOW_QUERY_COLLECTION].find(query, {"_id": 0}).sort("max_duration_ms", -1).to_list(limit)
@@ -0,0 +1,139 @@
+"""
+Startup-time profiler
+- Import-time breakdown per module (parsed from `python -X importtime`)
+- In-process boot phase marks (imports, startup hooks, warm-up)
+- Cold-start benchmark: time to `import server` in a fresh interpreter
+
+Usage:
+    python startup_profile.py                 # import-time report for server
+    python startup_profile.py --runs 5        # cold-start benchmark
+    python startup_profile.py --runs 5 --save # append result to test_reports/
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+BENCHMARK_FILE = ROOT_DIR.parent / 'test_reports' / 'cold_start_benchmark.json'
+
+# Boot phases recorded by server.py: [(phase, seconds since process start)]
+# server.py imports this module before anything else, so this is taken ahead
+# of the fastapi/motor/pydantic imports it is meant to measure
+_PROCESS_START = time.perf_counter()
+PHASES = []
+
+
+def mark(phase: str) -> float:
+    """Record a boot phase, returns elapsed seconds since this module was imported"""
+    elapsed = round(time.perf_counter() - _PROCESS_START, 4)
+    PHASES.append((phase, elapsed))
+    return elapsed
+
+
+def get_phases() -> list:
+    """Boot phases with per-phase durations"""
+    report = []
+    previous = 0.0
+    for phase, elapsed in PHASES:
+        report.append({"phase": phase, "at": elapsed, "duration": round(elapsed - previous, 4)})
+        previous = elapsed
+    return report
+
+
+def _run_python(code: str, extra_args: list = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *(extra_args or []), "-c", code],
+        cwd=str(ROOT_DIR),
+        capture_output=True,
+        text=True,
+    )
+
+
+def profile_imports(module: str = "server", top: int = 25) -> dict:
+    """Import-time breakdown for `module`, heaviest top-level packages first"""
+    proc = _run_python(f"import {module}", ["-X", "importtime"])
+    self_us = {}
+    cumulative_us = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        package = name.split(".")[0]
+        self_us[package] = self_us.get(package, 0) + int(parts[0])
+        if name == package:
+            # Cumulative time of the package's own top-level import
+            cumulative_us[package] = max(cumulative_us.get(package, 0), int(parts[1]))
+
+    modules = sorted(
+        ({"module": name, "self_ms": round(us / 1000, 2), "cumulative_ms": round(cumulative_us.get(name, 0) / 1000, 2)}
+         for name, us in self_us.items()),
+        key=lambda m: -m["self_ms"],
+    )
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "total_ms": round(sum(self_us.values()) / 1000, 2),
+        "modules": modules[:top],
+    }
+
+
+def benchmark_cold_start(module: str = "server", runs: int = 5) -> dict:
+    """Wall time of `import module` in fresh interpreters (bytecode already cached)"""
+    _run_python(f"import {module}")  # populate __pycache__ so runs are comparable
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = _run_python(f"import {module}")
+        timings.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            return {"module": module, "ok": False, "error": proc.stderr.strip().splitlines()[-1]}
+    return {
+        "module": module,
+        "ok": True,
+        "runs": runs,
+        "min_ms": round(min(timings) * 1000, 1),
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "python": sys.version.split()[0],
+        "measured_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def save_benchmark(result: dict, path: Path = BENCHMARK_FILE):
+    """Append a benchmark result so cold-start time can be tracked over commits"""
+    history = []
+    if path.exists():
+        history = json.loads(path.read_text(encoding="utf-8"))
+    history.append(result)
+    path.write_text(json.dumps(history, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Startup profile / cold-start benchmark")
+    arg_parser.add_argument("--module", default="server")
+    arg_parser.add_argument("--top", type=int, default=25)
+    arg_parser.add_argument("--runs", type=int, default=0, help="run the cold-start benchmark N times")
+    arg_parser.add_argument("--save", action="store_true", help="append the benchmark to test_reports/")
+    args = arg_parser.parse_args()
+
+    if args.runs:
+        result = benchmark_cold_start(args.module, args.runs)
+        print(json.dumps(result, indent=2))
+        if args.save and result["ok"]:
+            save_benchmark(result)
+    else:
+        report = profile_imports(args.module, args.top)
+        if not report["ok"]:
+            print(f"❌ import {args.module} failed: {report['error']}")
+        print(f"Import time for {args.module}: {report['total_ms']} ms")
+        for m in report["modules"]:
+            print(f"  {m['module']:<35} self {m['self_ms']:>9} ms   cumulative {m['cumulative_ms']:>9} ms")
@@ -0,0 +1,200 @@
+"""
+Home timeline for the friends activity feed
+Fan-out on write: publishing an activity copies it into the `timelines` entry of
+the author and each accepted friend, so reading the feed is a single range scan
+on (user_id, created_at, activity_id).
+Fan-out on read: authors with more than FANOUT_LIMIT friends are flagged in
+`high_fanout_authors` and not copied; their recent activities are merged into
+the reader's page at read time.
+Every writer of `social_activities` goes through publish_activity. The feed
+only calls build_timeline() to fill a timeline the first time it is read;
+after that, reads never query `social_activities` for normal authors.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Above this many friends an author's activities are pulled at read time
+FANOUT_LIMIT = int(os.environ.get("TIMELINE_FANOUT_LIMIT", "500"))
+# Activities copied when a timeline is first built or a friendship is accepted
+TIMELINE_BACKFILL = 100
+# Seconds the high-fanout author set is cached in-process
+HIGH_FANOUT_CACHE_TTL = 60
+
+_high_fanout_cache = {"ids": set(), "loaded_at": 0.0}
+
+
+def activity_cursor(activity: dict) -> str:
+    """Keyset cursor of an activity; sorts like (created_at, activity_id)"""
+    return f"{activity['created_at']}|{activity['activity_id']}"
+
+
+def _before_cursor(cursor: str) -> dict:
+    created_at, _, activity_id = cursor.partition("|")
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "activity_id": {"$lt": activity_id}}
+    ]}
+
+
+def _timeline_entry(owner_id: str, activity: dict) -> dict:
+    return {
+        "user_id": owner_id,
+        "activity_id": activity["activity_id"],
+        "author_id": activity["user_id"],
+        "created_at": activity["created_at"],
+        "activity": {k: v for k, v in activity.items() if k != "_id"}
+    }
+
+
+async def ensure_timeline_indexes(db):
+    await db.timelines.create_index([("user_id", 1), ("created_at", -1), ("activity_id", -1)])
+    await db.timelines.create_index([("user_id", 1), ("activity_id", 1)], unique=True)
+    await db.timelines.create_index([("user_id", 1), ("author_id", 1)])
+    await db.timeline_state.create_index("user_id", unique=True)
+    await db.high_fanout_authors.create_index("user_id", unique=True)
+    await db.social_activities.create_index([("user_id", 1), ("created_at", -1)])
+
+
+async def get_friend_ids(db, user_id: str) -> list:
+    friendships = await db.friendships.find(
+        {"$or": [{"user_id": user_id}, {"friend_id": user_id}], "status": "accepted"},
+        {"_id": 0, "user_id": 1, "friend_id": 1}
+    ).to_list(None)
+    return [f["friend_id"] if f["user_id"] == user_id else f["user_id"] for f in friendships]
+
+
+async def get_high_fanout_authors(db) -> set:
+    """Ids of authors served by fan-out on read (small set, cached)"""
+    if time.monotonic() - _high_fanout_cache["loaded_at"] > HIGH_FANOUT_CACHE_TTL:
+        authors = await db.high_fanout_authors.find({}, {"_id": 0, "user_id": 1}).to_list(None)
+        _high_fanout_cache["ids"] = {a["user_id"] for a in authors}
+        _high_fanout_cache["loaded_at"] = time.monotonic()
+    return _high_fanout_cache["ids"]
+
+
+async def _write_entries(db, entries: list):
+    """Idempotent timeline insert (entries already present are skipped)"""
+    if not entries:
+        return
+    try:
+        await db.timelines.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate (user_id, activity_id): the entry already exists
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def publish_activity(db, activity: dict) -> dict:
+    """Store an activity and fan it out to the author's and friends' timelines"""
+    await db.social_activities.insert_one(activity)
+    author_id = activity["user_id"]
+    friend_ids = await get_friend_ids(db, author_id)
+
+    if len(friend_ids) > FANOUT_LIMIT:
+        await db.high_fanout_authors.update_one(
+            {"user_id": author_id},
+            {"$set": {"friends_count": len(friend_ids), "updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+        _high_fanout_cache["ids"].add(author_id)
+        logger.info(f"[Timeline] {author_id} has {len(friend_ids)} friends, served by fan-out on read")
+        owners = [author_id]
+    else:
+        owners = [author_id, *friend_ids]
+
+    await _write_entries(db, [_timeline_entry(owner_id, activity) for owner_id in owners])
+    return {"activity_id": activity["activity_id"], "fanned_out": len(owners)}
+
+
+async def add_author_to_timeline(db, owner_id: str, author_id: str, limit: int = TIMELINE_BACKFILL):
+    """Copy an author's recent activities into a timeline (new friendship)"""
+    if author_id in await get_high_fanout_authors(db):
+        return
+    activities = await db.social_activities.find(
+        {"user_id": author_id}, {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    await _write_entries(db, [_timeline_entry(owner_id, a) for a in activities])
+
+
+async def remove_author_from_timeline(db, owner_id: str, author_id: str):
+    """Drop an author's activities from a timeline (friendship removed)"""
+    await db.timelines.delete_many({"user_id": owner_id, "author_id": author_id})
+
+
+async def build_timeline(db, user_id: str) -> bool:
+    """Fill a user's timeline with friends' recent activities, once; False if already built
+
+    Later activities reach the timeline through publish_activity, and new
+    friendships through add_author_to_timeline.
+    """
+    state = await db.timeline_state.find_one({"user_id": user_id}, {"_id": 0, "built_at": 1})
+    if state and state.get("built_at"):
+        return False
+    friend_ids = await get_friend_ids(db, user_id)
+    high_fanout = await get_high_fanout_authors(db)
+    authors = [user_id, *(f for f in friend_ids if f not in high_fanout)]
+    activities = await db.social_activities.find({"user_id": {"$in": authors}}, {"_id": 0}).sort(
+        "created_at", -1
+    ).limit(TIMELINE_BACKFILL).to_list(TIMELINE_BACKFILL)
+    await _write_entries(db, [_timeline_entry(user_id, a) for a in activities])
+    await db.timeline_state.update_one(
+        {"user_id": user_id},
+        {"$set": {"built_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    return True
+
+
+async def read_timeline(db, user_id: str, limit: int = 30, before: str = None) -> dict:
+    """One page of the friends feed, newest first: {"activities", "next_cursor"}"""
+    query = {"user_id": user_id}
+    if before:
+        query.update(_before_cursor(before))
+
+    high_fanout = await get_high_fanout_authors(db)
+    followed_high_fanout = []
+    if high_fanout:
+        # Only the high-fanout authors this user is friends with
+        candidates = [a for a in high_fanout if a != user_id]
+        links = await db.friendships.find(
+            {"status": "accepted", "$or": [
+                {"user_id": user_id, "friend_id": {"$in": candidates}},
+                {"user_id": {"$in": candidates}, "friend_id": user_id}
+            ]},
+            {"_id": 0, "user_id": 1, "friend_id": 1}
+        ).to_list(None)
+        followed_high_fanout = [l["friend_id"] if l["user_id"] == user_id else l["user_id"] for l in links]
+
+    async def pulled():
+        if not followed_high_fanout:
+            return []
+        pull_query = {"user_id": {"$in": followed_high_fanout}}
+        if before:
+            pull_query.update(_before_cursor(before))
+        return await db.social_activities.find(pull_query, {"_id": 0}).sort(
+            [("created_at", -1), ("activity_id", -1)]
+        ).limit(limit).to_list(limit)
+
+    entries, pulled_activities = await asyncio.gather(
+        db.timelines.find(query, {"_id": 0, "activity": 1}).sort(
+            [("created_at", -1), ("activity_id", -1)]
+        ).limit(limit).to_list(limit),
+        pulled()
+    )
+
+    activities = {e["activity"]["activity_id"]: e["activity"] for e in entries}
+    for activity in pulled_activities:
+        activities.setdefault(activity["activity_id"], activity)
+    page = sorted(activities.values(), key=lambda a: (a["created_at"], a["activity_id"]), reverse=True)[:limit]
+
+    return {
+        "activities": page,
+        "next_cursor": activity_cursor(page[-1]) if len(page) == limit else None
+    }
@@ -0,0 +1,139 @@
+"""
+User analytics primitive
+One aggregation over weight_entries, food_logs and step_logs ($unionWith +
+$facet) returns the scalars reports and dashboards need plus downsampled
+chart series. The payload size is fixed (SERIES_POINTS buckets per series)
+whatever the length of the user's history, and no raw log reaches Python.
+"""
+SERIES_POINTS = 30
+
+
+def analytics_pipeline(user_id: str, series_points: int = SERIES_POINTS) -> list:
+    """Pipeline to run on weight_entries (see get_user_analytics)"""
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$project": {"_id": 0, "kind": {"$literal": "weight"}, "date": 1, "weight": 1}},
+        {"$unionWith": {"coll": "food_logs", "pipeline": [
+            {"$match": {"user_id": user_id}},
+            {"$project": {"_id": 0, "kind": {"$literal": "food"}, "date": 1, "calories": 1}}
+        ]}},
+        {"$unionWith": {"coll": "step_logs", "pipeline": [
+            {"$match": {"user_id": user_id}},
+            {"$project": {"_id": 0, "kind": {"$literal": "steps"}, "date": 1, "steps": 1, "calories_burned": 1}}
+        ]}},
+        {"$facet": {
+            "weight": [
+                {"$match": {"kind": "weight", "weight": {"$type": "number"}}},
+                {"$sort": {"date": 1}},
+                {"$group": {
+                    "_id": None,
+                    "first": {"$first": "$weight"},
+                    "last": {"$last": "$weight"},
+                    "min": {"$min": "$weight"},
+                    "max": {"$max": "$weight"},
+                    "count": {"$sum": 1},
+                    "first_date": {"$first": "$date"},
+                    "last_date": {"$last": "$date"}
+                }}
+            ],
+            "food": [
+                {"$match": {"kind": "food"}},
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "calories": {"$sum": {"$ifNull": ["$calories", 0]}},
+                    "days": {"$addToSet": "$date"}
+                }},
+                {"$project": {"_id": 0, "count": 1, "calories": 1, "days": {"$size": "$days"}}}
+            ],
+            "steps": [
+                {"$match": {"kind": "steps"}},
+                {"$group": {
+                    "_id": None,
+                    "days": {"$sum": 1},
+                    "steps": {"$sum": {"$ifNull": ["$steps", 0]}},
+                    "calories_burned": {"$sum": {"$ifNull": ["$calories_burned", 0]}}
+                }}
+            ],
+            "weight_series": [
+                {"$match": {"kind": "weight", "weight": {"$type": "number"}}},
+                {"$bucketAuto": {
+                    "groupBy": "$date",
+                    "buckets": series_points,
+                    "output": {"date": {"$max": "$date"}, "weight": {"$avg": "$weight"}}
+                }},
+                {"$project": {"_id": 0, "date": 1, "weight": {"$round": ["$weight", 1]}}}
+            ],
+            "steps_series": [
+                {"$match": {"kind": "steps"}},
+                {"$bucketAuto": {
+                    "groupBy": "$date",
+                    "buckets": series_points,
+                    "output": {"date": {"$max": "$date"}, "steps": {"$avg": {"$ifNull": ["$steps", 0]}}}
+                }},
+                {"$project": {"_id": 0, "date": 1, "steps": {"$round": ["$steps", 0]}}}
+            ]
+        }}
+    ]
+
+
+def _bmi(weight, height_cm):
+    if not weight or not height_cm:
+        return 0
+    return round(weight / ((height_cm / 100) ** 2), 1)
+
+
+async def get_user_analytics(db, user_id: str, height_cm: float = None, days_active: int = None,
+                             fallback_weight: float = None, series_points: int = SERIES_POINTS) -> dict:
+    """Weight, nutrition and activity statistics + downsampled series, in one round trip
+
+    height_cm enables BMI values; days_active is the denominator of the average
+    daily calories (defaults to the number of days with food logs);
+    fallback_weight (e.g. the profile weight) is used when no weigh-in exists.
+    """
+    facets = (await db.weight_entries.aggregate(
+        analytics_pipeline(user_id, series_points), allowDiskUse=True
+    ).to_list(1))[0]
+
+    weight = facets["weight"][0] if facets["weight"] else None
+    food = facets["food"][0] if facets["food"] else {"count": 0, "calories": 0, "days": 0}
+    steps = facets["steps"][0] if facets["steps"] else {"days": 0, "steps": 0, "calories_burned": 0}
+
+    if weight:
+        start, current = weight["first"], weight["last"]
+        low, high, entries = weight["min"], weight["max"], weight["count"]
+    else:
+        start = current = low = high = fallback_weight or 0
+        entries = 0
+
+    calorie_days = days_active if days_active is not None else food["days"]
+    return {
+        "weight": {
+            "start": start,
+            "current": current,
+            "change": round(current - start, 1),
+            "min": low,
+            "max": high,
+            "entries_count": entries,
+            "first_date": weight["first_date"] if weight else None,
+            "last_date": weight["last_date"] if weight else None,
+            "bmi_start": _bmi(start, height_cm),
+            "bmi_current": _bmi(current, height_cm)
+        },
+        "nutrition": {
+            "meals_logged": food["count"],
+            "total_calories": food["calories"],
+            "days_logged": food["days"],
+            "avg_daily_calories": round(food["calories"] / max(calorie_days, 1))
+        },
+        "activity": {
+            "days_tracked": steps["days"],
+            "total_steps": steps["steps"],
+            "total_calories_burned": steps["calories_burned"],
+            "avg_daily_steps": round(steps["steps"] / max(steps["days"], 1))
+        },
+        "series": {
+            "weight": facets["weight_series"],
+            "steps": facets["steps_series"]
+        }
+    }
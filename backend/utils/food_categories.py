@@ -0,0 +1,165 @@
+"""
+Shopping list categorizer
+All category keywords are compiled once, at import, into an Aho-Corasick
+automaton: an item name is scanned a single time whatever the number of
+keywords. Like the former keyword lists, a keyword matches anywhere in the
+lowercased name and the first category of CATEGORY_KEYWORDS with a match wins
+("lait de coco" stays in Produits laitiers, not Boissons).
+
+Results are memoized per lowercased name. Microbenchmark against the former
+list scan: `python -m utils.food_categories` (from backend/).
+"""
+from collections import deque
+from functools import lru_cache
+
+DEFAULT_CATEGORY = "📦 Autres"
+
+# In priority order
+CATEGORY_KEYWORDS = (
+    ("🍎 Fruits", (
+        "pomme", "banane", "orange", "citron", "fraise", "framboise", "myrtille", "raisin",
+        "poire", "pêche", "abricot", "cerise", "mangue", "ananas", "kiwi", "melon", "pastèque",
+        "fruit", "agrume", "baie", "clémentine", "mandarine", "prune", "figue"
+    )),
+    ("🥬 Légumes", (
+        "carotte", "tomate", "salade", "laitue", "épinard", "courgette", "aubergine",
+        "poivron", "oignon", "ail", "échalote", "brocoli", "chou", "haricot vert",
+        "petit pois", "asperge", "artichaut", "betterave", "navet", "radis", "céleri",
+        "poireau", "fenouil", "légume", "concombre", "avocat", "champignon", "endive"
+    )),
+    ("🥩 Viandes", (
+        "poulet", "boeuf", "porc", "veau", "agneau", "dinde", "canard", "lapin",
+        "viande", "steak", "escalope", "filet", "côte", "rôti", "saucisse", "jambon",
+        "bacon", "lard", "chorizo", "merguez"
+    )),
+    ("🐟 Poissons", (
+        "saumon", "thon", "cabillaud", "colin", "sole", "bar", "dorade", "truite",
+        "sardine", "maquereau", "crevette", "moule", "huître", "crabe", "homard",
+        "poisson", "fruit de mer", "anchois", "lieu"
+    )),
+    ("🥛 Produits laitiers", (
+        "lait", "fromage", "yaourt", "yogourt", "crème", "beurre", "œuf", "oeuf",
+        "mozzarella", "parmesan", "gruyère", "comté", "camembert", "chèvre", "feta"
+    )),
+    ("🍞 Féculents", (
+        "riz", "pâte", "spaghetti", "tagliatelle", "penne", "pain", "baguette",
+        "pomme de terre", "patate", "quinoa", "boulgour", "semoule", "couscous",
+        "lentille", "pois chiche", "haricot sec", "fève", "céréale", "flocon",
+        "avoine", "blé", "orge", "maïs", "farine", "féculent"
+    )),
+    ("🧂 Épices & Condiments", (
+        "sel", "poivre", "épice", "herbe", "thym", "romarin", "basilic", "persil",
+        "coriandre", "menthe", "cumin", "curry", "paprika", "cannelle", "muscade",
+        "huile", "vinaigre", "moutarde", "ketchup", "mayonnaise", "sauce", "bouillon"
+    )),
+    ("🥤 Boissons", ("eau", "jus", "café", "thé", "lait", "soda", "limonade", "sirop", "boisson")),
+    ("🍫 Sucreries", (
+        "sucre", "chocolat", "bonbon", "gâteau", "biscuit", "cookie", "miel",
+        "confiture", "dessert", "glace", "crème glacée", "pâtisserie", "tarte"
+    )),
+    ("❄️ Surgelés", ("surgelé", "congelé", "glacé")),
+)
+
+CATEGORIZE_CACHE_SIZE = 4096
+
+
+def _build_automaton(categories):
+    """Goto/fail/output tables; output = best (lowest) category index ending at a state"""
+    goto, fail, best = [{}], [0], [None]
+    for priority, (_, keywords) in enumerate(categories):
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                if char not in goto[state]:
+                    goto.append({})
+                    fail.append(0)
+                    best.append(None)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            if best[state] is None or priority < best[state]:
+                best[state] = priority
+
+    # Breadth-first: depth-1 states fail to the root, deeper ones to the
+    # longest proper suffix present in the trie
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, child in goto[state].items():
+            queue.append(child)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[child] = goto[fallback].get(char, 0) if state else 0
+            # Keywords that are suffixes of this one also match here
+            inherited = best[fail[child]]
+            if inherited is not None and (best[child] is None or inherited < best[child]):
+                best[child] = inherited
+    return goto, fail, best
+
+
+_CATEGORY_NAMES = tuple(name for name, _ in CATEGORY_KEYWORDS)
+_GOTO, _FAIL, _BEST = _build_automaton(CATEGORY_KEYWORDS)
+
+
+def _scan(text: str) -> str:
+    goto, fail, best = _GOTO, _FAIL, _BEST
+    state, found = 0, None
+    for char in text:
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        priority = best[state]
+        if priority is not None and (found is None or priority < found):
+            if priority == 0:
+                found = 0
+                break  # Nothing can beat the first category
+            found = priority
+    return _CATEGORY_NAMES[found] if found is not None else DEFAULT_CATEGORY
+
+
+@lru_cache(maxsize=CATEGORIZE_CACHE_SIZE)
+def _categorize_lower(item_lower: str) -> str:
+    return _scan(item_lower)
+
+
+def categorize_food_item(item_name: str) -> str:
+    """Category of a shopping list item ("📦 Autres" when no keyword matches)"""
+    return _categorize_lower((item_name or "").lower())
+
+
+def categorize_food_items(item_names) -> list:
+    """Categories of several items, in order (each distinct name is scanned once)"""
+    return [categorize_food_item(name) for name in item_names]
+
+
+def _reference_categorize(item_name: str) -> str:
+    """Former implementation: scan every keyword list in order"""
+    item_lower = item_name.lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(k in item_lower for k in keywords):
+            return category
+    return DEFAULT_CATEGORY
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    keywords = [k for _, words in CATEGORY_KEYWORDS for k in words]
+    rng = random.Random(42)
+    names = [
+        f"{rng.choice(['', 'filet de ', 'pot de ', 'sachet de '])}{rng.choice(keywords)}"
+        f"{rng.choice(['', ' bio', ' frais', ' en conserve'])}"
+        for _ in range(2000)
+    ] + [f"article {i}" for i in range(500)]
+
+    runs = 20
+    reference = timeit.timeit(lambda: [_reference_categorize(n) for n in names], number=runs)
+    automaton = timeit.timeit(lambda: [_scan(n.lower()) for n in names], number=runs)
+    _categorize_lower.cache_clear()
+    memoized = timeit.timeit(lambda: categorize_food_items(names), number=runs)
+    per_call = 1e6 / (runs * len(names))
+    print(f"{len(names)} names x {runs} runs")
+    print(f"  keyword lists : {reference * per_call:7.2f} µs/item")
+    print(f"  automaton     : {automaton * per_call:7.2f} µs/item")
+    print(f"  memoized batch: {memoized * per_call:7.2f} µs/item")
@@ -0,0 +1,43 @@
+"""
+Prefix tokens for indexed user search
+Names and the email local part are accent-folded, lowercased and split into
+words. Every prefix of every word (2 to MAX_PREFIX chars) is stored in
+`users.search_tokens` (multikey index), so a search is an index lookup:
+each query word must match a stored prefix.
+"""
+import re
+import unicodedata
+
+MIN_PREFIX = 2
+MAX_PREFIX = 15
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip accents ("Élodie" -> "elodie")"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def text_words(text: str) -> list:
+    return _WORD_RE.findall(normalize_text(text))
+
+
+def user_search_tokens(name: str = None, email: str = None) -> list:
+    """All word prefixes of the user's name and email local part"""
+    words = text_words(name or "")
+    if email:
+        words += text_words(email.split("@", 1)[0])
+    tokens = set()
+    for word in words:
+        for length in range(MIN_PREFIX, min(len(word), MAX_PREFIX) + 1):
+            tokens.add(word[:length])
+    return sorted(tokens)
+
+
+def query_tokens(query: str) -> list:
+    """Tokens a query must all match (words shorter than MIN_PREFIX are ignored)"""
+    # Email domains are not indexed, search on the local part only
+    local_part = query.split("@", 1)[0]
+    return sorted({w[:MAX_PREFIX] for w in text_words(local_part) if len(w) >= MIN_PREFIX})
@@ -0,0 +1,21 @@
+"""
+Shopping list quantities
+Used when the same item is added twice (bulk add from a recipe, and the
+unique_shopping_items migration that merges duplicates already stored).
+"""
+import re
+
+_QUANTITY_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(.*?)\s*$")
+
+
+def merge_quantities(current, extra) -> str:
+    """Combine two shopping quantities ("200 g" + "150 g" -> "350 g", else "a + b")"""
+    current, extra = str(current or "").strip(), str(extra or "").strip()
+    if not current or not extra:
+        return current or extra
+    a, b = _QUANTITY_RE.match(current), _QUANTITY_RE.match(extra)
+    if a and b and a.group(2).lower() == b.group(2).lower():
+        total = float(a.group(1).replace(",", ".")) + float(b.group(1).replace(",", "."))
+        amount = int(total) if total.is_integer() else round(total, 2)
+        return f"{amount} {a.group(2)}".strip()
+    return f"{current} + {extra}"
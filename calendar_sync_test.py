@@ -0,0 +1,132 @@
+"""
+Unit tests for the Google Calendar agenda sync (backend/calendar_sync.py) with FakeCalendarService
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import calendar_sync
+from calendar_sync import FakeCalendarService, sync_calendar_events
+
+
+def _event(event_id: str, days: float, **fields) -> dict:
+    start = (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+    return {"id": event_id, "summary": event_id, "start": {"dateTime": start}, **fields}
+
+
+@pytest.fixture
+def calendar_db(fake_db):
+    fake_db.google_calendar_tokens.docs.append({"user_id": "u1"})
+    return fake_db
+
+
+def _sync(db, service):
+    return asyncio.run(sync_calendar_events(db, "u1", service))
+
+
+def _agenda(db) -> list:
+    return sorted(a["google_event_id"] for a in db.appointments.docs)
+
+
+def test_full_sync_copies_the_window_and_stores_the_token(calendar_db):
+    service = FakeCalendarService([_event("soon", 1), _event("later", 60), _event("past", -2)])
+
+    result = _sync(calendar_db, service)
+
+    assert result["mode"] == "full"
+    assert _agenda(calendar_db) == ["soon"]
+    assert "timeMax" in service.calls[0]
+    state = calendar_db.google_calendar_tokens.docs[0]
+    assert state["sync_token"] and state["full_sync_at"]
+
+
+def test_incremental_sync_applies_changes_and_cancellations(calendar_db):
+    service = FakeCalendarService([_event("a", 1), _event("b", 2)])
+    _sync(calendar_db, service)
+
+    service.put(_event("a", 3, summary="moved"))
+    service.put(_event("c", 4))
+    service.cancel("b")
+    result = _sync(calendar_db, service)
+
+    assert result["mode"] == "incremental"
+    assert "syncToken" in service.calls[-1]
+    assert _agenda(calendar_db) == ["a", "c"]
+    assert next(a for a in calendar_db.appointments.docs if a["google_event_id"] == "a")["title"] == "moved"
+
+
+def test_expired_token_falls_back_to_full_sync(calendar_db):
+    service = FakeCalendarService([_event("a", 1), _event("b", 2)])
+    _sync(calendar_db, service)
+    service.expired_tokens.add(calendar_db.google_calendar_tokens.docs[0]["sync_token"])
+    # Deleted while the token was invalid: only a full sync can notice
+    del service.events["b"]
+
+    result = _sync(calendar_db, service)
+
+    assert result["mode"] == "full"
+    assert _agenda(calendar_db) == ["a"]
+
+
+def test_event_entering_the_window_is_picked_up_by_the_periodic_full_sync(calendar_db, monkeypatch):
+    service = FakeCalendarService([_event("far", 31)])
+    _sync(calendar_db, service)
+    assert _agenda(calendar_db) == []
+
+    # A day later the unchanged event is inside the window
+    monkeypatch.setattr(calendar_sync, "SYNC_WINDOW_DAYS", 32)
+    calendar_db.google_calendar_tokens.docs[0]["full_sync_at"] = (
+        datetime.now(timezone.utc) - calendar_sync.FULL_SYNC_INTERVAL
+    ).isoformat()
+    result = _sync(calendar_db, service)
+
+    assert result["mode"] == "full"
+    assert _agenda(calendar_db) == ["far"]
+
+
+def _at_offset(event_id: str, days: float, hours: int) -> dict:
+    """Event whose start is written in a UTC+hours local time"""
+    local = timezone(timedelta(hours=hours))
+    start = (datetime.now(timezone.utc) + timedelta(days=days)).astimezone(local).isoformat()
+    return {"id": event_id, "summary": event_id, "start": {"dateTime": start}}
+
+
+def test_starts_are_compared_in_utc_not_as_text(calendar_db):
+    # Upcoming, but its -10:00 local time sorts before "now" as a string
+    upcoming = _at_offset("upcoming", 1 / 24, -10)
+    # Inside the window, but its +14:00 local date sorts after the window end
+    edge = _at_offset("edge", calendar_sync.SYNC_WINDOW_DAYS - 1 / 24, 14)
+    service = FakeCalendarService([upcoming, edge])
+
+    _sync(calendar_db, service)
+    assert _agenda(calendar_db) == ["edge", "upcoming"]
+    stored = next(a for a in calendar_db.appointments.docs if a["google_event_id"] == "upcoming")
+    assert stored["datetime"] == upcoming["start"]["dateTime"]
+    assert stored["starts_at"].endswith("+00:00")
+
+    # Deleted while the token was invalid: the full sync must still see it as upcoming
+    service.expired_tokens.add(calendar_db.google_calendar_tokens.docs[0]["sync_token"])
+    del service.events["upcoming"]
+    _sync(calendar_db, service)
+
+    assert _agenda(calendar_db) == ["edge"]
+
+
+def test_all_day_events_start_at_midnight_utc(calendar_db):
+    day = (datetime.now(timezone.utc) + timedelta(days=2)).date()
+    service = FakeCalendarService([{"id": "holiday", "summary": "Férié", "start": {"date": day.isoformat()}}])
+
+    _sync(calendar_db, service)
+
+    [stored] = calendar_db.appointments.docs
+    assert stored["datetime"] == day.isoformat()
+    assert stored["starts_at"] == datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def test_calendar_services_must_implement_list_events():
+    class Incomplete(calendar_sync.CalendarService):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
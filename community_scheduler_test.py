@@ -0,0 +1,58 @@
+"""
+Unit tests for the asyncio community automation runner (backend/community_scheduler.py)
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import community_scheduler
+from community_scheduler import CommunityScheduler
+
+
+@pytest.fixture
+def ticks(monkeypatch):
+    runs = []
+
+    async def fake_run(db):
+        runs.append(db)
+        return {"posts_created": 1}
+
+    monkeypatch.setattr(community_scheduler, "run_automated_interactions", fake_run)
+    return runs
+
+
+def test_each_slot_runs_once_across_workers(fake_db, ticks):
+    first, second = CommunityScheduler(fake_db), CommunityScheduler(fake_db)
+    slot = datetime(2026, 1, 5, 6, 30).astimezone()
+
+    async def scenario():
+        results = [await first.run_once(slot), await second.run_once(slot)]
+        # The worker with the longer jitter wakes after the first one released the lease
+        results.append(await second.run_once(slot))
+        results.append(await second.run_once(slot + timedelta(minutes=30)))
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert len(ticks) == 2
+    assert [r.get("reason") for r in results] == [None, "running on another worker", "running on another worker", None]
+    assert (first.metrics["runs"], second.metrics["runs"], second.metrics["skipped_lease"]) == (1, 1, 2)
+
+
+def test_held_lease_blocks_the_next_slot(fake_db, ticks):
+    first, second = CommunityScheduler(fake_db), CommunityScheduler(fake_db)
+    slot = datetime(2026, 1, 5, 6, 30).astimezone()
+    asyncio.run(first._acquire_lease(slot.isoformat()))
+
+    result = asyncio.run(second.run_once(slot + timedelta(minutes=30)))
+
+    assert result["status"] == "skipped"
+    assert ticks == []
+
+
+def test_next_run_time_moves_to_the_next_window():
+    now = datetime(2026, 1, 5, 9, 31).astimezone()
+
+    assert community_scheduler.next_run_time(now) == now.replace(hour=11, minute=0)
+    assert community_scheduler.next_run_time(now.replace(hour=23)) == (now + timedelta(days=1)).replace(hour=6, minute=0)
@@ -0,0 +1,374 @@
+"""
+Shared fixtures for the backend unit tests (*_test.py next to backend_test.py)
+backend_test.py and friends exercise a deployed API over HTTP. The unit tests
+import backend modules directly and run them against FakeDatabase, a small
+in-memory stand-in for the Motor database covering the operators those
+modules use; the `server` fixture does the same for server.py endpoints. Run with: python -m pytest -q *_test.py
+"""
+import copy
+import itertools
+import os
+import re
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _set(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset(doc, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part, {})
+    doc.pop(parts[-1], None)
+
+
+def _compare(value, op, arg):
+    if op == "$eq":
+        return _equals(value, arg)
+    if op == "$ne":
+        return not _equals(value, arg)
+    if op == "$in":
+        return any(_equals(value, a) for a in arg)
+    if op == "$nin":
+        return not any(_equals(value, a) for a in arg)
+    if op == "$all":
+        return all(_equals(value, a) for a in arg)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$type":
+        return arg == "string" and isinstance(value, str) or arg == "number" and isinstance(value, (int, float))
+    if op == "$regex":
+        return isinstance(value, str) and re.search(arg, value) is not None
+    if value is _MISSING or value is None:
+        return False
+    if op == "$lt":
+        return value < arg
+    if op == "$lte":
+        return value <= arg
+    if op == "$gt":
+        return value > arg
+    if op == "$gte":
+        return value >= arg
+    raise NotImplementedError(op)
+
+
+def _equals(value, expected):
+    if expected is None:
+        return value is _MISSING or value is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def matches(doc, query) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            value = _get(doc, key)
+            if not all(_compare(value, op, arg) for op, arg in condition.items()):
+                return False
+        elif not _equals(_get(doc, key), condition):
+            return False
+    return True
+
+
+def apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        for path, value in fields.items():
+            current = _get(doc, path)
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+            elif op == "$max":
+                if current is _MISSING or value > current:
+                    _set(doc, path, value)
+            elif op == "$addToSet":
+                items = [] if current is _MISSING else current
+                if value not in items:
+                    items = items + [value]
+                _set(doc, path, items)
+            elif op == "$push":
+                _set(doc, path, ([] if current is _MISSING else current) + [value])
+            elif op != "$setOnInsert":
+                raise NotImplementedError(op)
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    included = {k for k, v in projection.items() if v and k != "_id"}
+    if included:
+        result = {k: copy.deepcopy(v) for k, v in doc.items() if k in included}
+    else:
+        result = {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    return result
+
+
+def _evaluate(doc, expression):
+    """Aggregation expression limited to "$field" paths, literals, $slice and documents of those"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict) and list(expression) == ["$slice"]:
+        array, n = expression["$slice"]
+        return _evaluate(doc, array)[:n]
+    if isinstance(expression, dict):
+        return {k: _evaluate(doc, v) for k, v in expression.items()}
+    return expression
+
+
+class FakeCursor:
+    def __init__(self, docs, projection=None):
+        self._docs = docs
+        self._projection = projection
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda d: (_get(d, field) is _MISSING, _get(d, field)), reverse=order == -1)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        docs = self._docs if length is None else self._docs[:length]
+        return [_project(d, self._projection) for d in docs]
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.unique_keys = []  # list of field tuples
+        self._ids = itertools.count(1)
+
+    def create_unique(self, *fields):
+        self.unique_keys.append(fields)
+
+    def _check_unique(self, doc, ignore=None):
+        for fields in [("_id",), *self.unique_keys]:
+            values = tuple(_get(doc, f) for f in fields)
+            if _MISSING in values:
+                continue
+            for other in self.docs:
+                if other is not ignore and tuple(_get(other, f) for f in fields) == values:
+                    raise DuplicateKeyError(f"E11000 duplicate key {self.name} {values}", 11000)
+
+    def _insert(self, doc):
+        doc.setdefault("_id", next(self._ids))
+        stored = copy.deepcopy(doc)
+        self._check_unique(stored)
+        self.docs.append(stored)
+        return doc["_id"]
+
+    async def insert_one(self, doc):
+        return SimpleNamespace(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs, ordered=True):
+        inserted, errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert(doc))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        docs = await cursor.to_list(1)
+        return docs[0] if docs else None
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([d for d in self.docs if matches(d, query or {})], projection)
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs if matches(d, query))
+
+    def _upsert_doc(self, query, update):
+        doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+        apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if matches(doc, query):
+                before = copy.deepcopy(doc)
+                apply_update(doc, update)
+                self._check_unique(doc, ignore=doc)
+                return SimpleNamespace(matched_count=1, modified_count=int(before != doc), upserted_id=None)
+        if upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=self._upsert_doc(query, update))
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update):
+        modified = 0
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, update)
+                modified += 1
+        return SimpleNamespace(matched_count=modified, modified_count=modified)
+
+    async def find_one_and_update(self, query, update, return_document=None, projection=None, upsert=False):
+        for doc in self.docs:
+            if matches(doc, query):
+                before = _project(doc, projection)
+                apply_update(doc, update)
+                return _project(doc, projection) if return_document else before
+        if upsert:
+            _id = self._upsert_doc(query, update)
+            return _project(next(d for d in self.docs if d["_id"] == _id), projection) if return_document else None
+        return None
+
+    async def delete_one(self, query):
+        for doc in self.docs:
+            if matches(doc, query):
+                self.docs.remove(doc)
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def delete_many(self, query):
+        kept = [d for d in self.docs if not matches(d, query)]
+        deleted = len(self.docs) - len(kept)
+        self.docs = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted = modified = deleted = 0
+        for op in operations:
+            kind = type(op).__name__
+            if kind == "UpdateOne":
+                result = await self.update_one(op._filter, op._doc, upsert=op._upsert)
+                upserted += result.upserted_id is not None
+                modified += result.modified_count
+            elif kind == "UpdateMany":
+                modified += (await self.update_many(op._filter, op._doc)).modified_count
+            elif kind == "DeleteOne":
+                deleted += (await self.delete_one(op._filter)).deleted_count
+            elif kind == "DeleteMany":
+                deleted += (await self.delete_many(op._filter)).deleted_count
+            elif kind == "InsertOne":
+                self._insert(op._doc)
+            else:
+                raise NotImplementedError(kind)
+        return SimpleNamespace(upserted_count=upserted, modified_count=modified, deleted_count=deleted)
+
+    def aggregate(self, pipeline, **kwargs):
+        docs = [copy.deepcopy(d) for d in self.docs]
+        for stage in pipeline:
+            (op, arg), = stage.items()
+            if op == "$match":
+                docs = [d for d in docs if matches(d, arg)]
+            elif op == "$sort":
+                docs = FakeCursor(docs).sort(list(arg.items()))._docs
+            elif op == "$group":
+                groups = {}
+                for d in docs:
+                    key = _evaluate(d, arg["_id"])
+                    hashable = tuple(sorted(key.items())) if isinstance(key, dict) else key
+                    group = groups.setdefault(hashable, {"_id": key})
+                    for name, acc in arg.items():
+                        if name == "_id":
+                            continue
+                        (acc_op, acc_arg), = acc.items()
+                        if acc_op == "$sum":
+                            group[name] = group.get(name, 0) + _evaluate(d, acc_arg)
+                        elif acc_op == "$push":
+                            group.setdefault(name, []).append(_evaluate(d, acc_arg))
+                        else:
+                            raise NotImplementedError(acc_op)
+                docs = list(groups.values())
+            elif op == "$project":
+                docs = [
+                    {
+                        name: d.get(name) if spec in (1, True) else _evaluate(d, spec)
+                        for name, spec in arg.items() if spec not in (0, False)
+                    } | ({"_id": d["_id"]} if arg.get("_id", 1) and "_id" in d else {})
+                    for d in docs
+                ]
+            else:
+                raise NotImplementedError(op)
+        return FakeCursor(docs)
+
+    async def drop_index(self, name):
+        pass
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        if unique:
+            fields = (keys,) if isinstance(keys, str) else tuple(k for k, _ in keys)
+            self.create_unique(*fields)
+        return "index"
+
+
+class FakeDatabase:
+    """Collections are created on first access, like Motor"""
+
+    def __init__(self):
+        self._collections = {}
+        self.client = self
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def server(fake_db, monkeypatch):
+    """backend/server.py with its database swapped for fake_db (endpoints are called as plain coroutines)"""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "unit_tests")
+    import server as server_module
+    monkeypatch.setattr(server_module, "db", fake_db)
+    return server_module
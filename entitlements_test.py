@@ -0,0 +1,58 @@
+"""
+Unit tests for the premium entitlement cache (backend/entitlements.py)
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import entitlements
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(entitlements, "_cache", {})
+
+
+def _subscribe(db, user_id: str, days: float = 30):
+    expiry = datetime.now(timezone.utc) + timedelta(days=days)
+    db.premium_subscriptions.docs.append({"user_id": user_id, "status": "active", "expiry_date": expiry.isoformat()})
+
+
+def _age(user_id: str, seconds: float):
+    entitlements._cache[user_id]["loaded_at"] -= seconds
+
+
+def test_active_entitlement_is_served_from_cache(fake_db):
+    _subscribe(fake_db, "u1")
+    assert asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+    # Removed behind the cache's back: still cached until ENTITLEMENT_TTL
+    fake_db.premium_subscriptions.docs.clear()
+    _age("u1", entitlements.ENTITLEMENT_NEGATIVE_TTL + 1)
+    assert asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+    _age("u1", entitlements.ENTITLEMENT_TTL)
+    assert not asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+
+def test_purchase_on_another_worker_is_seen_after_the_negative_ttl(fake_db):
+    assert not asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+    # Bought through another process: no local invalidate()
+    _subscribe(fake_db, "u1")
+    assert not asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+    _age("u1", entitlements.ENTITLEMENT_NEGATIVE_TTL + 1)
+    assert asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+
+def test_expired_entry_uses_the_negative_ttl(fake_db):
+    _subscribe(fake_db, "u1", days=-1)
+    assert not asyncio.run(entitlements.is_premium(fake_db, "u1"))
+
+    # Renewed elsewhere
+    fake_db.premium_subscriptions.docs.clear()
+    _subscribe(fake_db, "u1")
+    _age("u1", entitlements.ENTITLEMENT_NEGATIVE_TTL + 1)
+    assert asyncio.run(entitlements.is_premium(fake_db, "u1"))
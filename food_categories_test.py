@@ -0,0 +1,59 @@
+"""
+Unit tests for the shopping list categorizer (backend/utils/food_categories.py)
+The automaton must categorize exactly like the former keyword-list scan.
+"""
+import random
+
+import pytest
+
+from utils.food_categories import (
+    CATEGORY_KEYWORDS, DEFAULT_CATEGORY, _reference_categorize, categorize_food_item, categorize_food_items
+)
+
+KEYWORDS = [k for _, words in CATEGORY_KEYWORDS for k in words]
+
+
+def _generated_names(count=3000, seed=42):
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        words = rng.sample(KEYWORDS, rng.choice([1, 1, 2, 3]))
+        name = f"{rng.choice(['', 'filet de ', 'pot de ', 'sachet de '])}{' et '.join(words)}"
+        name += rng.choice(['', ' bio', ' frais', ' en conserve', ' SURGELÉ'])
+        names.append(name.upper() if rng.random() < 0.1 else name)
+    # Keyword fragments and concatenations exercise the automaton's fail links
+    names += [k[:-1] for k in KEYWORDS] + [a + b for a, b in zip(KEYWORDS, reversed(KEYWORDS))]
+    return names + [f"article {i}" for i in range(200)]
+
+
+def test_automaton_matches_the_keyword_scan_on_generated_names():
+    names = _generated_names()
+
+    mismatches = [(n, categorize_food_item(n), _reference_categorize(n)) for n in names
+                  if categorize_food_item(n) != _reference_categorize(n)]
+
+    assert not mismatches, mismatches[:10]
+
+
+@pytest.mark.parametrize("name, category", [
+    # Matches both Produits laitiers ("lait") and Boissons ("lait"): the earlier category wins
+    ("lait de coco", "🥛 Produits laitiers"),
+    # "pomme" (Fruits) comes before "pomme de terre" (Féculents), as with the keyword lists
+    ("pomme de terre", "🍎 Fruits"),
+    ("Pommes de terre", "🍎 Fruits"),
+    ("filet de saumon", "🥩 Viandes"),
+    ("crème glacée", "🥛 Produits laitiers"),
+    ("petit pois surgelés", "🥬 Légumes"),
+    ("pizza surgelée", "❄️ Surgelés"),
+    ("", DEFAULT_CATEGORY),
+    (None, DEFAULT_CATEGORY),
+    ("article inconnu", DEFAULT_CATEGORY),
+])
+def test_first_category_with_a_match_wins(name, category):
+    assert categorize_food_item(name) == category
+    if name is not None:
+        assert _reference_categorize(name) == category
+
+
+def test_batch_keeps_the_input_order():
+    assert categorize_food_items(["thon", "riz", "thon"]) == ["🐟 Poissons", "🍞 Féculents", "🐟 Poissons"]
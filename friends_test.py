@@ -0,0 +1,72 @@
+"""
+Unit tests for the batched friend lookups (GET /social/friends, /social/friends/requests)
+"""
+import asyncio
+
+import pytest
+
+ME = {"user_id": "me", "name": "Moi"}
+
+
+def _friendship(friendship_id, user_id, friend_id, status="accepted"):
+    return {"friendship_id": friendship_id, "user_id": user_id, "friend_id": friend_id, "status": status,
+            "created_at": f"2026-01-0{friendship_id[-1]}", "accepted_at": "2026-02-01"}
+
+
+@pytest.fixture
+def lookups(fake_db, monkeypatch):
+    """Number of find() calls per collection"""
+    calls = {}
+    for name in ("users", "user_points", "friendships"):
+        collection = fake_db[name]
+
+        def counted(*args, _find=collection.find, _name=name, **kwargs):
+            calls[_name] = calls.get(_name, 0) + 1
+            return _find(*args, **kwargs)
+        monkeypatch.setattr(collection, "find", counted)
+    monkeypatch.setattr(fake_db.users, "find_one", None)  # a per-friend lookup would fail loudly
+    return calls
+
+
+@pytest.fixture
+def social(fake_db):
+    fake_db.users.docs += [{"user_id": f"u{i}", "name": f"Ami {i}", "picture": f"{i}.png", "email": "x"}
+                           for i in range(1, 7)]
+    fake_db.user_points.docs += [{"user_id": "u1", "total_points": 120}, {"user_id": "u2", "total_points": 40}]
+    fake_db.friendships.docs += [
+        _friendship("f1", "me", "u1"),
+        _friendship("f2", "u2", "me"),
+        _friendship("f3", "me", "u3"),
+        _friendship("f4", "u4", "me", status="pending"),
+        _friendship("f5", "me", "u5", status="pending"),
+        _friendship("f6", "u6", "u1"),  # not mine
+        _friendship("f7", "me", "deleted"),  # friend account gone
+    ]
+    return fake_db
+
+
+def test_friends_list_uses_one_lookup_per_collection(server, social, lookups):
+    result = asyncio.run(server.get_friends(user=ME))
+
+    assert result["count"] == 3
+    assert [(f["user_id"], f["name"], f["total_points"]) for f in result["friends"]] == [
+        ("u1", "Ami 1", 120), ("u2", "Ami 2", 40), ("u3", "Ami 3", 0),
+    ]
+    assert result["friends"][0]["friendship_id"] == "f1"
+    assert result["friends"][0]["since"] == "2026-02-01"
+    assert lookups == {"friendships": 1, "users": 1, "user_points": 1}
+
+
+def test_requests_resolve_both_directions_in_one_user_lookup(server, social, lookups):
+    result = asyncio.run(server.get_friend_requests(user=ME))
+
+    assert [(r["user_id"], r["name"], r["sent_at"]) for r in result["received"]] == [("u4", "Ami 4", "2026-01-04")]
+    assert [(s["user_id"], s["picture"]) for s in result["sent"]] == [("u5", "5.png")]
+    assert lookups == {"friendships": 2, "users": 1}
+
+
+def test_no_friends_means_no_user_lookup(server, fake_db, lookups):
+    result = asyncio.run(server.get_friend_requests(user=ME))
+
+    assert result == {"received": [], "sent": []}
+    assert "users" not in lookups
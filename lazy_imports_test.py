@@ -0,0 +1,75 @@
+"""
+Unit tests for lazy module handles and warm-up hooks (backend/lazy_imports.py)
+"""
+import asyncio
+import sys
+import threading
+
+import pytest
+
+import lazy_imports
+from lazy_imports import lazy_import, register_warmup, run_warmups
+
+
+@pytest.fixture(autouse=True)
+def warmups(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(lazy_imports, "_WARMUPS", registry)
+    return registry
+
+
+@pytest.fixture
+def unimported(monkeypatch):
+    # A stdlib module the test process has not necessarily imported yet
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    return "colorsys"
+
+
+def test_module_is_imported_on_first_attribute_access(unimported):
+    module = lazy_import(unimported, warm=False)
+
+    assert not module.loaded
+    assert unimported not in sys.modules
+    assert module.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+    assert module.loaded
+    assert module.load() is sys.modules[unimported]
+    assert "loaded" in repr(module)
+
+
+def test_missing_module_fails_on_use_not_on_declaration():
+    module = lazy_import("not_an_installed_package", warm=False)
+
+    with pytest.raises(ImportError):
+        module.anything
+    assert not module.loaded
+
+
+def test_lazy_import_registers_a_warm_up_unless_told_not_to(warmups, unimported):
+    lazy_import(unimported)
+    lazy_import("json", warm=False)
+
+    assert list(warmups) == [f"import:{unimported}"]
+
+
+def test_warm_ups_preload_modules_off_the_event_loop(unimported):
+    module = lazy_import(unimported)
+    threads = []
+    register_warmup("custom", lambda: threads.append(threading.current_thread()))
+
+    results = asyncio.run(run_warmups())
+
+    assert module.loaded
+    assert set(results) == {f"import:{unimported}", "custom"}
+    assert all(isinstance(seconds, float) for seconds in results.values())
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_a_failing_warm_up_does_not_stop_the_others():
+    ran = []
+    lazy_import("not_an_installed_package")
+    register_warmup("after", lambda: ran.append(True))
+
+    results = asyncio.run(run_warmups())
+
+    assert results["import:not_an_installed_package"].startswith("error:")
+    assert ran == [True]
@@ -0,0 +1,78 @@
+"""
+Unit tests for the message history and read watermark (backend/server.py messaging endpoints)
+"""
+import asyncio
+
+import pytest
+
+ALICE = {"user_id": "alice", "name": "Alice"}
+BOB = {"user_id": "bob", "name": "Bob"}
+
+
+@pytest.fixture
+def chat(server, fake_db):
+    fake_db.users.docs.extend([dict(ALICE), dict(BOB)])
+
+    def send(sender, recipient, n):
+        for i in range(n):
+            asyncio.run(server.send_message({"recipient_id": recipient["user_id"], "content": f"{sender['name']} {i}"}, user=sender))
+
+    return send
+
+
+def _summary(db, user_id):
+    return next(s for s in db.conversation_summaries.docs if s["user_id"] == user_id)
+
+
+def _read(server, **params):
+    return asyncio.run(server.get_messages("bob", user=ALICE, **{"limit": 50, "before": None, "after": None, **params}))
+
+
+def test_reading_the_newest_page_clears_the_unread_count(server, fake_db, chat):
+    chat(BOB, ALICE, 3)
+    assert _summary(fake_db, "alice")["unread_count"] == 3
+
+    page = _read(server)
+
+    assert [m["content"] for m in page["messages"]] == ["Bob 0", "Bob 1", "Bob 2"]
+    assert _summary(fake_db, "alice")["unread_count"] == 0
+
+
+def test_partial_page_keeps_newer_messages_unread(server, fake_db, chat):
+    chat(BOB, ALICE, 5)
+    newest = server.message_cursor(fake_db.messages.docs[-1])
+
+    older = _read(server, limit=4, before=newest)
+    assert [m["content"] for m in older["messages"]] == ["Bob 0", "Bob 1", "Bob 2", "Bob 3"]
+    assert _summary(fake_db, "alice")["unread_count"] == 1
+
+    _read(server, after=older["after"])
+    assert _summary(fake_db, "alice")["unread_count"] == 0
+
+
+def test_unread_count_only_counts_messages_from_the_partner(server, fake_db, chat):
+    chat(BOB, ALICE, 2)
+    chat(ALICE, BOB, 1)
+    chat(BOB, ALICE, 1)
+    messages = _read(server, limit=2)["messages"]
+
+    assert [m["content"] for m in messages] == ["Alice 0", "Bob 0"]
+    assert _summary(fake_db, "alice")["unread_count"] == 0
+    assert _summary(fake_db, "bob")["unread_count"] == 1
+
+
+def test_message_sent_while_counting_stays_unread(server, fake_db, chat, monkeypatch):
+    chat(BOB, ALICE, 2)
+    count_documents = fake_db.messages.count_documents
+    sent = []
+
+    async def send_while_counting(query):
+        count = await count_documents(query)
+        if not sent:
+            sent.append(await server.send_message({"recipient_id": "alice", "content": "late"}, user=BOB))
+        return count
+
+    monkeypatch.setattr(fake_db.messages, "count_documents", send_while_counting)
+    _read(server)
+
+    assert _summary(fake_db, "alice")["unread_count"] == 1
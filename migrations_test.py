@@ -0,0 +1,153 @@
+"""
+Unit tests for the one-time migrations runner (backend/migrations.py)
+"""
+import asyncio
+
+import migrations
+
+
+def test_migration_runs_once(fake_db):
+    calls = []
+
+    async def backfill(db):
+        calls.append(1)
+        return len(calls)
+
+    registry = [("backfill", backfill)]
+    assert asyncio.run(migrations.run_migrations(fake_db, registry)) == 1
+    assert asyncio.run(migrations.run_migrations(fake_db, registry)) == 1
+
+    assert calls == [1]
+    doc = fake_db.migrations.docs[0]
+    assert doc["status"] == "completed"
+    assert doc["result"] == 1
+
+
+def test_failed_migration_stops_the_run_and_is_retried(fake_db):
+    attempts = []
+
+    async def flaky(db):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    async def after(db):
+        return "after"
+
+    registry = [("flaky", flaky), ("after", after)]
+    assert asyncio.run(migrations.run_migrations(fake_db, registry)) == 0
+    assert [d["status"] for d in fake_db.migrations.docs] == ["failed"]
+
+    assert asyncio.run(migrations.run_migrations(fake_db, registry)) == 2
+    assert [d["status"] for d in fake_db.migrations.docs] == ["completed", "completed"]
+    assert "error" not in fake_db.migrations.docs[0]
+
+
+def test_post_counters_backfill(fake_db):
+    fake_db.social_posts.docs.extend([
+        {"post_id": "p1"},
+        {"post_id": "p2"},
+        {"post_id": "p3", "likes_count": 7, "comments_count": 1},
+    ])
+    fake_db.post_likes.docs.extend([{"post_id": "p1", "user_id": "a"}, {"post_id": "p1", "user_id": "b"}])
+    fake_db.post_comments.docs.append({"post_id": "p2", "user_id": "a"})
+
+    assert asyncio.run(migrations.backfill_post_counters(fake_db, batch_size=1)) == 2
+
+    counters = {p["post_id"]: (p["likes_count"], p["comments_count"]) for p in fake_db.social_posts.docs}
+    assert counters == {"p1": (2, 0), "p2": (0, 1), "p3": (7, 1)}
+
+
+def test_user_search_tokens_backfill(fake_db):
+    fake_db.users.docs.extend([
+        {"user_id": "u1", "name": "Léa Martin", "email": "lea@example.com"},
+        {"user_id": "u2", "name": "Old", "search_tokens": ["old"]},
+    ])
+
+    assert asyncio.run(migrations.backfill_user_search_tokens(fake_db)) == 1
+
+    assert "lea" in fake_db.users.docs[0]["search_tokens"]
+    assert fake_db.users.docs[1]["search_tokens"] == ["old"]
+
+
+def test_friendship_pair_keys_dedupes_and_makes_pair_key_unique(fake_db):
+    fake_db.friendships.docs.extend([
+        {"_id": 1, "user_id": "b", "friend_id": "a", "status": "pending", "created_at": "2024-01-01"},
+        {"_id": 2, "user_id": "a", "friend_id": "b", "status": "accepted", "created_at": "2024-02-01"},
+        {"_id": 3, "pair_key": "a:b", "user_id": "a", "friend_id": "b", "status": "accepted", "created_at": "2024-03-01"},
+        {"_id": 4, "user_id": "c", "friend_id": "a", "status": "pending", "created_at": "2024-01-01"},
+    ])
+
+    result = asyncio.run(migrations.unique_friendship_pair_keys(fake_db, batch_size=2))
+
+    assert result == {"keyed": 3, "duplicates_removed": 2}
+    assert {f["_id"]: f["pair_key"] for f in fake_db.friendships.docs} == {2: "a:b", 4: "a:c"}
+    assert ("pair_key",) in fake_db.friendships.unique_keys
+
+
+def test_unique_post_likes_removes_duplicates_and_fixes_counters(fake_db):
+    fake_db.post_likes.docs.extend([
+        {"_id": 1, "user_id": "a", "post_id": "p1"},
+        {"_id": 2, "user_id": "a", "post_id": "p1"},
+        {"_id": 3, "user_id": "b", "post_id": "p1"},
+        {"_id": 4, "user_id": "a", "post_id": "p2"},
+    ])
+    fake_db.social_posts.docs.extend([
+        {"post_id": "p1", "likes_count": 3},
+        {"post_id": "p2", "likes_count": 1},
+    ])
+
+    assert asyncio.run(migrations.unique_post_likes(fake_db)) == {"duplicates_removed": 1}
+
+    assert [like["_id"] for like in fake_db.post_likes.docs] == [1, 3, 4]
+    assert [post["likes_count"] for post in fake_db.social_posts.docs] == [2, 1]
+    assert ("user_id", "post_id") in fake_db.post_likes.unique_keys
+
+
+def test_unique_report_jobs_keeps_the_newest_job(fake_db):
+    fake_db.report_jobs.docs.extend([
+        {"_id": 1, "user_id": "a", "version": "v1", "created_at": "2026-01-01"},
+        {"_id": 2, "user_id": "a", "version": "v1", "created_at": "2026-01-03"},
+        {"_id": 3, "user_id": "a", "version": "v2", "created_at": "2026-01-02"},
+    ])
+
+    assert asyncio.run(migrations.unique_report_jobs(fake_db)) == {"duplicates_removed": 1}
+
+    assert sorted(job["_id"] for job in fake_db.report_jobs.docs) == [2, 3]
+    assert ("user_id", "version") in fake_db.report_jobs.unique_keys
+
+
+def test_unique_google_appointments_keeps_one_copy_per_event(fake_db):
+    fake_db.appointments.docs.extend([
+        {"_id": 1, "user_id": "a", "google_event_id": "g1", "updated_at": "2026-01-01"},
+        {"_id": 2, "user_id": "a", "google_event_id": "g1", "updated_at": "2026-01-02"},
+        {"_id": 3, "user_id": "a", "title": "manual"},
+        {"_id": 4, "user_id": "a", "title": "manual"},
+    ])
+
+    assert asyncio.run(migrations.unique_google_appointments(fake_db)) == {"duplicates_removed": 1}
+
+    assert sorted(a["_id"] for a in fake_db.appointments.docs) == [2, 3, 4]
+    assert ("user_id", "google_event_id") in fake_db.appointments.unique_keys
+
+
+def test_unique_shopping_items_merges_quantities_into_the_oldest_entry(fake_db):
+    fake_db.shopping_list.docs.extend([
+        {"_id": 1, "user_id": "a", "item": "riz", "quantity": "150 g", "added_at": "2026-01-02"},
+        {"_id": 2, "user_id": "a", "item": "riz", "quantity": "200 g", "added_at": "2026-01-01"},
+        {"_id": 3, "user_id": "a", "item": "riz", "added_at": "2026-01-03"},
+        {"_id": 4, "user_id": "b", "item": "riz", "quantity": "1 kg", "added_at": "2026-01-01"},
+    ])
+
+    assert asyncio.run(migrations.unique_shopping_items(fake_db)) == {"duplicates_removed": 2}
+
+    assert {i["_id"]: i["quantity"] for i in fake_db.shopping_list.docs} == {2: "350 g", 4: "1 kg"}
+    assert ("user_id", "item") in fake_db.shopping_list.unique_keys
+
+
+def test_ensure_indexes_creates_the_unique_indexes(server, fake_db):
+    asyncio.run(server.ensure_indexes())
+
+    assert ("user_id", "program_id", "program_slot") in fake_db.appointments.unique_keys
+    assert ("migration_id",) in fake_db.migrations.unique_keys
@@ -0,0 +1,72 @@
+"""
+Unit tests for the unread notification counter (server.py notifications endpoints)
+"""
+import asyncio
+
+import pytest
+
+ALICE = {"user_id": "alice", "name": "Alice", "picture": "a.png"}
+BOB = {"user_id": "bob", "name": "Bob"}
+
+
+@pytest.fixture
+def notify(server):
+    def notify(content="a aimé votre publication", from_user=ALICE):
+        return asyncio.run(server.create_notification(
+            "bob", "like", content, from_user_id=from_user["user_id"], from_user=from_user
+        ))
+    return notify
+
+
+def _unread(server) -> int:
+    return asyncio.run(server.get_notifications_unread_count(user=BOB))["unread_count"]
+
+
+def _read(server, notification_ids=()):
+    asyncio.run(server.mark_notifications_read({"notification_ids": list(notification_ids)}, user=BOB))
+
+
+def test_counter_follows_create_read_and_mark_all(server, notify, fake_db):
+    first = notify()
+    notify()
+    notify()
+    assert _unread(server) == 3
+    assert first["from_user_name"] == "Alice" and first["from_user_picture"] == "a.png"
+
+    _read(server, [first["notification_id"]])
+    # Already read and foreign ids do not move the counter
+    _read(server, [first["notification_id"], "notif_other"])
+    assert _unread(server) == 2
+
+    _read(server)
+    assert _unread(server) == 0
+    assert all(n["read"] for n in fake_db.notifications.docs)
+
+    notify()
+    listing = asyncio.run(server.get_notifications(user=BOB))
+    assert listing["unread_count"] == 1
+    assert len(listing["notifications"]) == 4
+
+
+def test_counter_is_initialized_from_existing_notifications(server, notify, fake_db):
+    fake_db.notifications.docs += [
+        {"notification_id": "old_1", "user_id": "bob", "read": False, "created_at": "2026-01-01"},
+        {"notification_id": "old_2", "user_id": "bob", "read": True, "created_at": "2026-01-02"},
+    ]
+
+    notify()
+
+    assert fake_db.notification_counters.docs[0]["unread"] == 2
+    assert _unread(server) == 2
+
+
+def test_older_notifications_get_the_actor_from_one_lookup(server, fake_db):
+    fake_db.users.docs.append({**ALICE})
+    fake_db.notifications.docs.append({
+        "notification_id": "old", "user_id": "bob", "type": "like", "from_user_id": "alice",
+        "read": False, "created_at": "2026-01-01",
+    })
+
+    [notification] = asyncio.run(server.get_notifications(user=BOB))["notifications"]
+
+    assert (notification["from_user_name"], notification["from_user_picture"]) == ("Alice", "a.png")
@@ -0,0 +1,103 @@
+"""
+Unit tests for the push dispatch queue (backend/notifications.py) with FakePushSender
+"""
+import asyncio
+
+import pytest
+
+import notifications
+from notifications import FakePushSender, PushDispatcher, build_payload
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(notifications, "PUSH_BACKOFF_BASE", 0)
+
+
+def _dispatch(sender, tokens, pruner=None, workers=2):
+    async def scenario():
+        dispatcher = PushDispatcher(sender, workers=workers)
+        if pruner:
+            dispatcher.set_pruner(pruner)
+        try:
+            result = await dispatcher.enqueue(tokens, build_payload("Titre", "Texte"))
+        finally:
+            await dispatcher.stop()
+        return result, dispatcher.metrics
+
+    return asyncio.run(scenario())
+
+
+def test_tokens_are_deduplicated_and_sent_in_multicast_batches(monkeypatch):
+    monkeypatch.setattr(notifications, "FCM_MULTICAST_LIMIT", 2)
+    sender = FakePushSender()
+
+    result, metrics = _dispatch(sender, ["t1", "t2", "t1", "", "t3", "t4", "t5"])
+
+    assert result == {"success": 5, "failure": 0, "pruned": 0}
+    assert sorted(len(batch) for batch in sender.batches) == [1, 2, 2]
+    assert metrics["batches"] == 3
+
+
+def test_transient_failures_are_retried_with_backoff(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(notifications, "PUSH_BACKOFF_BASE", 1)
+    monkeypatch.setattr(notifications.random, "uniform", lambda a, b: 0)
+    monkeypatch.setattr(notifications.asyncio, "sleep", fake_sleep)
+    sender = FakePushSender(transient_failures=2)
+
+    result, metrics = _dispatch(sender, ["t1", "t2"], workers=1)
+
+    assert result == {"success": 2, "failure": 0, "pruned": 0}
+    assert len(sender.batches) == 3
+    assert delays == [1, 2]
+    assert metrics["retried"] == 4
+
+
+def test_retries_stop_after_max_attempts():
+    sender = FakePushSender(transient_failures=10)
+
+    result, _ = _dispatch(sender, ["t1"])
+
+    assert result == {"success": 0, "failure": 1, "pruned": 0}
+    assert len(sender.batches) == notifications.PUSH_MAX_ATTEMPTS
+
+
+def test_unregistered_tokens_are_pruned():
+    pruned = []
+
+    async def pruner(tokens):
+        pruned.extend(tokens)
+
+    result, _ = _dispatch(FakePushSender(unregistered={"dead"}), ["ok", "dead"], pruner=pruner)
+
+    assert result == {"success": 1, "failure": 1, "pruned": 1}
+    assert pruned == ["dead"]
+
+
+def test_set_push_sender_keeps_the_dispatcher_and_its_pruner(monkeypatch):
+    monkeypatch.setattr(notifications, "_dispatcher", None)
+    first = notifications.set_push_sender(FakePushSender())
+
+    async def pruner(tokens):
+        pass
+
+    notifications.set_token_pruner(pruner)
+    replacement = FakePushSender()
+    dispatcher = notifications.set_push_sender(replacement)
+
+    assert dispatcher is first
+    assert dispatcher.sender is replacement
+    assert dispatcher._pruner is pruner
+
+
+def test_senders_must_implement_send_batch():
+    class Incomplete(notifications.PushSender):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,125 @@
+"""
+Unit tests for the progress report cache and jobs (backend/pdf_report.py)
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import pdf_report
+
+
+def _report(days_active=10, meals=3) -> dict:
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "user": {"name": "Léa", "created_at": "2026-01-01", "days_active": days_active},
+        "profile": {"height": 165, "goal": "lose"},
+        "weight_progress": {"start_weight": 80, "current_weight": 75, "entries": [{"weight": 80}, {"weight": 75}]},
+        "nutrition_stats": {"total_meals_logged": meals, "avg_daily_calories": 1800 / days_active},
+        "activity_stats": {"total_steps": 12000},
+    }
+
+
+@pytest.fixture(autouse=True)
+def thread_pool(monkeypatch):
+    # Render in the default thread pool instead of spawning processes
+    monkeypatch.setattr(pdf_report, "_get_pool", lambda: None)
+
+
+def test_version_ignores_values_that_only_move_with_the_date():
+    assert pdf_report.report_version(_report(days_active=10)) == pdf_report.report_version(_report(days_active=11))
+    assert pdf_report.report_version(_report(meals=3)) != pdf_report.report_version(_report(meals=4))
+
+
+def test_renders_once_then_serves_the_cache_without_aggregating(fake_db):
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return _report()
+
+    async def scenario():
+        job = await pdf_report.create_report_job(fake_db, "u1", build)
+        await asyncio.gather(*list(pdf_report._RUNNING.values()))
+        again = await pdf_report.create_report_job(fake_db, "u1", build)
+        return job, again
+
+    job, again = asyncio.run(scenario())
+
+    assert job["status"] == "running"
+    assert again["cached"] is True and again["version"] == job["version"]
+    assert builds == [1]
+    cached = fake_db.report_cache.docs[0]
+    assert cached["pdf"].startswith(b"%PDF-1.4")
+    assert fake_db.report_jobs.docs[0]["status"] == "completed"
+
+
+def _render(db, build):
+    async def scenario():
+        job = await pdf_report.create_report_job(db, "u1", build)
+        await asyncio.gather(*list(pdf_report._RUNNING.values()))
+        return job
+
+    return asyncio.run(scenario())
+
+
+def test_new_data_re_renders_right_away(fake_db):
+    meals = [3]
+
+    async def build():
+        return _report(meals=meals[0])
+
+    first = _render(fake_db, build)
+    # Logged a meal just after: no reuse window hides it
+    meals[0] = 4
+    asyncio.run(pdf_report.bump_report_data_version(fake_db, "u1"))
+    second = _render(fake_db, build)
+
+    assert second["version"] != first["version"]
+    assert fake_db.report_cache.docs[0]["version"] == second["version"]
+    assert fake_db.report_cache.docs[0]["data_counter"] == 1
+
+
+def test_bumped_counter_re_aggregates_but_reuses_an_unchanged_version(fake_db):
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return _report(days_active=len(builds) + 10)
+
+    _render(fake_db, build)
+    asyncio.run(pdf_report.bump_report_data_version(fake_db, "u1"))
+
+    assert _render(fake_db, build)["cached"] is True
+    assert _render(fake_db, build)["cached"] is True
+    assert builds == [1, 1]
+    assert len(fake_db.report_jobs.docs) == 1
+
+
+def test_job_held_by_another_worker_is_shared_not_restarted(fake_db):
+    report = _report()
+    fake_db.report_jobs.docs.append({
+        "job_id": "report_other", "user_id": "u1", "version": pdf_report.report_version(report),
+        "status": "running", "owner": "other-worker",
+        "lease_until": (datetime.now(timezone.utc) + timedelta(seconds=60)).isoformat()
+    })
+
+    async def build():
+        return report
+
+    job = asyncio.run(pdf_report.create_report_job(fake_db, "u1", build))
+
+    assert job["job_id"] == "report_other"
+    assert "owner" not in job
+    assert pdf_report._RUNNING == {}
+    assert fake_db.report_jobs.docs[0]["owner"] == "other-worker"
+
+
+def test_input_writers_bump_the_data_version(server, fake_db):
+    user = {"user_id": "u1", "name": "Léa"}
+    fake_db.user_profiles.docs.append({"user_id": "u1", "weight": 80, "height": 165})
+
+    asyncio.run(server.log_steps({"steps": 5000}, user=user))
+    asyncio.run(server.update_profile({"weight": 79}, user=user))
+
+    assert fake_db.report_data_versions.docs[0]["counter"] == 2
@@ -0,0 +1,21 @@
+"""
+Unit tests for the per-route metrics registry (backend/perf_metrics.py)
+"""
+import os
+
+import perf_metrics
+
+
+def test_samples_are_labelled_with_the_worker(monkeypatch):
+    registry = perf_metrics.MetricsRegistry()
+    monkeypatch.setattr(perf_metrics, "registry", registry)
+    labels = (("method", "GET"), ("route", "/api/x"))
+    registry.inc("http_requests_total", labels + (("status", "200"),))
+    registry.observe("http_request_duration_seconds", labels, 0.02, (0.01, 0.1))
+
+    text = perf_metrics.render_metrics()
+
+    worker = f'worker="{os.getpid()}"'
+    assert f'http_requests_total{{{worker},method="GET",route="/api/x",status="200"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{worker},method="GET",route="/api/x",le="0.1"}} 1' in text
+    assert f'http_request_duration_seconds_count{{{worker},method="GET",route="/api/x"}} 1' in text
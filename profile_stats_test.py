@@ -0,0 +1,72 @@
+"""
+Unit tests for the per-user profile counters (backend/profile_stats.py)
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import profile_stats
+from profile_stats import bump_profile_stats, bump_profile_stats_many, get_profile_stats
+
+ME = {"user_id": "me", "name": "Moi"}
+
+
+def _stats(db, user_id="me") -> dict:
+    return asyncio.run(get_profile_stats(db, user_id))
+
+
+def test_first_read_computes_from_the_source_collections(fake_db):
+    fake_db.favorite_recipes.docs += [{"user_id": "me"}, {"user_id": "me"}, {"user_id": "other"}]
+    fake_db.social_posts.docs += [{"user_id": "me"}]
+    fake_db.friendships.docs += [
+        {"user_id": "me", "friend_id": "a", "status": "accepted"},
+        {"user_id": "b", "friend_id": "me", "status": "accepted"},
+        {"user_id": "me", "friend_id": "c", "status": "pending"},
+    ]
+
+    assert _stats(fake_db) == {"favorite_recipes_count": 2, "posts_count": 1, "friends_count": 2}
+    assert fake_db.profile_stats.docs[0]["computed_at"]
+
+
+def test_bumps_are_served_without_recounting(fake_db):
+    _stats(fake_db)
+    fake_db.favorite_recipes.docs.append({"user_id": "me"})  # Not seen: the counter is authoritative
+
+    asyncio.run(bump_profile_stats(fake_db, "me", posts_count=2, friends_count=-1))
+    asyncio.run(bump_profile_stats_many(fake_db, "favorite_recipes_count", ["me", "me", "nobody"]))
+
+    assert _stats(fake_db) == {"favorite_recipes_count": 2, "posts_count": 2, "friends_count": 0}
+    # Users whose document was never computed are not created by a bump
+    assert [d["user_id"] for d in fake_db.profile_stats.docs] == ["me"]
+
+
+def test_stale_counters_are_recomputed_daily(fake_db):
+    _stats(fake_db)
+    asyncio.run(bump_profile_stats(fake_db, "me", posts_count=5))  # Drift
+    fake_db.profile_stats.docs[0]["computed_at"] = (
+        datetime.now(timezone.utc) - profile_stats.STATS_MAX_AGE
+    ).isoformat()
+
+    assert _stats(fake_db)["posts_count"] == 0
+
+
+def test_negative_drift_is_never_shown(fake_db):
+    _stats(fake_db)
+    asyncio.run(bump_profile_stats(fake_db, "me", friends_count=-1))
+
+    assert _stats(fake_db)["friends_count"] == 0
+
+
+def test_endpoints_bump_the_counters(server, fake_db):
+    for user_id in ("me", "ami"):
+        _stats(fake_db, user_id)
+    fake_db.friendships.docs.append({"friendship_id": "f1", "user_id": "ami", "friend_id": "me", "status": "pending"})
+
+    favorite = asyncio.run(server.add_favorite_recipe({"recipe": {"name": "Soupe"}}, user=ME))
+    asyncio.run(server.accept_friend_request({"friendship_id": "f1"}, user=ME))
+    assert _stats(fake_db) == {"favorite_recipes_count": 1, "posts_count": 0, "friends_count": 1}
+    assert _stats(fake_db, "ami")["friends_count"] == 1
+
+    asyncio.run(server.remove_favorite_recipe(favorite["favorite_id"], user=ME))
+    asyncio.run(server.remove_friend("ami", user=ME))
+    assert _stats(fake_db) == {"favorite_recipes_count": 0, "posts_count": 0, "friends_count": 0}
+    assert _stats(fake_db, "ami")["friends_count"] == 0
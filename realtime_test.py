@@ -0,0 +1,40 @@
+"""
+Unit tests for the real-time pub/sub backend (backend/realtime.py)
+"""
+import asyncio
+
+import pytest
+
+import realtime
+
+
+def test_pubsub_backends_must_implement_the_interface():
+    class Incomplete(realtime.PubSub):
+        async def publish(self, channel, event):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_publish_reaches_subscribers_of_the_channel_only():
+    async def scenario():
+        pubsub = realtime.InProcessPubSub()
+        async with pubsub.subscribe("user:a") as sub_a, pubsub.subscribe("user:b") as sub_b:
+            assert await pubsub.publish("user:a", {"type": "message"}) == 1
+            assert await sub_a.get() == {"type": "message"}
+            assert sub_b.queue.empty()
+        return pubsub.subscriber_count()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_slow_subscriber_drops_oldest_events():
+    async def scenario():
+        pubsub = realtime.InProcessPubSub()
+        sub = realtime.Subscription(pubsub, "user:a", maxsize=2)
+        for n in range(3):
+            sub.put({"n": n})
+        return sub.dropped, [await sub.get(), await sub.get()]
+
+    assert asyncio.run(scenario()) == (1, [{"n": 1}, {"n": 2}])
@@ -0,0 +1,91 @@
+"""
+Unit tests for the binary recipe store (backend/recipe_store.py)
+"""
+import json
+
+import pytest
+
+import recipe_store
+from recipe_store import RecipeStore, build_store, convert_json_to_store
+
+RECIPES = [
+    {"id": "r1", "name": "Velouté de potiron", "category": "Soupe", "nutriscore": "A", "dish_type": "entrée",
+     "calories": 180, "proteins": 4, "prep_time": 25, "ingredients": ["potiron", "crème"], "tags": ["hiver"]},
+    {"id": "r2", "name": "Saumon grillé", "category": "Poisson", "nutriscore": "B", "dish_type": "plat",
+     "calories": 420, "bariatric_phase": "phase3", "image": "https://img/saumon.jpg"},
+    # Values that do not fit a column: float, non-string code, unknown key
+    {"id": "r3", "name": "Smoothie", "category": "Boisson", "dish_type": "plat",
+     "calories": 95.5, "nutriscore": 1, "rating": 4.5, "ingredients": []},
+]
+
+
+@pytest.fixture
+def store():
+    store = RecipeStore.from_records(RECIPES)
+    yield store
+    store.close()
+
+
+def test_round_trip_restores_every_recipe(store):
+    assert len(store) == 3
+    assert store.copy() == RECIPES
+    assert store[-1] == RECIPES[2]
+    assert store[0:2] == RECIPES[:2]
+    with pytest.raises(IndexError):
+        store[3]
+
+
+def test_single_fields_decode_without_materializing(store):
+    assert store.field(0, "calories") == 180
+    assert store.field(0, "dish_type") == "entrée"
+    assert store.field(0, "ingredients") == ["potiron", "crème"]
+    assert store.field(1, "tags") is None
+    # Stored in "extra"
+    assert store.field(2, "calories") == 95.5
+    assert store.field(2, "nutriscore") == 1
+    assert store.field(2, "rating") == 4.5
+
+
+def test_filters_run_on_the_columns(store):
+    assert store.select(dish_type="plat") == [1, 2]
+    assert store.select(dish_type="plat", category="Poisson") == [1]
+    assert store.select(category_contains="o") == [0, 1, 2]
+    assert store.select(nutriscore="A") == [0]
+    assert store.select(dish_type="dessert") == []
+    assert store.value_counts("dish_type") == {"entrée": 1, "plat": 2}
+    assert [r["id"] for r in store.search_name("SAUMON")] == ["r2"]
+
+
+def test_store_file_is_memory_mapped(tmp_path):
+    json_path, bin_path = tmp_path / "recipes.json", tmp_path / "recipes.bin"
+    json_path.write_text(json.dumps(RECIPES, ensure_ascii=False), encoding="utf-8")
+
+    assert convert_json_to_store(json_path, bin_path) == 3
+
+    store = RecipeStore.open(bin_path)
+    try:
+        assert store.copy() == RECIPES
+    finally:
+        store.close()
+
+
+def test_stores_built_before_dish_type_was_a_column_filter_through_extra(monkeypatch):
+    old_coded = tuple(f for f in recipe_store.CODED_FIELDS if f != "dish_type")
+    monkeypatch.setattr(recipe_store, "CODED_FIELDS", old_coded)
+    monkeypatch.setattr(recipe_store, "_KNOWN_FIELDS", recipe_store._KNOWN_FIELDS - {"dish_type"})
+    payload = build_store(RECIPES)
+    monkeypatch.undo()
+
+    store = RecipeStore(payload)
+    try:
+        assert store.copy() == RECIPES
+        assert store.field(0, "dish_type") == "entrée"
+        assert store.select(dish_type="plat") == [1, 2]
+        assert store.select(dish_type="plat", category="Boisson") == [2]
+    finally:
+        store.close()
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        RecipeStore(b"JSON" + bytes(12))
@@ -0,0 +1,64 @@
+"""
+Unit tests for the resumable seed job and its lease (backend/seed_jobs.py, backend/job_lease.py)
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import seed_jobs
+from job_lease import claim_lease, fail_job
+
+
+def _iso(seconds: int) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+async def _create_and_run(db, target: int) -> dict:
+    job = await seed_jobs.create_seed_job(db, target, "admin")
+    await asyncio.gather(*list(seed_jobs._RUNNING.values()))
+    return await db.seed_jobs.find_one({"job_id": job["job_id"]}, {"_id": 0})
+
+
+def test_fresh_job_runs_to_completion(fake_db, monkeypatch):
+    monkeypatch.setattr(seed_jobs, "SEED_CHUNK_SIZE", 10)
+    job = asyncio.run(_create_and_run(fake_db, 25))
+
+    assert job["status"] == "completed"
+    assert job["chunks_done"] == job["chunks_total"] == 3
+    assert job["created"] == 25
+    assert job["lease_until"] is None
+    assert asyncio.run(fake_db.users.count_documents({"is_fake": True})) == 25
+    assert job["docs_written"] == sum(len(fake_db[name].docs) for name in seed_jobs.SEEDED_COLLECTIONS)
+
+
+def test_failed_job_is_retried_to_completion(fake_db, monkeypatch):
+    monkeypatch.setattr(seed_jobs, "SEED_CHUNK_SIZE", 10)
+    fake_db.seed_jobs.docs.append({
+        "job_id": "seed_failed", "status": "failed", "error": "boom", "owner": "dead", "lease_until": None,
+        "to_create": 15, "female_count": 9, "chunks_total": 2, "chunks_done": 1, "created": 10, "docs_written": 0
+    })
+
+    job = asyncio.run(_create_and_run(fake_db, 15))
+
+    assert job["status"] == "completed"
+    assert "error" not in job
+    assert job["created"] == 15
+
+
+def test_claim_takes_expired_lease_but_not_a_held_one(fake_db):
+    fake_db.seed_jobs.docs.extend([
+        {"job_id": "expired", "status": "running", "owner": "dead", "lease_until": _iso(-5)},
+        {"job_id": "held", "status": "running", "owner": "alive", "lease_until": _iso(60)},
+        {"job_id": "done", "status": "completed", "owner": "dead", "lease_until": None},
+    ])
+
+    assert asyncio.run(claim_lease(fake_db.seed_jobs, "expired", "me", 60))["owner"] == "me"
+    assert asyncio.run(claim_lease(fake_db.seed_jobs, "held", "me", 60)) is None
+    assert asyncio.run(claim_lease(fake_db.seed_jobs, "held", "alive", 60))["owner"] == "alive"
+    assert asyncio.run(claim_lease(fake_db.seed_jobs, "done", "me", 60)) is None
+
+
+def test_fail_is_ignored_after_losing_the_lease(fake_db):
+    fake_db.seed_jobs.docs.append({"job_id": "seed_1", "status": "running", "owner": "new", "lease_until": _iso(60)})
+
+    assert asyncio.run(fail_job(fake_db.seed_jobs, "seed_1", "old", "stale worker")) is False
+    assert fake_db.seed_jobs.docs[0]["status"] == "running"
@@ -0,0 +1,157 @@
+"""
+Unit tests for the slow-query log (backend/slow_queries.py)
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import slow_queries
+from slow_queries import SlowQueryListener, query_shape, summarize_explain
+
+
+def test_query_shape_strips_values_and_keeps_structure():
+    query = {"user_id": "u1", "date": {"$gte": "2026-01-01"}, "kind": {"$in": ["a", "b", 3]}, "done": False}
+
+    assert query_shape(query) == {
+        "user_id": "str", "date": {"$gte": "str"}, "kind": {"$in": ["str", "int"]}, "done": "bool",
+    }
+    # Same shape whatever the values
+    assert query_shape({"user_id": "u2", "n": 5}) == query_shape({"user_id": "u1", "n": 7})
+
+
+def test_query_shape_of_a_pipeline():
+    pipeline = [{"$match": {"user_id": "u1"}}, {"$sort": {"date": -1}}, {"$limit": 10}]
+
+    assert query_shape(pipeline) == [{"$match": {"user_id": "str"}}, {"$sort": {"date": "int"}}, {"$limit": "int"}]
+
+
+def test_summarize_explain_finds_nested_stages_and_indexes():
+    explain = {
+        "queryPlanner": {"winningPlan": {
+            "stage": "FETCH",
+            "filter": {"kind": {"$eq": "secret"}},
+            "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1_date_-1"},
+        }},
+        "executionStats": {"executionTimeMillis": 12, "totalDocsExamined": 40, "totalKeysExamined": 41, "nReturned": 5},
+    }
+
+    summary = summarize_explain(explain)
+
+    assert summary == {
+        "stages": ["FETCH", "IXSCAN"],
+        "collscan": False,
+        "index_names": ["user_id_1_date_-1"],
+        "execution_time_ms": 12,
+        "docs_examined": 40,
+        "keys_examined": 41,
+        "n_returned": 5,
+    }
+    assert "secret" not in json.dumps(summary)
+
+
+def test_summarize_explain_flags_collscan_inside_an_aggregate():
+    explain = {"stages": [{"$cursor": {
+        "queryPlanner": {"winningPlan": {"queryPlan": {"stage": "COLLSCAN"}}},
+        "executionStats": {"totalDocsExamined": 5000, "nReturned": 3},
+    }}]}
+
+    summary = summarize_explain(explain)
+
+    assert summary["collscan"] is True
+    assert summary["docs_examined"] == 5000
+    assert summary["index_names"] == []
+
+
+def _record(duration_ms=150.0, route="GET /api/food/logs", user_id="u1"):
+    return {
+        "command_name": "find",
+        "database": "app",
+        "collection": "food_logs",
+        "shape": json.dumps({"filter": query_shape({"user_id": user_id})}, sort_keys=True),
+        "route": route,
+        "duration_ms": duration_ms,
+        "command": {"find": "food_logs", "filter": {"user_id": user_id}, "lsid": {"id": "x"}},
+    }
+
+
+def _listener(monkeypatch):
+    listener = SlowQueryListener(threshold_ms=100)
+    explains = []
+
+    async def explain(db, record):
+        explains.append(record)
+        return {"stages": ["COLLSCAN"], "collscan": True}
+
+    monkeypatch.setattr(listener, "_explain", explain)
+    return listener, explains
+
+
+def test_store_upserts_one_document_per_fingerprint(fake_db, monkeypatch):
+    listener, _ = _listener(monkeypatch)
+    explained = {}
+
+    asyncio.run(listener._store(fake_db, _record(150, user_id="u1"), explained))
+    asyncio.run(listener._store(fake_db, _record(120, route="GET /api/dashboard", user_id="u2"), explained))
+
+    [doc] = fake_db[slow_queries.SLOW_QUERY_COLLECTION].docs
+    assert doc["fingerprint"].startswith("app.food_logs:find:")
+    assert doc["count"] == 2
+    assert doc["total_duration_ms"] == 270
+    assert doc["max_duration_ms"] == 150
+    assert doc["routes"] == ["GET /api/food/logs", "GET /api/dashboard"]
+    assert doc["last_route"] == "GET /api/dashboard"
+    assert doc["collscan"] is True
+    assert "u1" not in json.dumps(doc)
+
+
+def test_explain_runs_once_per_interval_unless_slower(fake_db, monkeypatch):
+    listener, explains = _listener(monkeypatch)
+    explained = {}
+
+    asyncio.run(listener._store(fake_db, _record(150), explained))
+    asyncio.run(listener._store(fake_db, _record(140), explained))
+    assert len(explains) == 1
+
+    asyncio.run(listener._store(fake_db, _record(300), explained))
+    assert len(explains) == 2
+    assert fake_db[slow_queries.SLOW_QUERY_COLLECTION].docs[0]["explained_duration_ms"] == 300
+
+    monkeypatch.setattr(slow_queries, "EXPLAIN_INTERVAL", -1)
+    asyncio.run(listener._store(fake_db, _record(110), explained))
+    assert len(explains) == 3
+
+
+def _event(command_name="find", duration_ms=0, command=None):
+    return SimpleNamespace(
+        command_name=command_name,
+        command=command if command is not None else {"find": "food_logs", "filter": {"user_id": "u1"}},
+        database_name="app",
+        connection_id=("localhost", 27017),
+        request_id=1,
+        duration_micros=int(duration_ms * 1000),
+    )
+
+
+def test_listener_queues_a_copy_of_slow_commands_only():
+    async def scenario():
+        listener = SlowQueryListener(threshold_ms=100)
+        listener._loop = asyncio.get_running_loop()
+        listener._queue = asyncio.Queue()
+
+        listener.started(_event())
+        listener.succeeded(_event(duration_ms=5))
+
+        command = {"find": "food_logs", "filter": {"user_id": "u1"}}
+        listener.started(_event(command=command))
+        listener.succeeded(_event(duration_ms=250))
+        command["filter"] = "reused by the driver"
+        await asyncio.sleep(0)
+
+        assert listener._pending == {}
+        assert listener._queue.qsize() == 1
+        record = listener._queue.get_nowait()
+        assert record["route"] == "background"
+        assert record["duration_ms"] == 250
+        assert record["command"]["filter"] == {"user_id": "u1"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,106 @@
+"""
+Unit tests for the friends home timeline (backend/timeline.py)
+"""
+import asyncio
+
+import pytest
+
+import timeline
+
+
+@pytest.fixture
+def friends_db(fake_db):
+    asyncio.run(timeline.ensure_timeline_indexes(fake_db))
+    timeline._high_fanout_cache.update(ids=set(), loaded_at=0.0)
+    fake_db.friendships.docs.extend([
+        {"user_id": "alice", "friend_id": "bob", "status": "accepted"},
+        {"user_id": "carol", "friend_id": "alice", "status": "accepted"},
+        {"user_id": "bob", "friend_id": "dave", "status": "pending"},
+    ])
+    return fake_db
+
+
+def _activity(n: int, author: str) -> dict:
+    return {"activity_id": f"act_{n:03d}", "user_id": author, "created_at": f"2026-01-01T00:{n:02d}:00"}
+
+
+def test_publish_fans_out_to_author_and_accepted_friends(friends_db):
+    result = asyncio.run(timeline.publish_activity(friends_db, _activity(1, "alice")))
+
+    assert result["fanned_out"] == 3
+    assert sorted(e["user_id"] for e in friends_db.timelines.docs) == ["alice", "bob", "carol"]
+
+
+def test_build_timeline_fills_a_new_timeline_once(friends_db):
+    friends_db.social_activities.docs.append(_activity(1, "bob"))
+    assert asyncio.run(timeline.build_timeline(friends_db, "alice"))
+
+    # Not published: a built timeline is only fed by publish_activity
+    friends_db.social_activities.docs.append(_activity(2, "carol"))
+    assert not asyncio.run(timeline.build_timeline(friends_db, "alice"))
+
+    page = asyncio.run(timeline.read_timeline(friends_db, "alice"))
+    assert [a["activity_id"] for a in page["activities"]] == ["act_001"]
+
+
+def test_published_activities_reach_a_built_timeline(friends_db):
+    asyncio.run(timeline.build_timeline(friends_db, "alice"))
+    for n in range(3):
+        asyncio.run(timeline.publish_activity(friends_db, _activity(n, "carol")))
+
+    page = asyncio.run(timeline.read_timeline(friends_db, "alice"))
+    assert [a["activity_id"] for a in page["activities"]] == ["act_002", "act_001", "act_000"]
+
+
+def test_read_timeline_pages_with_cursor(friends_db):
+    for n in range(5):
+        asyncio.run(timeline.publish_activity(friends_db, _activity(n, "bob")))
+
+    first = asyncio.run(timeline.read_timeline(friends_db, "alice", limit=3))
+    second = asyncio.run(timeline.read_timeline(friends_db, "alice", limit=3, before=first["next_cursor"]))
+
+    assert [a["activity_id"] for a in first["activities"]] == ["act_004", "act_003", "act_002"]
+    assert [a["activity_id"] for a in second["activities"]] == ["act_001", "act_000"]
+    assert second["next_cursor"] is None
+
+
+def test_remove_author_drops_their_entries(friends_db):
+    asyncio.run(timeline.publish_activity(friends_db, _activity(1, "bob")))
+    asyncio.run(timeline.remove_author_from_timeline(friends_db, "alice", "bob"))
+
+    assert sorted(e["user_id"] for e in friends_db.timelines.docs) == ["bob"]
+
+
+def test_feed_is_read_from_the_timeline_and_enriched_in_batches(server, friends_db):
+    friends_db.users.docs.extend([
+        {"user_id": "alice", "name": "Alice"},
+        {"user_id": "bob", "name": "Bob", "picture": "bob.png"},
+        {"user_id": "carol", "name": "Carol"},
+    ])
+    friends_db.user_profiles.docs.append({"user_id": "carol", "picture": "carol-profile.png"})
+    shared = [
+        asyncio.run(server.share_activity({"content": f"Séance {n}", "type": "workout"}, user={"user_id": author}))
+        for n, author in enumerate(["bob", "carol"])
+    ]
+    bob_id, carol_id = (s["activity"]["activity_id"] for s in shared)
+    friends_db.activity_likes.docs.extend([
+        {"activity_id": bob_id, "user_id": "alice"},
+        {"activity_id": bob_id, "user_id": "carol"},
+    ])
+    friends_db.activity_comments.docs.extend(
+        {"comment_id": f"c{n:02d}", "activity_id": bob_id, "user_id": "carol", "content": "Bravo",
+         "created_at": f"2026-01-01T00:{n:02d}:00"}
+        for n in range(12)
+    )
+
+    feed = asyncio.run(server.get_activity_feed(user={"user_id": "alice"}, limit=30, feed_type="friends", before=None))
+
+    by_id = {a["activity_id"]: a for a in feed["activities"]}
+    assert set(by_id) == {bob_id, carol_id}
+    bob, carol = by_id[bob_id], by_id[carol_id]
+    assert (bob["user_name"], bob["user_picture"], bob["likes_count"], bob["user_liked"]) == ("Bob", "bob.png", 2, True)
+    assert (carol["user_picture"], carol["likes_count"], carol["user_liked"]) == ("carol-profile.png", 0, False)
+    assert bob["comments_count"] == 12
+    assert [c["comment_id"] for c in bob["comments"]] == [f"c{n:02d}" for n in range(10)]
+    assert bob["comments"][0]["user_name"] == "Carol"
+    assert carol["comments"] == []
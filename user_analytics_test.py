@@ -0,0 +1,98 @@
+"""
+Unit tests for the analytics scalars (backend/user_analytics.py)
+The $facet pipeline itself needs a real MongoDB; these tests stub aggregate
+with facet output and check how get_user_analytics shapes it.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from user_analytics import get_user_analytics
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+def _db(weight=(), food=(), steps=(), weight_series=(), steps_series=()):
+    facets = {
+        "weight": list(weight),
+        "food": list(food),
+        "steps": list(steps),
+        "weight_series": list(weight_series),
+        "steps_series": list(steps_series),
+    }
+    calls = []
+
+    def aggregate(pipeline, **kwargs):
+        calls.append(pipeline)
+        return _Cursor([facets])
+
+    return SimpleNamespace(weight_entries=SimpleNamespace(aggregate=aggregate), calls=calls)
+
+
+WEIGHT = {"first": 82.0, "last": 76.5, "min": 76.0, "max": 83.0, "count": 12,
+          "first_date": "2026-01-02", "last_date": "2026-03-01"}
+FOOD = {"count": 40, "calories": 36000, "days": 20}
+STEPS = {"days": 4, "steps": 30002, "calories_burned": 1200}
+
+
+def test_empty_history_falls_back_to_the_profile_weight():
+    db = _db()
+    stats = asyncio.run(get_user_analytics(db, "u1", height_cm=160, fallback_weight=70))
+
+    assert stats["weight"] == {
+        "start": 70, "current": 70, "change": 0, "min": 70, "max": 70, "entries_count": 0,
+        "first_date": None, "last_date": None, "bmi_start": 27.3, "bmi_current": 27.3,
+    }
+    assert stats["nutrition"] == {"meals_logged": 0, "total_calories": 0, "days_logged": 0, "avg_daily_calories": 0}
+    assert stats["activity"]["avg_daily_steps"] == 0
+    assert len(db.calls) == 1
+
+
+def test_empty_history_without_profile_weight_reports_zeros():
+    stats = asyncio.run(get_user_analytics(_db(), "u1", height_cm=160))
+
+    assert stats["weight"]["current"] == 0
+    assert stats["weight"]["bmi_current"] == 0
+
+
+def test_weight_scalars_and_bmi_come_from_the_weight_facet():
+    stats = asyncio.run(get_user_analytics(_db(weight=[WEIGHT]), "u1", height_cm=175, fallback_weight=90))
+
+    weight = stats["weight"]
+    assert (weight["start"], weight["current"], weight["change"]) == (82.0, 76.5, -5.5)
+    assert (weight["min"], weight["max"], weight["entries_count"]) == (76.0, 83.0, 12)
+    assert (weight["first_date"], weight["last_date"]) == ("2026-01-02", "2026-03-01")
+    assert (weight["bmi_start"], weight["bmi_current"]) == (26.8, 25.0)
+
+
+def test_bmi_is_zero_without_a_height():
+    stats = asyncio.run(get_user_analytics(_db(weight=[WEIGHT]), "u1"))
+
+    assert stats["weight"]["bmi_current"] == 0
+
+
+def test_average_daily_calories_defaults_to_days_with_food_logs():
+    stats = asyncio.run(get_user_analytics(_db(food=[FOOD]), "u1"))
+
+    assert stats["nutrition"] == {"meals_logged": 40, "total_calories": 36000, "days_logged": 20,
+                                  "avg_daily_calories": 1800}
+
+
+def test_average_daily_calories_uses_days_active_when_given():
+    assert asyncio.run(get_user_analytics(_db(food=[FOOD]), "u1", days_active=30))["nutrition"]["avg_daily_calories"] == 1200
+    # A brand new account must not divide by zero
+    assert asyncio.run(get_user_analytics(_db(food=[FOOD]), "u1", days_active=0))["nutrition"]["avg_daily_calories"] == 36000
+
+
+def test_activity_and_series_pass_through():
+    series = [{"date": "2026-01-02", "weight": 82.0}]
+    stats = asyncio.run(get_user_analytics(_db(steps=[STEPS], weight_series=series), "u1"))
+
+    assert stats["activity"] == {"days_tracked": 4, "total_steps": 30002, "total_calories_burned": 1200,
+                                 "avg_daily_steps": 7500}
+    assert stats["series"] == {"weight": series, "steps": []}
@@ -0,0 +1,83 @@
+"""
+Unit tests for prefix-token user search (backend/utils/search_tokens.py, GET /social/search)
+"""
+import asyncio
+
+import pytest
+
+import migrations
+from utils.search_tokens import query_tokens, user_search_tokens
+
+ME = {"user_id": "me", "name": "Moi", "email": "moi@example.com"}
+
+
+def test_tokens_are_accent_folded_word_prefixes():
+    tokens = user_search_tokens("Élodie Bérard", "elo.b@mail.fr")
+
+    assert {"el", "elo", "elodie", "be", "berard"} <= set(tokens)
+    assert "e" not in tokens  # shorter than MIN_PREFIX
+    assert not any("mail" in t for t in tokens)  # email domain is not indexed
+    assert tokens == sorted(set(tokens))
+
+
+def test_long_words_are_capped_on_both_sides():
+    word = "Anticonstitutionnellement"
+
+    assert max(map(len, user_search_tokens(word))) == 15
+    assert query_tokens(word) == [word.lower()[:15]]
+
+
+def test_query_tokens_fold_accents_and_drop_short_words():
+    assert query_tokens("  ÉLO  b ") == ["elo"]
+    assert query_tokens("héloïse@mail.fr") == ["heloise"]
+    assert query_tokens("!") == []
+
+
+@pytest.fixture
+def users(fake_db):
+    for user_id, name, email in [
+        ("u1", "Élodie Bérard", "elodie@mail.fr"),
+        ("u2", "Eloïse Martin", "lolo@mail.fr"),
+        ("u3", "Marc Dupont", "marc.dupont@mail.fr"),
+        ("me", ME["name"], ME["email"]),
+    ]:
+        fake_db.users.docs.append({
+            "user_id": user_id, "name": name, "email": email, "search_tokens": user_search_tokens(name, email)
+        })
+    fake_db.friendships.docs.append({"user_id": "me", "friend_id": "u2", "status": "pending"})
+    return fake_db
+
+
+def _search(server, q) -> list:
+    return asyncio.run(server.search_users(q, user=ME))["users"]
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("elo", ["u1", "u2"]),
+    ("Élo", ["u1", "u2"]),
+    ("eloise", ["u2"]),
+    ("élodie ber", ["u1"]),
+    ("dup", ["u3"]),
+    ("marc.dupont@gmail.com", ["u3"]),  # the local part matches, not the domain
+    ("lodie", []),  # prefixes only
+    ("mail", []),
+    ("moi", []),  # never the caller
+    ("e", []),
+])
+def test_search_matches_every_query_word_against_a_prefix(server, users, q, expected):
+    assert sorted(u["user_id"] for u in _search(server, q)) == expected
+
+
+def test_search_results_carry_the_friendship_status(server, users):
+    results = {u["user_id"]: u for u in _search(server, "elo")}
+
+    assert results["u2"]["friendship_status"] == "pending"
+    assert results["u1"]["friendship_status"] is None
+    assert "search_tokens" not in results["u1"]
+
+
+def test_backfill_tokenizes_users_created_before_the_index(server, fake_db):
+    fake_db.users.docs.append({"user_id": "old", "name": "Zoé Lefèvre", "email": "zoe@mail.fr"})
+
+    assert asyncio.run(migrations.backfill_user_search_tokens(fake_db)) == 1
+    assert [u["user_id"] for u in _search(server, "lefe")] == ["old"]